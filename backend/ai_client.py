@@ -1,74 +1,284 @@
 import os
 import json
+import re
+import copy
 import time
-import google.generativeai as genai
-from prompts import PROMPTS
+import random
+import asyncio
+import contextlib
+import hashlib
+import logging
+import threading
+from prompts import PROMPTS, SECTION_RETRY_PROMPT
+from cache import TTLCache, SQLiteCache, TieredCache
+from singleflight import AsyncSingleFlight
+from json_stream import IncrementalJSONParser
+import response_schema
+import metrics
+
+logger = logging.getLogger("docgen.ai_client")
 
 # Fixed relative import
 GEMINI_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+
+# --- Response cache ---
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", "86400"))             # seconds; 0 disables caching
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "500"))  # in-process LRU size
+AI_CACHE_DB = os.getenv("AI_CACHE_DB")                                # optional SQLite file shared by all workers
+AI_CACHE_DISK_MAX_ENTRIES = int(os.getenv("AI_CACHE_DISK_MAX_ENTRIES", "10000"))
+
+# --- Async client limits (per worker process) ---
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))    # in-flight calls
+GEMINI_RATE_PER_MINUTE = float(os.getenv("GEMINI_RATE_PER_MINUTE", "15"))  # token bucket refill; 0 = unlimited
+GEMINI_BATCH_SHARE = float(os.getenv("GEMINI_BATCH_SHARE", "0.5"))        # part of both limits batch items may use
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "2"))         # seconds, doubled per attempt
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "30"))
+GEMINI_DEADLINE = float(os.getenv("GEMINI_DEADLINE", "90"))                # whole request, retries included
+
+# --- Structured output ---
+GEMINI_RESPONSE_SCHEMA = os.getenv("GEMINI_RESPONSE_SCHEMA", "1") != "0"   # typed schema in generation_config
+GEMINI_SECTION_RETRIES = int(os.getenv("GEMINI_SECTION_RETRIES", "1"))     # follow-ups asking for invalid sections only
 
 if GEMINI_KEY:
     masked_key = GEMINI_KEY[:5] + "..." + GEMINI_KEY[-4:] if len(GEMINI_KEY) > 10 else "***"
     print(f"DEBUG: Loaded Gemini API Key: {masked_key}")
-    genai.configure(api_key=GEMINI_KEY)
 
 class GeminiError(Exception):
     pass
 
-def call_gemini(prompt: str) -> dict:
-    """Send prompt to Gemini model and return parsed JSON."""
-    if not GEMINI_KEY:
-         raise GeminiError("GEMINI_API_KEY not found in environment variables")
 
-    model = genai.GenerativeModel('gemini-2.5-flash')
-    retries = 3
-    delay = 10
-    text = ""
+class GeminiParseError(GeminiError):
+    """The response held no usable JSON at all."""
 
-    for attempt in range(retries):
+
+def _build_response_cache():
+    if AI_CACHE_TTL <= 0:
+        return None
+    disk = None
+    if AI_CACHE_DB:
         try:
-            response = model.generate_content(prompt)
-            text = response.text
-            break # Success, exit retry loop
+            disk = SQLiteCache(AI_CACHE_DB, max_entries=AI_CACHE_DISK_MAX_ENTRIES, ttl=AI_CACHE_TTL)
         except Exception as e:
-            if "429" in str(e) and attempt < retries - 1:
-                print(f"Rate limit hit. Retrying in {delay}s... (Attempt {attempt+1}/{retries})")
-                time.sleep(delay)
-                delay *= 2  # Exponential backoff
-            else:
-                raise GeminiError(f"Gemini API error: {str(e)}")
+            logger.error(f"Gemini disk cache unavailable ({AI_CACHE_DB}): {e}")
+    return TieredCache(TTLCache(max_entries=AI_CACHE_MAX_ENTRIES, ttl=AI_CACHE_TTL), disk)
+
+
+response_cache = _build_response_cache()
+
+# Identical prompts already on their way to Gemini are joined rather than sent again
+gemini_flight_async = AsyncSingleFlight("gemini_async")
+
+
+def cache_key(prompt: str, model: str = GEMINI_MODEL) -> str:
+    return f"{model}:{hashlib.sha256(prompt.encode('utf-8')).hexdigest()}"
+
+
+def cache_stats() -> dict:
+    return response_cache.stats() if response_cache is not None else {"enabled": False}
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """
+    One GenerativeModel per process; it is stateless between calls and safe to share.
+    The SDK is imported here, on first use (it takes most of a second), not when the app starts.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=GEMINI_KEY)
+                _model = genai.GenerativeModel(GEMINI_MODEL)
+    return _model
+
+
+def _is_rate_limit(error: Exception) -> bool:
+    text = str(error)
+    return "429" in text or "ResourceExhausted" in type(error).__name__ or "Resource has been exhausted" in text
+
 
-    # Find JSON inside text
+def _retry_after(error: Exception):
+    """Server-suggested wait in seconds, if the 429 carried one."""
+    text = str(error)
+    match = re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", text) or re.search(r"retry in ([\d.]+)\s*s", text, re.IGNORECASE)
+    return float(match.group(1)) if match else None
+
+
+def parse_gemini_json(text: str) -> dict:
+    # Plain JSON with a response schema; near-misses are repaired locally (response_schema.parse)
     try:
-        start = text.find("{")
-        end = text.rfind("}") + 1
-        if start == -1 or end == 0:
-             raise ValueError("No JSON found in response")
-        
-        json_str = text[start:end]
-        
+        return response_schema.parse(text)
+    except ValueError as e:
+        raise GeminiParseError(f"JSON extraction error: {str(e)}\nGemini output: {text}")
+
+
+def generation_config(doc_type: str, sections: list | None = None) -> dict | None:
+    """JSON mode plus the typed schema of the doc type (or of just `sections` of it)."""
+    if not GEMINI_RESPONSE_SCHEMA:
+        return None
+    schema = response_schema.schema(doc_type, sections)
+    if schema is None:
+        return None
+    return {"response_mime_type": "application/json", "response_schema": schema}
+
+
+class AsyncRateLimiter:
+    """
+    Concurrency cap plus token bucket for outgoing Gemini calls.
+    Waiting happens with asyncio.sleep, so a throttled request costs no worker thread.
+    """
+
+    def __init__(self, max_concurrency: int, rate_per_minute: float):
+        self.max_concurrency = max_concurrency
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, float(max_concurrency))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._semaphore = None
+        self._lock = None
+        self.in_flight = 0
+
+    async def __aenter__(self):
+        if self._semaphore is None:
+            # Created on first use so they bind to the serving event loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._lock = asyncio.Lock()
+        await self._semaphore.acquire()
         try:
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            # Handle "Extra data" error which happens if there's multiple JSONs or trailing junk
-            if e.msg.startswith("Extra data"):
-                # Use the position of the error to slice the string
-                # e.pos is where the extra data starts
-                return json.loads(json_str[:e.pos])
-            else:
-                raise e
+            await self._take_token()
+        except BaseException:
+            self._semaphore.release()
+            raise
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.in_flight -= 1
+        self._semaphore.release()
 
-    except Exception as e:
-        raise GeminiError(f"JSON extraction error: {str(e)}\nGemini output: {text}")
+    async def _take_token(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
 
 
-def generate_structured_with_gemini(doc_type: str, user_fields: dict | None, ai_context: str | None):
+limiter = AsyncRateLimiter(GEMINI_MAX_CONCURRENCY, GEMINI_RATE_PER_MINUTE)
+# Batch calls pass this one first and then the shared limiter, so a large batch
+# never holds every slot or token; at least one slot stays with interactive requests.
+batch_limiter = AsyncRateLimiter(
+    max(1, min(GEMINI_MAX_CONCURRENCY - 1, int(GEMINI_MAX_CONCURRENCY * GEMINI_BATCH_SHARE))),
+    GEMINI_RATE_PER_MINUTE * GEMINI_BATCH_SHARE,
+)
+
+
+@contextlib.asynccontextmanager
+async def _gemini_slot(batch: bool):
+    if batch:
+        async with batch_limiter, limiter:
+            yield
+    else:
+        async with limiter:
+            yield
+
+
+async def _with_backoff(attempt, deadline: float, can_retry=None):
     """
-    Unified Generation Logic:
-    Takes structured user inputs (rough drafts/points) AND user intent (ai_context)
-    and uses the appropriate Prompt Template to generate the final polished JSON content.
+    Awaits `attempt()` within `deadline` seconds. Rate limits are retried (up to GEMINI_MAX_RETRIES
+    attempts) after a jittered exponential backoff, or the server's retry-after hint; anything else,
+    running out of time, or `can_retry()` returning False raises GeminiError.
     """
+    give_up_at = time.monotonic() + deadline
+
+    for n in range(GEMINI_MAX_RETRIES):
+        remaining = give_up_at - time.monotonic()
+        if remaining <= 0:
+            raise GeminiError(f"Gemini deadline of {deadline:g}s exceeded")
+        try:
+            return await asyncio.wait_for(attempt(), timeout=remaining)
+        except asyncio.TimeoutError:
+            raise GeminiError(f"Gemini deadline of {deadline:g}s exceeded")
+        except Exception as e:
+            if not _is_rate_limit(e) or n >= GEMINI_MAX_RETRIES - 1:
+                raise GeminiError(f"Gemini API error: {str(e)}")
+            if can_retry is not None and not can_retry():
+                raise GeminiError(f"Gemini API error after partial output: {str(e)}")
 
+            hint = _retry_after(e)
+            backoff = min(GEMINI_BACKOFF_MAX, GEMINI_BACKOFF_BASE * (2 ** n))
+            delay = hint if hint is not None else random.uniform(backoff / 2, backoff)
+            if delay >= give_up_at - time.monotonic():
+                raise GeminiError(f"Gemini rate limited; retry in {delay:.1f}s would pass the deadline")
+            logger.warning(f"Rate limit hit. Retrying in {delay:.1f}s... (Attempt {n+1}/{GEMINI_MAX_RETRIES})")
+            metrics.GEMINI_RETRIES.inc()
+            await asyncio.sleep(delay)
+    raise GeminiError("GEMINI_MAX_RETRIES allows no attempt")
+
+
+async def call_gemini_async(prompt: str, deadline: float = GEMINI_DEADLINE, generation_config: dict | None = None, batch: bool = False) -> dict:
+    """
+    One Gemini call: shared model, global limiter (plus batch_limiter for `batch` work),
+    jittered exponential backoff that honours retry-after hints, and a hard deadline.
+    """
+    if not GEMINI_KEY:
+         raise GeminiError("GEMINI_API_KEY not found in environment variables")
+
+    model = get_model()
+
+    async def attempt():
+        async with _gemini_slot(batch):
+            response = await model.generate_content_async(prompt, generation_config=generation_config)
+        return response.text
+
+    return parse_gemini_json(await _with_backoff(attempt, deadline))
+
+
+async def stream_gemini_async(prompt: str, on_event, deadline: float = GEMINI_DEADLINE, generation_config: dict | None = None, batch: bool = False) -> dict:
+    """
+    Streaming variant of call_gemini_async. Chunks go through an incremental JSON
+    parser and `on_event` receives each top-level field / array item as soon as it
+    is complete. Returns the same dict call_gemini_async would.
+    Rate-limit retries only happen before the first event is passed on: a retry would
+    publish the fields already sent again, so a 429 after that fails the call.
+    """
+    if not GEMINI_KEY:
+         raise GeminiError("GEMINI_API_KEY not found in environment variables")
+
+    model = get_model()
+    emitted = False
+
+    async def consume():
+        nonlocal emitted
+        parser = IncrementalJSONParser()
+        async with _gemini_slot(batch):
+            response = await model.generate_content_async(prompt, stream=True, generation_config=generation_config)
+            async for chunk in response:
+                for event in parser.feed(chunk.text):
+                    emitted = True
+                    on_event(event)
+        return parser
+
+    parser = await _with_backoff(consume, deadline, can_retry=lambda: not emitted)
+    try:
+        return parser.result()
+    except ValueError:
+        # Object never closed cleanly; let the regular extractor have a go at the full text
+        return parse_gemini_json(parser.text)
+
+
+def build_prompt(doc_type: str, user_fields: dict | None, ai_context: str | None) -> str:
     if doc_type not in PROMPTS:
         raise GeminiError(f"No prompt found for document type: {doc_type}")
 
@@ -76,9 +286,102 @@ def generate_structured_with_gemini(doc_type: str, user_fields: dict | None, ai_
 
     # Insert user_fields or {} if none. 
     # The prompt itself is instructed to use these values and expand on them.
-    prompt = base_prompt.format(
+    return base_prompt.format(
         user_input=json.dumps(user_fields or {}),
         ai_context=ai_context or "Generate a standard professional document."
     )
 
-    return call_gemini(prompt)
\ No newline at end of file
+
+def _section_prompt(prompt: str, sections: list) -> str:
+    return SECTION_RETRY_PROMPT.format(prompt=prompt.rstrip(), sections=", ".join(sections))
+
+
+def _finish(doc_type: str, result: dict, invalid: list) -> dict:
+    """Sections still unusable after the follow-ups render empty, unless nothing usable came back at all."""
+    if not invalid:
+        return result
+    if len(invalid) == len(response_schema.skeleton(doc_type)):
+        raise GeminiError(f"Gemini returned no usable content for {doc_type}")
+    logger.warning(f"Gemini left {invalid} of {doc_type} unusable; rendering them empty")
+    return response_schema.fill_missing(doc_type, result, invalid)
+
+
+async def _generate_checked(doc_type: str, prompt: str, user_fields: dict | None, on_partial=None, batch: bool = False) -> dict:
+    """
+    The whole document in one call, validated against its schema. Sections that are still missing
+    or mistyped after the local repair are asked for again on their own, never the whole document.
+    With `on_partial`, the first call streams and corrected fields are sent again.
+    """
+    try:
+        if on_partial is not None:
+            raw = await stream_gemini_async(prompt, on_partial, generation_config=generation_config(doc_type), batch=batch)
+        else:
+            raw = await call_gemini_async(prompt, generation_config=generation_config(doc_type), batch=batch)
+    except GeminiParseError as e:
+        logger.warning(f"Unusable Gemini response for {doc_type}: {e}")
+        raw = {}
+    result, invalid = response_schema.conform(doc_type, raw, fallback=user_fields)
+
+    for _ in range(GEMINI_SECTION_RETRIES):
+        if not invalid:
+            break
+        logger.info(f"Re-requesting {invalid} of {doc_type}")
+        metrics.GEMINI_SECTION_RETRIES.inc(doc_type)
+        try:
+            fixed = await call_gemini_async(
+                _section_prompt(prompt, invalid), generation_config=generation_config(doc_type, invalid), batch=batch
+            )
+        except GeminiError as e:
+            logger.warning(f"Re-request of {invalid} failed: {e}")
+            break
+        fixed, invalid = response_schema.conform(doc_type, fixed, sections=invalid)
+        result.update(fixed)
+    result = _finish(doc_type, result, invalid)
+
+    if on_partial is not None:
+        for k, v in result.items():
+            if raw.get(k) != v:
+                on_partial({"type": "field", "key": k, "value": v})
+    return result
+
+
+async def _cached_response(key: str, doc_type: str, use_cache: bool):
+    if use_cache and response_cache is not None:
+        cached = await response_cache.get_async(key)
+        if cached is not None:
+            logger.info(f"Gemini cache hit for {doc_type}")
+            return cached
+    return None
+
+
+async def _store_response(key: str, result):
+    if response_cache is not None and isinstance(result, dict):
+        # A bypassed request still refreshes the entry
+        await response_cache.set_async(key, result)
+
+
+async def generate_structured_with_gemini_async(doc_type: str, user_fields: dict | None, ai_context: str | None, use_cache: bool = True, on_partial=None, batch: bool = False):
+    """
+    Unified Generation Logic:
+    Takes structured user inputs (rough drafts/points) AND user intent (ai_context)
+    and uses the appropriate Prompt Template to generate the final polished JSON content.
+    Identical prompts are answered from the response cache unless `use_cache` is False.
+    With `on_partial`, the response is streamed and each completed field/array item is
+    passed to it as it arrives (a cache hit replays the cached fields).
+    `batch` calls only get GEMINI_BATCH_SHARE of the Gemini limits.
+    """
+    with metrics.track("prompt_build", doc_type):
+        prompt = build_prompt(doc_type, user_fields, ai_context)
+        key = cache_key(prompt)
+    cached = await _cached_response(key, doc_type, use_cache)
+    if cached is not None:
+        if on_partial is not None:
+            for k, v in cached.items():
+                on_partial({"type": "field", "key": k, "value": v})
+        return cached
+
+    with metrics.track("gemini", doc_type):
+        result = await gemini_flight_async.do(key, lambda: _generate_checked(doc_type, prompt, user_fields, on_partial, batch))
+    await _store_response(key, result)
+    # Coalesced callers share one result object; callers mutate it, so hand out copies
+    return copy.deepcopy(result)
@@ -0,0 +1,96 @@
+import os
+import logging
+import posixpath
+from pathlib import Path
+from typing import Optional, List, Tuple
+
+from models import Document
+from storage import StorageBackend, LocalStorage, create_storage
+
+logger = logging.getLogger("docgen.artifacts")
+
+BASE_DIR = Path(__file__).resolve().parent
+STORAGE_DIR = Path(os.getenv("STORAGE_DIR", BASE_DIR.parent / "data"))
+GENERATED = STORAGE_DIR / "generated"           # backend/data/generated or /home/data/generated
+LEGACY_GENERATED = BASE_DIR.parent / "generated"  # flat output dir of early deployments
+
+FORMATS = ("docx", "pdf")
+
+storage = create_storage(STORAGE_DIR)
+
+
+def shard_key(artifact_id: str, fmt: str) -> str:
+    """generated/ab/cd/<artifact_id>.<fmt> - keeps every directory small."""
+    return f"generated/{artifact_id[:2]}/{artifact_id[2:4]}/{artifact_id}.{fmt}"
+
+
+def refs_lock(artifact_id: str) -> Path:
+    """
+    Lock file serializing "is this artifact still referenced?" with deleting its files
+    (document deletes, the sweeper) and with picking it up from the render cache.
+    """
+    return GENERATED / ".locks" / f"{artifact_id}.refs.lock"
+
+
+def sibling_key(key: str, fmt: str) -> str:
+    """The same artifact in another format (it lives next to the original)."""
+    return f"{posixpath.splitext(key)[0]}.{fmt}"
+
+
+def legacy_candidates(doc: Document, fmt: str) -> List[Path]:
+    """
+    Where documents created before canonical artifact paths may have put their files.
+    Only used for records the migration has not backfilled yet.
+    """
+    base_name = Path(doc.filename).stem
+    names = []
+    if fmt == "docx":
+        names.append(f"{base_name}.docx")
+        # Legacy: {doc_type}_{uid}.docx if stem is just uid?
+        names.append(f"{doc.doc_type}_{base_name}.docx")
+    elif fmt == "pdf":
+        names.append(f"{base_name}.pdf")
+        # Legacy: uid.pdf if stem is doc_type_uid?
+        if "_" in base_name:
+            names.append(f"{base_name.split('_')[-1]}.pdf")
+
+    dirs = [GENERATED, LEGACY_GENERATED]
+    if doc.file_path:
+        dirs.append(BASE_DIR / Path(doc.file_path).parent)
+
+    candidates = [d / name for d in dirs for name in names]
+    if doc.file_path and Path(doc.file_path).suffix == f".{fmt}":
+        # Last resort: doc.file_path resolved against the backend dir
+        candidates.append(BASE_DIR / doc.file_path)
+    return candidates
+
+
+def _legacy_object(path: Path) -> Tuple[StorageBackend, str]:
+    # Legacy files may sit outside STORAGE_DIR; address them relative to their own folder
+    return LocalStorage(path.parent), path.name
+
+
+def locate(doc: Document, fmt: str) -> Optional[Tuple[StorageBackend, str]]:
+    """(backend, key) of the file for `fmt`, or None. Canonical records cost a single stat."""
+    if doc.artifacts:
+        # e.g. a PDF converted after the record was written: it sits next to the DOCX
+        key = doc.artifacts.get(fmt) or sibling_key(next(iter(doc.artifacts.values())), fmt)
+        return (storage, key) if storage.exists(key) else None
+
+    for path in legacy_candidates(doc, fmt):
+        backend, key = _legacy_object(path)
+        if backend.exists(key):
+            return backend, key
+    return None
+
+
+def document_objects(doc: Document) -> List[Tuple[StorageBackend, str]]:
+    """Every object that may belong to `doc` (used when deleting it)."""
+    if doc.artifacts:
+        return [(storage, key) for key in doc.artifacts.values()]
+    paths = []
+    for fmt in FORMATS:
+        for path in legacy_candidates(doc, fmt):
+            if path not in paths:
+                paths.append(path)
+    return [_legacy_object(path) for path in paths]
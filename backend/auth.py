@@ -1,33 +1,39 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from starlette.concurrency import run_in_threadpool
 
 from database import get_db
 from models import User
+from repository import Repository
+from cache import TTLCache
+from passwords import pwd_context, verify_password, get_password_hash
+import metrics
 import os
+import logging
+
+logger = logging.getLogger("docgen.auth")
 
 # CONFIG
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey_change_me_in_prod")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7 # 7 days validity for convenience
 
-import hashlib
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def verify_password(plain_password, hashed_password):
-    # Pre-hash with SHA256 to allow passwords > 72 bytes and avoid bcrypt limit
-    digest = hashlib.sha256(plain_password.encode('utf-8')).hexdigest()
-    return pwd_context.verify(digest, hashed_password)
+# Authenticated users, keyed by email. Kept short-lived so other workers see profile
+# changes quickly; writes in this worker invalidate immediately.
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "1024"))
+user_cache = TTLCache(max_entries=USER_CACHE_MAX_ENTRIES, ttl=USER_CACHE_TTL)
 
-def get_password_hash(password):
-    # Pre-hash with SHA256 to allow passwords > 72 bytes and avoid bcrypt limit
-    digest = hashlib.sha256(password.encode('utf-8')).hexdigest()
-    return pwd_context.hash(digest)
+def invalidate_user(email: str):
+    user_cache.delete(email)
+
+def user_cache_stats() -> dict:
+    return user_cache.stats()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -53,25 +59,23 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: dict = Depen
     except JWTError:
         raise credentials_exception
     
-    users_container = db["users"]
+    if USER_CACHE_TTL > 0:
+        cached = user_cache.get(email)
+        if cached is not None:
+            return cached
+
     try:
-        # Cosmos DB Query
-        query = "SELECT * FROM c WHERE c.email = @email"
-        params = [{"name": "@email", "value": email}]
-        items = list(users_container.query_items(
-            query=query,
-            parameters=params,
-            enable_cross_partition_query=True
-        ))
-        
-        if not items:
-            raise credentials_exception
-            
-        user_data = items[0]
-        # Return User model (Pydantic)
-        return User(**user_data)
-        
-    except Exception as e:
-        # Log error?
-        print(f"Auth DB Error: {e}")
+        # Single-partition lookup (users are partitioned on email); blocking, so off the event loop
+        with metrics.track("auth_lookup"):
+            user = await run_in_threadpool(Repository(db).users.get_by_email, email)
+    except Exception:
+        logger.exception("User lookup failed during authentication")
+        raise credentials_exception
+
+    if not user:
+        logger.info("Token for unknown user rejected")
         raise credentials_exception
+
+    if USER_CACHE_TTL > 0:
+        user_cache.set(email, user)
+    return user
@@ -0,0 +1,83 @@
+"""
+Cold start of one app worker: time from launching uvicorn to the first answer on "/" (liveness)
+and to the first 200 from /ready (database connected, templates parsed).
+
+Pass --app-dir to measure another checkout, e.g. a `git worktree` of an older commit; builds
+without /ready report the liveness time only.
+
+    cd backend && python benchmarks/bench_cold_start.py [--runs 5] [--app-dir ../other/backend]
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+import requests
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(url: str, started: float, timeout: float, accept_404: bool = False):
+    """Seconds since `started` until `url` answered 200 (None on 404 when accept_404)."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            response = requests.get(url, timeout=1)
+            if response.status_code == 200:
+                return time.perf_counter() - started
+            if response.status_code == 404 and accept_404:
+                return None
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"{url} not up after {timeout:g}s")
+
+
+def cold_start(app_dir: Path, env: dict, timeout: float = 120):
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=app_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        live = _wait_for(f"http://127.0.0.1:{port}/", started, timeout)
+        ready = _wait_for(f"http://127.0.0.1:{port}/ready", started, timeout, accept_404=True)
+        return live, ready
+    finally:
+        server.terminate()
+        server.wait(10)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--app-dir", type=Path, default=BACKEND_DIR)
+    parser.add_argument("--db", default=os.getenv("DB_BACKEND", "memory"), help="DB_BACKEND for the measured worker")
+    args = parser.parse_args()
+
+    env = dict(os.environ, DB_BACKEND=args.db)
+    lives, readies = [], []
+    for run in range(args.runs):
+        live, ready = cold_start(args.app_dir.resolve(), env)
+        lives.append(live)
+        if ready is not None:
+            readies.append(ready)
+        print(f"run {run + 1}: live {live:.2f}s" + (f", ready {ready:.2f}s" if ready is not None else ""))
+
+    print(f"\n{args.app_dir}: median live {statistics.median(lives):.2f}s", end="")
+    print(f", median ready {statistics.median(readies):.2f}s" if readies else " (no /ready endpoint)")
+
+
+if __name__ == "__main__":
+    main()
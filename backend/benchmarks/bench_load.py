@@ -0,0 +1,393 @@
+"""
+Offline load test: boots the app under uvicorn with a fake Gemini and in-memory Cosmos containers
+(benchmarks/standins.py), then drives a mixed workload at fixed concurrency.
+
+Setup signs up --users users and seeds each with a few documents. The measured phase runs
+--concurrency client threads for --duration seconds; each request picks an operation by the --mix
+weights and a random user. Reported per operation: throughput and p50/p95/p99 latency; per pipeline
+stage: the same percentiles estimated from the server's /metrics histograms.
+
+Results are written as JSON (benchmarks/results/ by default); --compare prints the change against an
+earlier result file, e.g. one produced on the previous commit.
+
+    cd backend && python benchmarks/bench_load.py [--concurrency 16] [--duration 30]
+        [--mix login=1,generate=2,list=4,detail=2,download=3] [--gemini-latency 0.8]
+        [--rate-limit-ratio 0.05] [--db cosmos|sqlite|memory] [--cosmos-latency 0.005]
+        [--compare results/old.json]
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import socket
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+from pathlib import Path
+from datetime import datetime
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+# A user-supplied name per doc type; it overrides the replayed AI field, so every document renders afresh
+NAME_FIELDS = {"resume": "name", "sop": "applicant_name", "letter": "sender_name", "contract": "party_a", "report": "author"}
+PASSWORD = "benchmark-password"
+# Finer than the production default so stage percentiles can be estimated from the buckets
+STAGE_BUCKETS = "0.001,0.0025,0.005,0.01,0.025,0.05,0.075,0.1,0.15,0.2,0.3,0.4,0.5,0.75,1,1.5,2,3,5,10,30,60"
+
+
+def _serve(port: int, options: dict):
+    """Server process: configure through the environment, install the stand-ins, run uvicorn."""
+    os.environ.update(options["env"])
+    os.chdir(BACKEND_DIR)
+    import uvicorn
+    from benchmarks.standins import FakeGeminiModel, InMemoryContainer, install
+    import main
+
+    if not options["verbose"]:
+        logging.getLogger().setLevel(logging.WARNING)
+    gemini = FakeGeminiModel(
+        latency=options["gemini_latency"],
+        jitter=options["gemini_jitter"],
+        rate_limit_ratio=options["rate_limit_ratio"],
+        seed=options["seed"],
+    )
+    if options["db"] == "cosmos":
+        install(
+            gemini,
+            InMemoryContainer("/email", latency=options["cosmos_latency"]),
+            InMemoryContainer("/user_id", latency=options["cosmos_latency"]),
+        )
+    else:
+        install(gemini)  # DB_BACKEND in the environment picks the SQLite store
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def _parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise SystemExit(f"Unknown operations in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+class Client:
+    """One benchmark user: its token and the ids of the documents it owns."""
+
+    def __init__(self, base: str, index: int):
+        self.base = base
+        self.email = f"bench{index}@example.com"
+        self.token = None
+        self.doc_ids = []
+        self.lock = threading.Lock()
+
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+    def remember(self, doc_id: str):
+        with self.lock:
+            self.doc_ids.append(doc_id)
+
+    def some_doc(self):
+        with self.lock:
+            return random.choice(self.doc_ids) if self.doc_ids else None
+
+
+def _generate_body(use_gemini: bool) -> dict:
+    doc_type = random.choice(list(NAME_FIELDS))
+    fields = {NAME_FIELDS[doc_type]: f"User {random.getrandbits(32):x}"}
+    if use_gemini:
+        # A unique context per request so every call reaches (fake) Gemini instead of the response cache
+        return {"doc_type": doc_type, "use_gemini": True, "ai_context": f"load test {random.getrandbits(64):x}", "fields": fields}
+    return {"doc_type": doc_type, "use_gemini": False, "fields": fields}
+
+
+def op_login(session, client):
+    return session.post(f"{client.base}/auth/login", data={"username": client.email, "password": PASSWORD})
+
+
+def op_generate(session, client):
+    response = session.post(f"{client.base}/generate", json=_generate_body(True), headers=client.headers())
+    if response.ok:
+        client.remember(response.json()["doc_id"])
+    return response
+
+
+def op_list(session, client):
+    return session.get(f"{client.base}/dashboard/documents", params={"limit": 24}, headers=client.headers())
+
+
+def op_detail(session, client):
+    return session.get(f"{client.base}/dashboard/doc/{client.some_doc()}", headers=client.headers())
+
+
+def op_download(session, client):
+    fmt = random.choice(("pdf", "docx"))
+    return session.get(f"{client.base}/dashboard/download/{client.some_doc()}", params={"format": fmt}, headers=client.headers())
+
+
+OPERATIONS = {
+    "login": op_login,
+    "generate": op_generate,
+    "list": op_list,
+    "detail": op_detail,
+    "download": op_download,
+}
+
+
+def _setup(base: str, users: int, seed_docs: int) -> list:
+    clients = [Client(base, i) for i in range(users)]
+    with requests.Session() as session:
+        for client in clients:
+            session.post(f"{base}/auth/signup", json={
+                "email": client.email, "password": PASSWORD, "full_name": "Bench User", "profession": "Tester",
+                "security_question": "q", "security_answer": "a",
+            }).raise_for_status()
+            client.token = op_login(session, client).json()["access_token"]
+            for _ in range(seed_docs):
+                response = session.post(f"{base}/generate", json=_generate_body(False), headers=client.headers())
+                response.raise_for_status()
+                client.remember(response.json()["doc_id"])
+    return clients
+
+
+def _run(clients: list, mix: dict, concurrency: int, duration: float):
+    """Returns ({operation: [latency seconds]}, {operation: failed requests})."""
+    names, weights = zip(*mix.items())
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def worker():
+        with requests.Session() as session:
+            while time.perf_counter() < stop_at:
+                name = random.choices(names, weights)[0]
+                client = random.choice(clients)
+                start = time.perf_counter()
+                try:
+                    ok = OPERATIONS[name](session, client).ok
+                except requests.RequestException:
+                    ok = False
+                elapsed = time.perf_counter() - start
+                with lock:
+                    samples[name].append(elapsed)
+                    if not ok:
+                        errors[name] += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    return samples, errors
+
+
+_SAMPLE = re.compile(r'^docgen_stage_duration_seconds_bucket\{stage="([^"]*)",doc_type="[^"]*",le="([^"]+)"\} (\d+)$')
+
+
+def _stage_buckets(base: str) -> dict:
+    """{stage: {upper bound: cumulative count}} summed over doc types."""
+    buckets = defaultdict(lambda: defaultdict(int))
+    for line in requests.get(f"{base}/metrics").text.splitlines():
+        match = _SAMPLE.match(line)
+        if match:
+            stage, le, count = match.groups()
+            buckets[stage][float("inf") if le == "+Inf" else float(le)] += int(count)
+    return buckets
+
+
+def _bucket_quantile(bounds: list, counts: list, q: float) -> float:
+    """Linear interpolation inside the bucket holding the q-quantile (what histogram_quantile does)."""
+    total = counts[-1]
+    rank = q * total
+    lower_bound, lower_count = 0.0, 0
+    for bound, count in zip(bounds, counts):
+        if count >= rank:
+            if bound == float("inf"):
+                return lower_bound
+            return lower_bound + (bound - lower_bound) * ((rank - lower_count) / max(1, count - lower_count))
+        lower_bound, lower_count = bound, count
+    return lower_bound
+
+
+def _stage_summary(before: dict, after: dict, duration: float) -> dict:
+    summary = {}
+    for stage, buckets in sorted(after.items()):
+        bounds = sorted(buckets)
+        counts = [buckets[b] - before.get(stage, {}).get(b, 0) for b in bounds]
+        if not counts or counts[-1] == 0:
+            continue
+        summary[stage] = {
+            "count": counts[-1],
+            "per_sec": round(counts[-1] / duration, 2),
+            **{f"p{p}_ms": round(_bucket_quantile(bounds, counts, p / 100) * 1000, 1) for p in (50, 95, 99)},
+        }
+    return summary
+
+
+def _endpoint_summary(samples: dict, errors: dict, duration: float) -> dict:
+    summary = {}
+    for name in sorted(samples):
+        values = samples[name]
+        summary[name] = {
+            "count": len(values),
+            "errors": errors.get(name, 0),
+            "per_sec": round(len(values) / duration, 2),
+            **{f"p{p}_ms": round(_percentile(values, p) * 1000, 1) for p in (50, 95, 99)},
+        }
+    return summary
+
+
+def _print_table(title: str, rows: dict, baseline: dict = None):
+    print(f"\n{title}")
+    print(f"{'':18s} {'count':>7s} {'errors':>7s} {'req/s':>8s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s}")
+    for name, row in rows.items():
+        line = (
+            f"{name:18s} {row['count']:7d} {row.get('errors', 0):7d} {row['per_sec']:8.2f} "
+            f"{row['p50_ms']:9.1f} {row['p95_ms']:9.1f} {row['p99_ms']:9.1f}"
+        )
+        old = (baseline or {}).get(name)
+        if old and old["p95_ms"]:
+            line += f"   p95 {100 * (row['p95_ms'] - old['p95_ms']) / old['p95_ms']:+.0f}%"
+            if old["per_sec"]:
+                line += f", req/s {100 * (row['per_sec'] - old['per_sec']) / old['per_sec']:+.0f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30, help="seconds of measured load")
+    parser.add_argument("--mix", default="login=1,generate=2,list=4,detail=2,download=3")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--seed-docs", type=int, default=3, help="documents created per user before measuring")
+    parser.add_argument("--gemini-latency", type=float, default=0.8, help="seconds per fake Gemini call")
+    parser.add_argument("--gemini-jitter", type=float, default=0.2)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.05, help="share of Gemini calls answered with a 429")
+    parser.add_argument("--db", choices=("cosmos", "sqlite", "memory"), default="cosmos",
+                        help="cosmos: in-memory Cosmos stand-in; sqlite / memory: the DB_BACKEND of that name")
+    parser.add_argument("--cosmos-latency", type=float, default=0.005, help="seconds added to every container call")
+    parser.add_argument("--bcrypt-rounds", type=int, default=int(os.getenv("BCRYPT_ROUNDS", "12")))
+    parser.add_argument("--pdf-mode", choices=("eager", "lazy"), default=os.getenv("PDF_MODE", "eager"))
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true", help="keep the server's INFO logging")
+    parser.add_argument("--out", type=Path, default=None, help="result file (default: benchmarks/results/load-<commit>-<time>.json)")
+    parser.add_argument("--compare", type=Path, default=None, help="earlier result file to compare against")
+    args = parser.parse_args()
+    mix = _parse_mix(args.mix)
+    random.seed(args.seed)
+
+    storage = tempfile.mkdtemp(prefix="bench-load-")
+    env = {
+        "STORAGE_DIR": storage,
+        "BCRYPT_ROUNDS": str(args.bcrypt_rounds),
+        "PDF_MODE": args.pdf_mode,
+        "METRICS_BUCKETS": STAGE_BUCKETS,
+        # The real client would pace itself at the free-tier quota; the fake has none
+        "GEMINI_RATE_PER_MINUTE": os.getenv("GEMINI_RATE_PER_MINUTE", "0"),
+        "GEMINI_BACKOFF_BASE": os.getenv("GEMINI_BACKOFF_BASE", "0.5"),
+        "COSMOS_DB_URI": "",
+        "COSMOS_DB_KEY": "",
+        "DB_BACKEND": args.db,
+    }
+    options = {
+        "env": env,
+        "gemini_latency": args.gemini_latency,
+        "gemini_jitter": args.gemini_jitter,
+        "rate_limit_ratio": args.rate_limit_ratio,
+        "cosmos_latency": args.cosmos_latency,
+        "seed": args.seed,
+        "verbose": args.verbose,
+        "db": args.db,
+    }
+
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    # Not a daemon: the app starts its own password hashing processes
+    server = multiprocessing.get_context("spawn").Process(target=_serve, args=(port, options))
+    server.start()
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                if requests.get(f"{base}/", timeout=1).ok:
+                    break
+            except requests.ConnectionError:
+                pass
+            if time.monotonic() > deadline or not server.is_alive():
+                raise SystemExit("Server did not come up")
+            time.sleep(0.2)
+
+        print(f"Setting up {args.users} users with {args.seed_docs} documents each...")
+        clients = _setup(base, args.users, args.seed_docs)
+
+        print(f"Running {args.concurrency} clients for {args.duration:g}s, mix {args.mix}")
+        before = _stage_buckets(base)
+        samples, errors = _run(clients, mix, args.concurrency, args.duration)
+        stages = _stage_summary(before, _stage_buckets(base), args.duration)
+    finally:
+        server.terminate()
+        server.join(10)
+        shutil.rmtree(storage, ignore_errors=True)
+
+    endpoints = _endpoint_summary(samples, errors, args.duration)
+    total = sum(row["count"] for row in endpoints.values())
+    result = {
+        "commit": _git_commit(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "host": {"python": platform.python_version(), "cpus": os.cpu_count(), "platform": platform.platform()},
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        "throughput_per_sec": round(total / args.duration, 2),
+        "endpoints": endpoints,
+        "stages": stages,
+    }
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else {}
+    if baseline:
+        print(f"\nCompared with {args.compare} (commit {baseline.get('commit')})")
+    _print_table("Endpoints", endpoints, baseline.get("endpoints"))
+    _print_table("Stages (estimated from /metrics buckets)", stages, baseline.get("stages"))
+    print(f"\nTotal: {result['throughput_per_sec']} req/s")
+
+    out = args.out or RESULTS_DIR / f"load-{result['commit']}-{datetime.utcnow():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2))
+    print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
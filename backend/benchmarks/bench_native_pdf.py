@@ -0,0 +1,75 @@
+"""
+PDF conversion of the built-in templates: native in-process renderer (reportlab) vs LibreOffice.
+
+Renders each doc type once with the recorded Gemini fields in fixtures/gemini_responses.json, then
+converts it --runs times per path and reports the mean time per conversion and peak RSS
+(this process for native, soffice children for LibreOffice).
+
+    cd backend && python benchmarks/bench_native_pdf.py [--runs 5]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "gemini_responses.json"
+
+
+def _timed(fn, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault("SOFFICE_POOL_SIZE", "0")  # compare against the plain one-off soffice path
+    os.environ["SOFFICE_BATCH_WINDOW_MS"] = "0"
+    import native_pdf
+    from template_renderer import render_docx, _convert_with_subprocess
+    from soffice_pool import SOFFICE_BIN
+
+    if not native_pdf.native_available():
+        sys.exit("reportlab is not installed")
+    have_soffice = shutil.which(SOFFICE_BIN) is not None
+    templates = Path(__file__).resolve().parent.parent / "templates"
+    work = Path(tempfile.mkdtemp(prefix="bench-native-pdf-"))
+
+    print(f"{'doc_type':10s} {'native ms':>10s} {'soffice ms':>11s} {'speedup':>8s}")
+    try:
+        for doc_type, fields in json.loads(FIXTURES.read_text()).items():
+            docx = work / f"{doc_type}.docx"
+            render_docx(str(templates / f"{doc_type}_template.docx"), fields, str(docx))
+            native_dir, soffice_dir = work / "native", work / "soffice"
+            native_dir.mkdir(exist_ok=True)
+            soffice_dir.mkdir(exist_ok=True)
+
+            native_ms = _timed(lambda: native_pdf.render_pdf(str(docx), str(native_dir / f"{doc_type}.pdf")), args.runs)
+            if have_soffice:
+                soffice_ms = _timed(lambda: _convert_with_subprocess(str(docx), str(soffice_dir)), args.runs)
+                print(f"{doc_type:10s} {native_ms:10.1f} {soffice_ms:11.1f} {soffice_ms / native_ms:7.0f}x")
+            else:
+                print(f"{doc_type:10s} {native_ms:10.1f} {'n/a':>11s}")
+
+        self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+        child_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // 1024
+        print(f"peak RSS: this process {self_rss} MiB" + (f", soffice {child_rss} MiB" if have_soffice else ""))
+        if not have_soffice:
+            print(f"({SOFFICE_BIN} not found: LibreOffice column skipped)")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
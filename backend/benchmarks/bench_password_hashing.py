@@ -0,0 +1,91 @@
+"""
+Login burst: bcrypt verification in the request thread pool (before) vs the hashing process pool (after).
+
+While N logins run, a probe submits a no-op to the same thread pool every 20 ms, standing in for
+unrelated sync endpoints; its latency shows how much the burst starves the rest of the app.
+
+    cd backend && python benchmarks/bench_password_hashing.py [--logins 64] [--rounds 12] [--workers 2]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+async def _burst(login, n_logins):
+    from starlette.concurrency import run_in_threadpool
+
+    probe_latencies = []
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            t = time.perf_counter()
+            await run_in_threadpool(lambda: None)
+            probe_latencies.append((time.perf_counter() - t) * 1000)
+            await asyncio.sleep(0.02)
+
+    prober = asyncio.create_task(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(n_logins)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await prober
+
+    return {
+        "logins_per_sec": n_logins / elapsed,
+        "probe_p50_ms": statistics.median(probe_latencies) if probe_latencies else 0.0,
+        "probe_p95_ms": _percentile(probe_latencies, 95),
+    }
+
+
+async def main_async(args):
+    from starlette.concurrency import run_in_threadpool
+    import passwords
+
+    stored = passwords.get_password_hash("correct horse battery staple")
+
+    async def login_before():
+        assert await run_in_threadpool(passwords.verify_password, "correct horse battery staple", stored)
+
+    async def login_after():
+        ok, _ = await passwords.verify_and_update_async("correct horse battery staple", stored)
+        assert ok
+
+    # Warm the process pool so spawn time is not billed to the first burst
+    await passwords.verify_password_async("warmup", stored)
+
+    results = {
+        "before (thread pool)": await _burst(login_before, args.logins),
+        "after (process pool)": await _burst(login_after, args.logins),
+    }
+    passwords.shutdown_pool()
+
+    print(f"bcrypt rounds={passwords.BCRYPT_ROUNDS} hash workers={passwords.PASSWORD_HASH_WORKERS} "
+          f"cpus={os.cpu_count()} logins={args.logins}")
+    for name, r in results.items():
+        print(f"{name:22s} {r['logins_per_sec']:7.1f} logins/s   "
+              f"probe p50 {r['probe_p50_ms']:7.1f} ms   p95 {r['probe_p95_ms']:7.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=None, help="overrides BCRYPT_ROUNDS")
+    parser.add_argument("--workers", type=int, default=None, help="overrides PASSWORD_HASH_WORKERS")
+    args = parser.parse_args()
+    # Read by passwords.py at import, in this process and in the spawned hash workers
+    if args.rounds is not None:
+        os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    if args.workers is not None:
+        os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+    asyncio.run(main_async(args))
@@ -0,0 +1,290 @@
+"""
+Local stand-ins for the two external services, for benchmarks only:
+
+- FakeGeminiModel: answers generate_content / generate_content_async (streaming too) with the
+  recorded responses in fixtures/gemini_responses.json, after a configurable latency, and raises
+  a 429 for a configurable share of calls.
+- InMemoryContainer: the part of the Cosmos ContainerProxy API repository.py uses, including the
+  SQL subset of its queries, partition scoping, paging and transactional batches.
+
+install() wires both into an imported app (database containers and the shared Gemini model).
+"""
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+from pathlib import Path
+from functools import lru_cache
+
+from azure.cosmos.exceptions import CosmosResourceNotFoundError, CosmosResourceExistsError, CosmosBatchOperationError
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "gemini_responses.json"
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _StreamedResponse:
+    def __init__(self, text: str, chunk_size: int, delay: float):
+        self._chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+        self._delay = delay
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(self._delay)
+            yield _Response(chunk)
+
+
+class FakeGeminiModel:
+    """Replays one recorded JSON response per doc type; the doc type is recognised from the prompt."""
+
+    def __init__(self, latency: float = 0.8, jitter: float = 0.2, rate_limit_ratio: float = 0.0,
+                 responses: dict = None, chunk_size: int = 64, seed: int = None):
+        from prompts import PROMPTS
+
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.chunk_size = chunk_size
+        self.responses = responses if responses is not None else json.loads(FIXTURES.read_text())
+        # Static text before the first placeholder identifies the prompt
+        self._heads = sorted(
+            (
+                (prompt.split("{user_input}")[0].split("{ai_context}")[0].replace("{{", "{").replace("}}", "}"), doc_type)
+                for doc_type, prompt in PROMPTS.items()
+            ),
+            key=lambda head: -len(head[0]),
+        )
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.rate_limited = 0
+
+    def _answer(self, prompt: str) -> str:
+        with self._lock:
+            self.calls += 1
+            limited = self._random.random() < self.rate_limit_ratio
+            if limited:
+                self.rate_limited += 1
+        if limited:
+            raise Exception("429 Resource has been exhausted (e.g. check quota).")
+        for head, doc_type in self._heads:
+            if prompt.startswith(head):
+                return json.dumps(self.responses[doc_type])
+        raise Exception("400 No recorded response for this prompt")
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def generate_content(self, prompt: str, generation_config: dict = None):
+        time.sleep(self._delay())
+        return _Response(self._answer(prompt))
+
+    async def generate_content_async(self, prompt: str, stream: bool = False, generation_config: dict = None):
+        delay = self._delay()
+        if not stream:
+            await asyncio.sleep(delay)
+            return _Response(self._answer(prompt))
+        # Time to first chunk is half the latency, the rest is spread over the chunks
+        await asyncio.sleep(delay / 2)
+        text = self._answer(prompt)
+        chunks = max(1, len(text) // self.chunk_size)
+        return _StreamedResponse(text, self.chunk_size, delay / 2 / chunks)
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "rate_limited": self.rate_limited}
+
+
+@lru_cache(maxsize=256)
+def _compile(expression: str):
+    """Cosmos SQL condition / projection expression -> Python code over `item` and `params`."""
+    python = re.sub(r"NOT IS_DEFINED\(c\.(\w+)\)", r"('\1' not in item)", expression)
+    python = re.sub(r"IS_DEFINED\(c\.(\w+)\)", r"('\1' in item)", python)
+    python = re.sub(r"IS_NULL\(c\.(\w+)\)", r"(item.get('\1') is None)", python)
+    python = re.sub(r"\bc\.(\w+)", r"item.get('\1')", python)
+    python = re.sub(r"@(\w+)", r"params['@\1']", python)
+    python = re.sub(r"(?<![!<>=])=(?!=)", "==", python)
+    python = re.sub(r"\bAND\b", "and", python)
+    python = re.sub(r"\bOR\b", "or", python)
+    python = re.sub(r"\bNOT\b", "not", python)
+    return compile(python, "<cosmos-sql>", "eval")
+
+
+def _evaluate(expression: str, item: dict, params: dict):
+    try:
+        return eval(_compile(expression), {}, {"item": item, "params": params})
+    except TypeError:  # comparing a missing field, which Cosmos treats as no match
+        return False
+
+
+def _split_top_level(text: str, separator: str):
+    parts, depth, current = [], 0, ""
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        depth += ch == "("
+        depth -= ch == ")"
+        if depth == 0 and text.startswith(separator, i):
+            parts.append(current.strip())
+            current = ""
+            i += len(separator)
+            continue
+        current += ch
+        i += 1
+    parts.append(current.strip())
+    return parts
+
+
+_QUERY = re.compile(
+    r"^SELECT (?P<select>.+?) FROM c(?: WHERE (?P<where>.+?))?(?: ORDER BY c\.(?P<order>\w+)(?: (?P<dir>ASC|DESC))?)?$",
+    re.DOTALL,
+)
+
+
+class _Pager:
+    def __init__(self, rows: list, page_size: int, continuation: str = None):
+        self._rows = rows
+        self._size = page_size or len(rows) or 1
+        self._offset = int(continuation or 0)
+        self.continuation_token = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._offset >= len(self._rows) and (self._offset or not self._rows):
+            raise StopIteration
+        page = self._rows[self._offset:self._offset + self._size]
+        self._offset += self._size
+        self.continuation_token = str(self._offset) if self._offset < len(self._rows) else None
+        return iter(page)
+
+
+class _QueryResult(list):
+    def __init__(self, rows: list, page_size: int = None):
+        super().__init__(rows)
+        self._page_size = page_size
+
+    def by_page(self, continuation_token: str = None):
+        return _Pager(list(self), self._page_size, continuation_token)
+
+
+class InMemoryContainer:
+    """Thread-safe dict-backed container; `latency` seconds are added to every call, like a network hop."""
+
+    def __init__(self, partition_key: str, latency: float = 0.0):
+        self.partition_field = partition_key.lstrip("/")
+        self.latency = latency
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _key(self, body: dict):
+        return body.get(self.partition_field), body["id"]
+
+    def create_item(self, body: dict, **kwargs):
+        self._wait()
+        with self._lock:
+            if self._key(body) in self._items:
+                raise CosmosResourceExistsError(message=f"Entity with id {body['id']} already exists")
+            self._items[self._key(body)] = json.loads(json.dumps(body))
+        return body
+
+    def upsert_item(self, body: dict, **kwargs):
+        self._wait()
+        with self._lock:
+            self._items[self._key(body)] = json.loads(json.dumps(body))
+        return body
+
+    def read_item(self, item: str, partition_key, **kwargs):
+        self._wait()
+        with self._lock:
+            found = self._items.get((partition_key, item))
+        if found is None:
+            raise CosmosResourceNotFoundError(message=f"Entity with id {item} not found")
+        return json.loads(json.dumps(found))
+
+    def delete_item(self, item: str, partition_key, **kwargs):
+        self._wait()
+        with self._lock:
+            if self._items.pop((partition_key, item), None) is None:
+                raise CosmosResourceNotFoundError(message=f"Entity with id {item} not found")
+
+    def execute_item_batch(self, batch_operations: list, partition_key, **kwargs):
+        self._wait()
+        with self._lock:
+            bodies = [args[0] for _, args in batch_operations]
+            for body in bodies:
+                if body.get(self.partition_field) != partition_key or self._key(body) in self._items:
+                    raise CosmosBatchOperationError(
+                        error_index=bodies.index(body), headers={}, status_code=409,
+                        message="Batch rejected", operation_responses=[]
+                    )
+            for op, args in batch_operations:
+                if op not in ("create", "upsert"):
+                    raise ValueError(f"Unsupported batch operation: {op}")
+            for body in bodies:
+                self._items[self._key(body)] = json.loads(json.dumps(body))
+        return [{"statusCode": 201} for _ in bodies]
+
+    def query_items(self, query: str, parameters: list = None, partition_key=None,
+                    enable_cross_partition_query: bool = False, max_item_count: int = None, **kwargs):
+        self._wait()
+        match = _QUERY.match(" ".join(query.split()))
+        if match is None:
+            raise ValueError(f"Query not supported by the in-memory container: {query}")
+        params = {p["name"]: p["value"] for p in parameters or []}
+        with self._lock:
+            rows = [
+                json.loads(json.dumps(item)) for (pk, _), item in self._items.items()
+                if partition_key is None or pk == partition_key
+            ]
+
+        where = match.group("where")
+        if where:
+            rows = [item for item in rows if _evaluate(where, item, params)]
+        if match.group("order"):
+            field = match.group("order")
+            rows.sort(key=lambda item: (item.get(field) is not None, item.get(field) or ""), reverse=match.group("dir") == "DESC")
+
+        select = match.group("select").strip()
+        if select == "VALUE COUNT(1)":
+            return _QueryResult([len(rows)])
+        if select != "*":
+            rows = [self._project(select, item, params) for item in rows]
+        return _QueryResult(rows, max_item_count)
+
+    def _project(self, select: str, item: dict, params: dict) -> dict:
+        projected = {}
+        for column in _split_top_level(select, ","):
+            expression, _, alias = column.rpartition(" AS ")
+            if not expression:
+                expression, alias = column, column.split(".", 1)[1]
+            projected[alias] = _evaluate(expression, item, params)
+        return projected
+
+    def __len__(self):
+        return len(self._items)
+
+
+def install(gemini: FakeGeminiModel, users: InMemoryContainer = None, documents: InMemoryContainer = None):
+    """Points an already imported app at the stand-ins instead of Gemini and (given containers) Cosmos."""
+    import database
+    import ai_client
+
+    if users is not None:
+        database.users_container = users
+        database.documents_container = documents
+        database.init_error = None
+    ai_client.GEMINI_KEY = ai_client.GEMINI_KEY or "offline-benchmark"
+    ai_client._model = gemini
@@ -0,0 +1,170 @@
+import os
+import time
+import queue
+import shutil
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, List
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+logger = logging.getLogger("docgen.conversion_batcher")
+
+# --- Batching Configuration ---
+SOFFICE_BATCH_WINDOW_MS = float(os.getenv("SOFFICE_BATCH_WINDOW_MS", "50"))  # how long a batch collects; 0 disables
+SOFFICE_BATCH_MAX = int(os.getenv("SOFFICE_BATCH_MAX", "16"))                # documents per soffice invocation
+SOFFICE_BATCH_WORKERS = int(os.getenv("SOFFICE_BATCH_WORKERS", "2"))         # invocations running at once
+SOFFICE_BATCH_TIMEOUT = float(os.getenv("SOFFICE_BATCH_TIMEOUT", "300"))     # a caller gives up on its result after this
+
+
+class _Request:
+    def __init__(self, docx_path: str, out_dir: str):
+        self.docx_path = docx_path
+        self.out_dir = out_dir
+        self.stem = Path(docx_path).stem
+        self.future = Future()
+
+
+class ConversionBatcher:
+    """
+    Groups concurrent DOCX -> PDF conversions into one soffice invocation.
+
+    A batch collects requests for `window` seconds or until `max_batch` are queued, converts them
+    with `convert_many(paths, out_dir)` into a scratch directory and moves each PDF to its caller's
+    out_dir. Documents missing from a batch's output are retried one by one with `convert_one`, so a
+    single bad file only fails its own caller. A caller waits at most `timeout` seconds (queueing
+    included) and then gets False; the converters are expected to bound their own runs.
+    """
+
+    def __init__(
+        self,
+        convert_many: Callable[[List[str], str], bool],
+        convert_one: Callable[[str, str], bool],
+        window: float = SOFFICE_BATCH_WINDOW_MS / 1000,
+        max_batch: int = SOFFICE_BATCH_MAX,
+        workers: int = SOFFICE_BATCH_WORKERS,
+        timeout: float = SOFFICE_BATCH_TIMEOUT,
+    ):
+        self.convert_many = convert_many
+        self.convert_one = convert_one
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.documents = 0
+        self.retried = 0
+        self.timed_out = 0
+
+    def convert(self, docx_path: str, out_dir: str) -> bool:
+        request = _Request(docx_path, out_dir)
+        self._start().put(request)
+        try:
+            return request.future.result(timeout=self.timeout)
+        except FutureTimeout:
+            self.timed_out += 1
+            logger.error(f"No conversion result for {request.stem} after {self.timeout:g}s, giving up")
+            return False
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "documents": self.documents,
+            "retried": self.retried,
+            "timed_out": self.timed_out,
+            "avg_batch": round(self.documents / self.batches, 2) if self.batches else 0,
+            "queued": self._queue.qsize(),
+        }
+
+    def _start(self) -> queue.Queue:
+        """The queue to put requests on, with workers (re)started if there are none."""
+        with self._lock:
+            if not self._threads:
+                for i in range(self.workers):
+                    t = threading.Thread(target=self._loop, args=(self._queue,), name=f"soffice-batch-{i}", daemon=True)
+                    t.start()
+                    self._threads.append(t)
+            return self._queue
+
+    def _collect(self, first: _Request, requests: queue.Queue) -> List[_Request]:
+        batch = [first]
+        stems = {first.stem}
+        deferred = []
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                requests.put(None)  # shutdown marker belongs to the loop
+                break
+            # One --outdir per invocation: two inputs with the same name would overwrite each other
+            if request.stem in stems:
+                deferred.append(request)
+            else:
+                stems.add(request.stem)
+                batch.append(request)
+        for request in deferred:
+            requests.put(request)
+        return batch
+
+    def _loop(self, requests: queue.Queue):
+        while True:
+            first = requests.get()
+            if first is None:
+                return
+            batch = self._collect(first, requests)
+            try:
+                self._run(batch)
+            except Exception as e:
+                logger.exception("Conversion batch crashed")
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _run(self, batch: List[_Request]):
+        self.batches += 1
+        self.documents += len(batch)
+        scratch = Path(tempfile.mkdtemp(prefix="soffice-batch-"))
+        try:
+            if not self.convert_many([r.docx_path for r in batch], str(scratch)):
+                logger.warning(f"Batch of {len(batch)} conversions reported failure")
+
+            failed = []
+            for request in batch:
+                produced = scratch / f"{request.stem}.pdf"
+                if produced.exists():
+                    shutil.move(str(produced), str(Path(request.out_dir) / produced.name))
+                    request.future.set_result(True)
+                else:
+                    failed.append(request)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+        if len(batch) > 1 and failed:
+            logger.warning(f"{len(failed)} of {len(batch)} documents missing from batch output, retrying one by one")
+        for request in failed:
+            if len(batch) == 1:
+                request.future.set_result(False)  # already tried on its own
+                continue
+            self.retried += 1
+            try:
+                request.future.set_result(self.convert_one(request.docx_path, request.out_dir))
+            except Exception as e:
+                request.future.set_exception(e)
+
+    def shutdown(self):
+        """Stops the workers once they have drained what is queued; a later convert() starts new ones."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+            requests, self._queue = self._queue, queue.Queue()
+        for _ in threads:
+            requests.put(None)
@@ -1,7 +1,10 @@
 import os
+import asyncio
 import logging
-from azure.cosmos import CosmosClient, PartitionKey, exceptions
+import threading
+from pathlib import Path
 from dotenv import load_dotenv
+from fastapi import HTTPException
 
 load_dotenv()
 
@@ -12,9 +15,24 @@ COSMOS_URI = os.getenv("COSMOS_DB_URI")
 COSMOS_KEY = os.getenv("COSMOS_DB_KEY")
 COSMOS_DB_NAME = os.getenv("COSMOS_DB_NAME", "docorator_db")
 
+# --- Backend Selection ---
+# cosmos: Azure Cosmos DB; sqlite: a local file (single node); memory: SQLite in memory (dev, benchmarks)
+DB_BACKEND = os.getenv("DB_BACKEND", "cosmos").strip().lower()
+SQLITE_DB_PATH = os.getenv(
+    "SQLITE_DB_PATH",
+    str(Path(os.getenv("STORAGE_DIR", Path(__file__).resolve().parent.parent / "data")) / "docgen.db")
+)
+
+# --- Startup Initialization ---
+DB_INIT_RETRIES = int(os.getenv("DB_INIT_RETRIES", "5"))           # attempts made by the startup task
+DB_INIT_BACKOFF = float(os.getenv("DB_INIT_BACKOFF", "1"))         # seconds before the 2nd attempt, doubled after
+DB_INIT_BACKOFF_MAX = float(os.getenv("DB_INIT_BACKOFF_MAX", "30"))
+
 users_container = None
 documents_container = None
+sqlite_store = None
 init_error = None  # Capture initialization error
+_init_lock = threading.Lock()
 
 def init_cosmos():
     global users_container, documents_container, init_error
@@ -23,6 +41,9 @@ def init_cosmos():
         return
 
     try:
+        # Imported here rather than at module level: azure.cosmos is slow to import
+        from azure.cosmos import CosmosClient, PartitionKey, exceptions
+
         client = CosmosClient(COSMOS_URI, credential=COSMOS_KEY)
         db = client.create_database_if_not_exists(id=COSMOS_DB_NAME)
         
@@ -51,19 +72,80 @@ def init_cosmos():
         users_container = None
         documents_container = None
 
-# Initialize on import (or can be called by startup event)
-init_cosmos()
+def init_sqlite():
+    global sqlite_store, init_error
+    from sqlite_store import SQLiteStore, MEMORY
+
+    try:
+        sqlite_store = SQLiteStore(MEMORY if DB_BACKEND == "memory" else SQLITE_DB_PATH)
+        init_error = None
+    except Exception as e:
+        logger.exception(f"Failed to initialize SQLite database: {str(e)}")
+        init_error = str(e)
+        sqlite_store = None
+
+def is_ready() -> bool:
+    if DB_BACKEND in ("sqlite", "memory"):
+        return sqlite_store is not None
+    return users_container is not None
+
+def init_db() -> bool:
+    """One connection attempt (skipped when already connected). Blocking; callers take turns."""
+    with _init_lock:
+        if not is_ready():
+            if DB_BACKEND in ("sqlite", "memory"):
+                init_sqlite()
+            else:
+                init_cosmos()
+        return is_ready()
+
+async def init_db_async(retries: int = DB_INIT_RETRIES) -> bool:
+    """
+    Startup initialization, off the import path and off the event loop: up to `retries` attempts
+    with exponential backoff. Requests that arrive first make their own attempt in get_db().
+    """
+    delay = DB_INIT_BACKOFF
+    for attempt in range(1, retries + 1):
+        if await asyncio.to_thread(init_db):
+            return True
+        if DB_BACKEND == "cosmos" and not (COSMOS_URI and COSMOS_KEY):
+            return False  # nothing a retry could change
+        if attempt < retries:
+            logger.warning(f"Database init attempt {attempt}/{retries} failed, retrying in {delay:g}s")
+            await asyncio.sleep(delay)
+            delay = min(DB_INIT_BACKOFF_MAX, delay * 2)
+    logger.error(f"Database not initialized after {retries} attempts: {init_error}")
+    return False
+
+def _unavailable() -> HTTPException:
+    # Not the caller's fault and usually brief (startup, a Cosmos outage): 503 so clients retry
+    logger.warning(f"Database not initialized. Last Error: {init_error}")
+    return HTTPException(
+        status_code=503,
+        detail="Database is not available yet, try again shortly",
+        headers={"Retry-After": "5"},
+    )
 
 def get_db():
     """Dependency for FastAPI routes"""
     # For Cosmos, we just return the containers or a wrapper
     # Since we are using global clients, we can just return a dict or similar
+    if not is_ready():
+        # Try to init again if failed previously (or the startup task has not got there yet)
+        init_db()
+
+    if DB_BACKEND in ("sqlite", "memory"):
+        if sqlite_store is None:
+            raise _unavailable()
+        # The store's repositories stand in for the containers (see repository.Repository)
+        return {
+            "users": sqlite_store.users,
+            "documents": sqlite_store.documents,
+            "store": sqlite_store
+        }
+
     if users_container is None:
-        # Try to init again if failed previously
-        init_cosmos()
-        if users_container is None:
-             error_msg = f"Database not initialized. Last Error: {init_error}" if init_error else "Database not initialized"
-             raise Exception(error_msg)
+        raise _unavailable()
     
     return {
         "users": users_container,
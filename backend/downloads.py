@@ -0,0 +1,115 @@
+import logging
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+
+from fastapi import Request, HTTPException
+from fastapi.responses import Response, FileResponse, StreamingResponse
+
+from storage import StorageBackend, ObjectStat
+
+logger = logging.getLogger("docgen.downloads")
+
+MEDIA_TYPES = {
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "pdf": "application/pdf",
+}
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 asks for If-None-Match
+    tags = [t.strip() for t in header.split(",")]
+    return any(t == etag or t == f"W/{etag}" for t in tags)
+
+
+def _not_modified(request: Request, st: ObjectStat) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        return _etag_matches(inm, st.etag)
+    ims = request.headers.get("if-modified-since")
+    if ims:
+        try:
+            return int(st.mtime) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    A single 'bytes=a-b' / 'bytes=a-' / 'bytes=-n' range as inclusive (start, end).
+    Returns None to ignore the header (multi-range, other units, junk) and send the whole file;
+    raises 416 when the range is well-formed but outside the file.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            start, end = max(size - int(last), 0), size - 1
+    except ValueError:
+        return None
+    if start > end and last:
+        return None
+    if start >= size or size == 0:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, min(end, size - 1)
+
+
+def object_response(request: Request, backend: StorageBackend, key: str, filename: str, fmt: str) -> Response:
+    """
+    Sends a stored file with validators: 304 for a matching If-None-Match / If-Modified-Since,
+    206 for a single byte range, otherwise the whole file (zero-copy when the backend is local
+    and the server supports it).
+    """
+    st = backend.stat(key)
+    if st is None:
+        raise HTTPException(status_code=404, detail=f"File ({fmt}) not found on server")
+
+    headers = {
+        "ETag": st.etag,
+        "Last-Modified": formatdate(st.mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",  # revalidate; a 304 costs one stat
+    }
+    if _not_modified(request, st):
+        return Response(status_code=304, headers=headers)
+
+    media_type = MEDIA_TYPES.get(fmt, "application/octet-stream")
+    disposition = f'attachment; filename="{filename}"'
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header:
+        if_range = request.headers.get("if-range")
+        # A stale If-Range means the client's partial copy is outdated: send everything
+        if not if_range or if_range.strip() == st.etag:
+            byte_range = _parse_range(range_header, st.size)
+
+    if byte_range:
+        start, end = byte_range
+        headers.update({
+            "Content-Range": f"bytes {start}-{end}/{st.size}",
+            "Content-Length": str(end - start + 1),
+            "Content-Disposition": disposition,
+        })
+        return StreamingResponse(backend.stream(key, start, end), status_code=206, media_type=media_type, headers=headers)
+
+    path = backend.local_path(key)
+    if path is not None:
+        # FileResponse uses the server's pathsend/sendfile extension when it has one
+        return FileResponse(path=str(path), filename=filename, media_type=media_type, headers=headers, stat_result=st.raw)
+
+    headers.update({"Content-Length": str(st.size), "Content-Disposition": disposition})
+    return StreamingResponse(backend.stream(key), media_type=media_type, headers=headers)
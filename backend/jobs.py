@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from pathlib import Path
+from typing import Optional, Callable, Awaitable
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+logger = logging.getLogger("docgen.jobs")
+
+# --- Job Configuration ---
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))             # jobs running at once (and threads for blocking stages)
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "100"))   # queued + running jobs before we answer 503
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))  # finished jobs are forgotten after this
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+JOB_SAVE_INTERVAL = float(os.getenv("JOB_SAVE_INTERVAL", "0.2"))  # state writes of a running job are coalesced over this
+
+STAGES = ("ai", "render", "pdf", "persist")
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id: str, user_id: str, doc_type: str):
+        self.id = job_id
+        self.user_id = user_id
+        self.doc_type = doc_type
+        self.status = "queued"      # queued -> running -> succeeded | failed
+        self.stage = None
+        self.events = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "doc_type": self.doc_type,
+            "status": self.status,
+            "stage": self.stage,
+            "events": self.events,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Job":
+        job = cls(data["id"], data["user_id"], data.get("doc_type", ""))
+        job.status = data.get("status", "queued")
+        job.stage = data.get("stage")
+        job.events = data.get("events", [])
+        job.result = data.get("result")
+        job.error = data.get("error")
+        job.created_at = data.get("created_at", job.created_at)
+        job.updated_at = data.get("updated_at", job.updated_at)
+        return job
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+
+class JobManager:
+    """
+    Runs generation jobs in the background of the current worker.
+
+    At most JOB_WORKERS jobs run at once; blocking stages are handed to a
+    bounded thread pool. Job state is also written to `state_dir` so that
+    /jobs/{id} works no matter which gunicorn worker serves the poll; those
+    writes happen on one writer thread (so they land in order), at most once
+    per JOB_SAVE_INTERVAL while a job runs and right away when it finishes.
+    """
+
+    def __init__(self, state_dir: Path, workers: int = JOB_WORKERS, max_pending: int = JOB_MAX_PENDING):
+        self.state_dir = Path(state_dir)
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="docgen-job")
+        self.max_pending = max_pending
+        self._slots = None
+        self._workers = workers
+        self._jobs = {}
+        self._tasks = set()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="docgen-job-state")
+        self._pending_saves = {}  # job id -> TimerHandle of its coalesced write
+
+    # --- persistence ---
+
+    def _path(self, job_id: str) -> Path:
+        return self.state_dir / f"{job_id}.json"
+
+    def _write(self, job_id: str, data: str):
+        tmp = self._path(job_id).with_suffix(".tmp")
+        try:
+            tmp.write_text(data)
+            os.replace(tmp, self._path(job_id))
+        except Exception as e:
+            logger.error(f"Failed to persist job {job_id}: {e}")
+
+    def _flush(self, job: Job):
+        """Queues a write of the job's current state; returns its future."""
+        handle = self._pending_saves.pop(job.id, None)
+        if handle is not None:
+            handle.cancel()
+        return self._writer.submit(self._write, job.id, json.dumps(job.to_dict()))
+
+    def _save(self, job: Job):
+        # Streamed fields publish many events per second; one write per interval carries them all
+        job.updated_at = time.time()
+        if job.id not in self._pending_saves:
+            self._pending_saves[job.id] = asyncio.get_running_loop().call_later(JOB_SAVE_INTERVAL, self._flush, job)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        # Job may belong to another worker process
+        try:
+            return Job.from_dict(json.loads(self._path(job_id).read_text()))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    # --- lifecycle ---
+
+    def publish(self, job: Job, event: dict):
+        event = {"seq": len(job.events) + 1, "ts": time.time(), **event}
+        job.events.append(event)
+        if event.get("type") == "stage":
+            job.stage = event["stage"]
+        self._save(job)
+
+    def stage_reporter(self, job: Job) -> Callable[[str, str], None]:
+        def report(stage: str, status: str):
+            self.publish(job, {"type": "stage", "stage": stage, "status": status})
+        return report
+
+    def partial_reporter(self, job: Job) -> Callable[[dict], None]:
+        def report(event: dict):
+            # event is {"type": "field"|"item", "key": ..., ["index": ...,] "value": ...}
+            self.publish(job, event)
+        return report
+
+    def submit(self, user_id: str, doc_type: str, runner: Callable[[Job], Awaitable[dict]]) -> Job:
+        self._prune()
+        pending = sum(1 for j in self._jobs.values() if not j.finished)
+        if pending >= self.max_pending:
+            raise JobQueueFull(f"{pending} jobs already pending")
+
+        job = Job(uuid.uuid4().hex, user_id, doc_type)
+        self._jobs[job.id] = job
+        # Not coalesced: the 202 sends clients polling (possibly another worker) straight to /jobs/{id}
+        self._flush(job)
+
+        task = asyncio.create_task(self._run(job, runner))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: Job, runner: Callable[[Job], Awaitable[dict]]):
+        if self._slots is None:
+            # Created lazily so it binds to the running event loop
+            self._slots = asyncio.Semaphore(self._workers)
+
+        async with self._slots:
+            job.status = "running"
+            self._save(job)
+            try:
+                job.result = await runner(job)
+                job.status = "succeeded"
+                self.publish(job, {"type": "done", "result": job.result})
+            except HTTPException as he:
+                job.status = "failed"
+                job.error = {"status_code": he.status_code, "detail": he.detail}
+                self.publish(job, {"type": "error", **job.error})
+            except Exception as e:
+                logger.exception(f"Job {job.id} crashed")
+                job.status = "failed"
+                job.error = {"status_code": 500, "detail": str(e)}
+                self.publish(job, {"type": "error", **job.error})
+            # Pollers on other workers see the outcome as soon as it is known
+            await asyncio.wrap_future(self._flush(job))
+
+    def _prune(self):
+        cutoff = time.time() - JOB_TTL_SECONDS
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and job.updated_at < cutoff:
+                del self._jobs[job_id]
+                try:
+                    os.remove(self._path(job_id))
+                except OSError:
+                    pass
+
+    async def stream_events(self, job_id: str, after: int = 0):
+        """Yields job events with seq > after until the job finishes."""
+        last_seq = after
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                return
+            for event in job.events:
+                if event["seq"] > last_seq:
+                    last_seq = event["seq"]
+                    yield event
+            if job.finished:
+                return
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+    def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        for job_id in list(self._pending_saves):
+            self._flush(self._jobs[job_id])
+        self.executor.shutdown(wait=False)
+        self._writer.shutdown(wait=True)
@@ -0,0 +1,172 @@
+import json
+import logging
+
+logger = logging.getLogger("docgen.json_stream")
+
+_WHITESPACE = " \t\r\n"
+
+
+class IncrementalJSONParser:
+    """
+    Feeds on text chunks of a (possibly chatty) model response that contains one JSON object.
+
+    feed() returns events as soon as they are complete:
+      {"type": "field", "key": k, "value": v}               a top-level field
+      {"type": "item", "key": k, "index": i, "value": v}    one element of a top-level array
+
+    Anything before the first '{' (markdown fences, prose) and after the matching '}' is ignored.
+    """
+
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0
+        self.started = False
+        self.done = False
+        self.obj_start = None
+        self.obj_end = None
+
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+
+        self.expect_key = True
+        self.key_start = None
+        self.key = None
+        self.value_start = None
+
+        self.array_key = None
+        self.item_start = None
+        self.item_index = 0
+
+    def feed(self, chunk: str) -> list:
+        self.buf += chunk
+        events = []
+        buf = self.buf
+        i = self.pos
+
+        while i < len(buf) and not self.done:
+            c = buf[i]
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    if len(self.stack) == 1 and self.expect_key and self.key_start is not None:
+                        self.key = self._loads(buf[self.key_start:i + 1])
+                        self.key_start = None
+                i += 1
+                continue
+
+            if not self.started:
+                if c == "{":
+                    self.started = True
+                    self.obj_start = i
+                    self.stack = ["{"]
+                i += 1
+                continue
+
+            depth = len(self.stack)
+
+            if c == '"':
+                self.in_string = True
+                if depth == 1:
+                    if self.expect_key:
+                        self.key_start = i
+                    elif self.value_start is None:
+                        self.value_start = i
+                elif depth == 2 and self.stack[-1] == "[" and self.item_start is None:
+                    self.item_start = i
+                i += 1
+                continue
+
+            if c in _WHITESPACE:
+                i += 1
+                continue
+
+            if depth == 1:
+                if c == ":":
+                    self.expect_key = False
+                    self.value_start = None
+                elif c == ",":
+                    self._finish_field(i, events)
+                    self.expect_key = True
+                elif c == "}":
+                    if not self.expect_key:
+                        self._finish_field(i, events)
+                    self.stack.pop()
+                    self.done = True
+                    self.obj_end = i + 1
+                else:
+                    if self.value_start is None:
+                        self.value_start = i
+                    if c in "{[":
+                        self.stack.append(c)
+                        if c == "[":
+                            self.array_key = self.key
+                            self.item_index = 0
+                            self.item_start = None
+                i += 1
+                continue
+
+            if depth == 2 and self.stack[-1] == "[":
+                if c == ",":
+                    self._finish_item(i, events)
+                elif c == "]":
+                    self._finish_item(i, events)
+                    self.stack.pop()
+                else:
+                    if self.item_start is None:
+                        self.item_start = i
+                    if c in "{[":
+                        self.stack.append(c)
+                i += 1
+                continue
+
+            if c in "{[":
+                self.stack.append(c)
+            elif c in "}]":
+                self.stack.pop()
+            i += 1
+
+        self.pos = i
+        return events
+
+    def _loads(self, text):
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+
+    def _finish_field(self, end: int, events: list):
+        if self.value_start is None or self.key is None:
+            return
+        text = self.buf[self.value_start:end].strip()
+        self.value_start = None
+        try:
+            events.append({"type": "field", "key": self.key, "value": json.loads(text)})
+        except ValueError:
+            logger.debug(f"Skipping unparsable partial field {self.key!r}")
+
+    def _finish_item(self, end: int, events: list):
+        if self.item_start is None:
+            return
+        text = self.buf[self.item_start:end].strip()
+        self.item_start = None
+        try:
+            events.append({"type": "item", "key": self.array_key, "index": self.item_index, "value": json.loads(text)})
+        except ValueError:
+            logger.debug(f"Skipping unparsable partial item {self.array_key!r}[{self.item_index}]")
+        self.item_index += 1
+
+    @property
+    def text(self) -> str:
+        return self.buf
+
+    def result(self) -> dict:
+        """The complete object (trailing junk after it is ignored). Raises ValueError if it never closed."""
+        if not self.done:
+            raise ValueError("JSON object is incomplete")
+        return json.loads(self.buf[self.obj_start:self.obj_end])
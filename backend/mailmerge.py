@@ -0,0 +1,164 @@
+import io
+import os
+import csv
+import json
+import shutil
+import logging
+import tempfile
+import zipfile
+from collections import deque
+from pathlib import Path
+from typing import Iterator, Iterable, Tuple
+from concurrent.futures import ThreadPoolExecutor
+
+from template_registry import registry
+from template_renderer import convert_to_pdf
+import metrics
+
+logger = logging.getLogger("docgen.mailmerge")
+
+# --- Mail Merge Configuration ---
+MAILMERGE_WORKERS = int(os.getenv("MAILMERGE_WORKERS", "4"))        # rows rendered at once
+MAILMERGE_MAX_ROWS = int(os.getenv("MAILMERGE_MAX_ROWS", "20000"))
+MAILMERGE_FORMATS = ("docx", "pdf", "both")
+
+
+class RowError(Exception):
+    pass
+
+
+def _cell(value: str):
+    # Lists and nested objects (skills, experience, ...) can be given as JSON inside a cell
+    text = (value or "").strip()
+    if text[:1] in ("[", "{"):
+        try:
+            return json.loads(text)
+        except ValueError:
+            pass
+    return value
+
+
+def iter_rows(fileobj, filename: str) -> Iterator[Tuple[int, object]]:
+    """
+    Lazily yields (row_number, fields) from a CSV (header row) or JSONL upload.
+    A row that cannot be parsed is yielded as a RowError instead of fields.
+    """
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    if filename.lower().endswith((".jsonl", ".ndjson")):
+        row = 0
+        for line in text:
+            if not line.strip():
+                continue
+            row += 1
+            try:
+                fields = json.loads(line)
+                if not isinstance(fields, dict):
+                    raise ValueError("line is not a JSON object")
+                yield row, fields
+            except ValueError as e:
+                yield row, RowError(f"Invalid JSON: {e}")
+    else:
+        for row, record in enumerate(csv.DictReader(text), start=1):
+            if None in record:
+                yield row, RowError("More cells than header columns")
+                continue
+            yield row, {k: _cell(v) for k, v in record.items() if k}
+
+
+class _ZipSink:
+    """Write-only, unseekable file object: zipfile writes here, the response drains it."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> Iterator[bytes]:
+        if self.chunks:
+            data = b"".join(self.chunks)
+            self.chunks = []
+            yield data
+
+
+def _render_row(template_path: Path, doc_type: str, row: int, fields: dict, fmt: str, workdir: Path) -> list:
+    """Returns [(archive_name, bytes), ...] for one row."""
+    name = f"{doc_type}_{row:05d}"
+    buf = io.BytesIO()
+    with metrics.track("render_docx", doc_type):
+        registry.get(template_path).render(fields).save(buf)
+    docx_bytes = buf.getvalue()
+
+    files = []
+    if fmt in ("docx", "both"):
+        files.append((f"{name}.docx", docx_bytes))
+    if fmt in ("pdf", "both"):
+        row_dir = workdir / name
+        row_dir.mkdir()
+        try:
+            docx_path = row_dir / f"{name}.docx"
+            docx_path.write_bytes(docx_bytes)
+            if not convert_to_pdf(str(docx_path), str(row_dir), doc_type):
+                raise RowError("PDF conversion failed")
+            files.append((f"{name}.pdf", (row_dir / f"{name}.pdf").read_bytes()))
+        finally:
+            shutil.rmtree(row_dir, ignore_errors=True)
+    return files
+
+
+def merge_to_zip(template_path: Path, doc_type: str, rows: Iterable, fmt: str = "docx") -> Iterator[bytes]:
+    """
+    Renders every row and yields the ZIP archive piece by piece.
+    At most 2 * MAILMERGE_WORKERS rows are in flight, so memory stays flat however long the input is;
+    entries keep input order. Failed rows are listed in manifest.json, the last entry of the archive.
+    """
+    sink = _ZipSink()
+    archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED)  # DOCX/PDF are already compressed
+    executor = ThreadPoolExecutor(max_workers=MAILMERGE_WORKERS, thread_name_prefix="docgen-merge")
+    workdir = Path(tempfile.mkdtemp(prefix="mailmerge-"))
+    in_flight = deque()
+    manifest = {"doc_type": doc_type, "format": fmt, "rows": 0, "succeeded": 0, "failed": 0, "errors": []}
+
+    def collect(row, future):
+        try:
+            for name, data in future.result():
+                archive.writestr(name, data)
+            manifest["succeeded"] += 1
+        except Exception as e:
+            manifest["failed"] += 1
+            manifest["errors"].append({"row": row, "error": str(e)})
+
+    try:
+        for row, fields in rows:
+            if row > MAILMERGE_MAX_ROWS:
+                manifest["errors"].append({"row": row, "error": f"Row limit of {MAILMERGE_MAX_ROWS} reached, rest skipped"})
+                break
+            manifest["rows"] += 1
+            if isinstance(fields, RowError):
+                manifest["failed"] += 1
+                manifest["errors"].append({"row": row, "error": str(fields)})
+                continue
+
+            in_flight.append((row, executor.submit(_render_row, template_path, doc_type, row, fields, fmt, workdir)))
+            while len(in_flight) >= 2 * MAILMERGE_WORKERS:
+                collect(*in_flight.popleft())
+                yield from sink.drain()
+
+        while in_flight:
+            collect(*in_flight.popleft())
+            yield from sink.drain()
+
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2), compress_type=zipfile.ZIP_DEFLATED)
+        archive.close()
+        yield from sink.drain()
+        logger.info(f"Mail merge of {manifest['rows']} rows done ({manifest['failed']} failed)")
+    finally:
+        # Also runs when the client disconnects mid-download
+        for _, future in in_flight:
+            future.cancel()
+        executor.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -1,21 +1,43 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, UploadFile, File, Form
 from pydantic import BaseModel
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, PlainTextResponse
 from pathlib import Path
 import uuid
+import json
+import time
+import tempfile
+import asyncio
 import logging
-from typing import Optional, Dict
+import functools
+from typing import Optional, Dict, List
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
 
 load_dotenv(override=False)
 
-from template_renderer import render_docx, convert_to_pdf
-from ai_client import generate_structured_with_gemini, GeminiError
-from database import get_db
+from template_renderer import render_docx, convert_to_pdf, conversion_stats, shutdown_batcher
+from soffice_pool import shutdown_pool
+from template_registry import registry
+from prompts import PROMPTS
+from render_cache import artifact_key, artifact_stem
+import artifacts
+from artifacts import STORAGE_DIR, GENERATED, storage
+from downloads import object_response
+from mailmerge import merge_to_zip, iter_rows, MAILMERGE_FORMATS
+from repository import Repository, get_repo
+from singleflight import SingleFlight, file_lock, all_stats as singleflight_stats
+from jobs import JobManager, JobQueueFull
+from ai_client import generate_structured_with_gemini_async, GeminiError, cache_stats as gemini_cache_stats, get_model as get_gemini_model, GEMINI_KEY
+from native_pdf import native_available
+from database import get_db, init_db_async, is_ready as db_is_ready, DB_BACKEND
+from sweeper import Sweeper, SWEEP_INTERVAL_HOURS
 from models import User, Document
-from auth import get_password_hash, verify_password, create_access_token, get_current_user
+from auth import create_access_token, get_current_user, invalidate_user, user_cache_stats
+import metrics
+from passwords import hash_password_async, verify_password_async, verify_and_update_async, shutdown_pool as shutdown_password_pool
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 # Init Database Tables
 # Base.metadata.create_all(bind=engine) # Removed for Cosmos DB
@@ -33,15 +55,16 @@ logger = logging.getLogger("docgen")
 
 BASE_DIR = Path(__file__).resolve().parent         # backend/app
 
-# Use same persistent storage logic as database
+# Persistent storage paths (STORAGE_DIR, GENERATED) live in artifacts.py
 import os
-STORAGE_DIR = Path(os.getenv("STORAGE_DIR", BASE_DIR.parent / "data"))
-GENERATED = STORAGE_DIR / "generated"           # backend/generated or /home/data/generated
 TEMPLATES_DIR = BASE_DIR / "templates"              # backend/app/templates
 
 GENERATED.mkdir(parents=True, exist_ok=True)
 TEMPLATES_DIR.mkdir(parents=True, exist_ok=True)
 
+# eager: /generate converts the PDF before returning; lazy: the first PDF download converts it
+PDF_MODE = os.getenv("PDF_MODE", "eager").lower()
+
 
 from fastapi.staticfiles import StaticFiles
 
@@ -113,6 +136,37 @@ def debug_init():
     from database import init_error
     return {"init_error": str(init_error) if init_error else "None (Success?)"}
 
+def _component_metrics() -> dict:
+    # The stats() counters the components already keep, sampled at scrape time
+    flights = singleflight_stats()
+    caches = {"users": user_cache_stats()}
+    gemini = gemini_cache_stats()
+    if "memory" in gemini:
+        caches["gemini"] = gemini["memory"]
+    return {
+        "docgen_singleflight_in_flight": {name: s["in_flight"] for name, s in flights.items()},
+        "docgen_singleflight_coalesced": {name: s["coalesced"] for name, s in flights.items()},
+        "docgen_cache_hits": {name: s["hits"] for name, s in caches.items()},
+        "docgen_cache_misses": {name: s["misses"] for name, s in caches.items()},
+        "docgen_pdf_batcher": conversion_stats(),
+    }
+
+metrics.register_collector(_component_metrics)
+
+@app.get("/metrics")
+def metrics_endpoint():
+    # Per worker process: under gunicorn each scrape reports the worker that answered it
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/debug-cache")
+def debug_cache():
+    return {"gemini": gemini_cache_stats(), "users": user_cache_stats(), "singleflight": singleflight_stats(), "pdf_batches": conversion_stats()}
+
+@app.get("/debug-sweeper")
+def debug_sweeper():
+    # Last pass of any worker (dry runs included); counts only, the samples stay in the state file
+    return sweeper.last_report()
+
 # --- AUTH ROUTER ---
 
 class UserSchema(BaseModel):
@@ -124,38 +178,31 @@ class UserSchema(BaseModel):
     security_answer: str
 
 @app.post("/auth/signup")
-def signup(user: UserSchema, db: dict = Depends(get_db)):
+async def signup(user: UserSchema, repo: Repository = Depends(get_repo)):
     try:
-        users_container = db["users"]
-        
-        # Check if exists
-        query = "SELECT * FROM c WHERE c.email = @email"
-        # Optimize query: set partition key if possible, but email is PK so this is cross-partition by default unless scoped?
-        # Actually PK is /email, so we can scope it!
-        # But 'query_items' with enable_cross_partition_query=True is safer for now.
-        
-        items = list(users_container.query_items(
-            query=query, 
-            parameters=[{"name": "@email", "value": user.email}],
-            enable_cross_partition_query=True
-        ))
-        
-        if items:
+        # Check if exists (PK is /email, so this stays inside one partition)
+        if await run_in_threadpool(repo.users.exists, user.email):
             raise HTTPException(status_code=400, detail="Email already registered")
         
+        # Both bcrypt hashes run in the hashing process pool, side by side
+        hashed_password, security_answer_hash = await asyncio.gather(
+            hash_password_async(user.password),
+            hash_password_async(user.security_answer)
+        )
+
         # Create User Model
         new_user = User(
             email=user.email,
-            hashed_password=get_password_hash(user.password),
+            hashed_password=hashed_password,
             full_name=user.full_name,
             profession=user.profession,
             security_question=user.security_question,
-            security_answer_hash=get_password_hash(user.security_answer),
+            security_answer_hash=security_answer_hash,
             partitionKey=user.email # Set partition key
         )
         
-        # Save to Cosmos (dump model to dict)
-        users_container.create_item(body=new_user.dict(by_alias=True))
+        # Save to Cosmos
+        await run_in_threadpool(repo.users.create, new_user)
         
         return {"msg": "User created successfully"}
     except HTTPException as he:
@@ -183,21 +230,16 @@ def read_users_me(current_user: User = Depends(get_current_user)):
     return current_user
 
 @app.put("/auth/me", response_model=UserProfile)
-def update_user_me(user_update: UserUpdate, current_user: User = Depends(get_current_user), db: dict = Depends(get_db)):
-    users_container = db["users"]
-    
+def update_user_me(user_update: UserUpdate, current_user: User = Depends(get_current_user), repo: Repository = Depends(get_repo)):
     # Update fields if provided
     if user_update.full_name is not None:
         current_user.full_name = user_update.full_name
     if user_update.profession is not None:
         current_user.profession = user_update.profession
     
-    # Check partition key presence
-    if not current_user.partitionKey:
-        current_user.partitionKey = current_user.email
-        
     # Upsert in Cosmos
-    users_container.upsert_item(body=current_user.dict(by_alias=True))
+    repo.users.upsert(current_user)
+    invalidate_user(current_user.email)
     
     return current_user
 
@@ -210,69 +252,57 @@ class ResetPasswordRequest(BaseModel):
     new_password: str
 
 @app.post("/auth/get-question")
-def get_security_question(req: GetQuestionRequest, db: dict = Depends(get_db)):
-    users_container = db["users"]
-    query = "SELECT * FROM c WHERE c.email = @email"
-    items = list(users_container.query_items(
-        query=query, 
-        parameters=[{"name": "@email", "value": req.email}],
-        enable_cross_partition_query=True
-    ))
+def get_security_question(req: GetQuestionRequest, repo: Repository = Depends(get_repo)):
+    user = repo.users.get_by_email(req.email)
     
-    if not items:
+    if not user:
         raise HTTPException(status_code=404, detail="User not found")
-        
-    user = User(**items[0])
     
     if not user.security_question:
          raise HTTPException(status_code=400, detail="User has no security question set")
     return {"question": user.security_question}
 
 @app.post("/auth/reset-password")
-def reset_password(req: ResetPasswordRequest, db: dict = Depends(get_db)):
-    users_container = db["users"]
-    query = "SELECT * FROM c WHERE c.email = @email"
-    items = list(users_container.query_items(
-        query=query, 
-        parameters=[{"name": "@email", "value": req.email}],
-        enable_cross_partition_query=True
-    ))
+async def reset_password(req: ResetPasswordRequest, repo: Repository = Depends(get_repo)):
+    user = await run_in_threadpool(repo.users.get_by_email, req.email)
     
-    if not items:
+    if not user:
          raise HTTPException(status_code=404, detail="User not found")
     
-    user = User(**items[0])
-    
     if not user.security_answer_hash:
           raise HTTPException(status_code=400, detail="User has no security answer set")
           
-    if not verify_password(req.security_answer, user.security_answer_hash):
+    if not await verify_password_async(req.security_answer, user.security_answer_hash):
          raise HTTPException(status_code=400, detail="Incorrect security answer")
          
     # Reset Password
-    user.hashed_password = get_password_hash(req.new_password)
-    
-    if not user.partitionKey:
-        user.partitionKey = user.email
+    user.hashed_password = await hash_password_async(req.new_password)
 
-    users_container.upsert_item(body=user.dict(by_alias=True))
+    await run_in_threadpool(repo.users.upsert, user)
+    invalidate_user(user.email)
     
     return {"msg": "Password reset successfully"}
 
 @app.post("/auth/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: dict = Depends(get_db)):
-    users_container = db["users"]
-    query = "SELECT * FROM c WHERE c.email = @email"
-    items = list(users_container.query_items(
-        query=query, 
-        parameters=[{"name": "@email", "value": form_data.username}],
-        enable_cross_partition_query=True
-    ))
-    
-    user = User(**items[0]) if items else None
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), repo: Repository = Depends(get_repo)):
+    user = await run_in_threadpool(repo.users.get_by_email, form_data.username)
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user:
+        raise HTTPException(status_code=400, detail="Incorrect email or password")
+
+    valid, new_hash = await verify_and_update_async(form_data.password, user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
+
+    if new_hash:
+        # Stored hash uses an older cost factor (or scheme): upgrade it while we have the password
+        user.hashed_password = new_hash
+        try:
+            await run_in_threadpool(repo.users.upsert, user)
+            invalidate_user(user.email)
+            logger.info(f"Rehashed password for {user.email}")
+        except Exception as e:
+            logger.error(f"Password rehash failed for {user.email}: {e}")
     
     access_token = create_access_token(
         data={"sub": user.email}, expires_delta=timedelta(days=7)
@@ -288,162 +318,203 @@ def check_db_schema():
     # Deprecated for Cosmos DB
     pass
 
+# --- STARTUP WARM-UP ---
+# Workers accept requests straight away; connecting to the database and the slow first-use work
+# (template parsing, the Gemini SDK, reportlab) run in the background. /ready tells when it is done.
+warmup = {"database": False, "templates": False, "gemini": False, "native_pdf": False}
+_warmup_task = None
+
+async def _warm(name: str, fn, *args):
+    start = time.perf_counter()
+    try:
+        if asyncio.iscoroutinefunction(fn):
+            warmup[name] = bool(await fn(*args))
+        else:
+            await run_in_threadpool(fn, *args)
+            warmup[name] = True
+        logger.info(f"Warm-up: {name} ready after {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        logger.exception(f"Warm-up of {name} failed: {e}")
+
+async def _warm_up():
+    steps = [
+        _warm("database", init_db_async),
+        # Parse every template once and warn about placeholders the prompts never fill
+        _warm("templates", registry.validate, TEMPLATES_DIR, PROMPTS),
+        _warm("native_pdf", native_available),
+    ]
+    if GEMINI_KEY:
+        steps.append(_warm("gemini", get_gemini_model))
+    await asyncio.gather(*steps)
+
+@app.on_event("startup")
+async def start_warmup():
+    global _warmup_task
+    _warmup_task = asyncio.create_task(_warm_up())
+
+# --- ARTIFACT SWEEPER ---
+# Orphaned/temporary files and expired documents; one worker per interval does the pass (sweeper.py)
+sweeper = Sweeper(lambda: Repository(get_db()))
+
+@app.on_event("startup")
+async def start_sweeper():
+    # The in-memory database never holds the records of the files on disk
+    if SWEEP_INTERVAL_HOURS > 0 and DB_BACKEND != "memory":
+        sweeper.start()
+
+@app.get("/ready")
+def readiness():
+    # Liveness stays on "/"; this one fails until the worker can actually serve documents
+    ready = db_is_ready() and warmup["templates"]
+    body = {"status": "ready" if ready else "starting", **warmup, "database": db_is_ready()}
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
+@app.on_event("shutdown")
+def stop_soffice_pool():
+    if _warmup_task is not None:
+        _warmup_task.cancel()
+    sweeper.stop()
+    shutdown_pool()
+    shutdown_batcher()
+    shutdown_password_pool()
+    jobs.shutdown()
+    batch_executor.shutdown(wait=False)
+
 # --- DASHBOARD ROUTER ---
 
 @app.get("/dashboard/documents")
-def get_user_documents(current_user: User = Depends(get_current_user), db: dict = Depends(get_db)):
-    documents_container = db["documents"]
-    # Query docs for user
-    query = "SELECT * FROM c WHERE c.user_id = @uid ORDER BY c.created_at DESC"
-    items = list(documents_container.query_items(
-        query=query,
-        parameters=[{"name": "@uid", "value": current_user.id}],
-        enable_cross_partition_query=True
-    ))
-    return items
+def get_user_documents(
+    limit: int = Query(20, ge=1, le=100),
+    continuation: Optional[str] = None,
+    doc_type: Optional[str] = None,
+    created_after: Optional[str] = None,
+    created_before: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    repo: Repository = Depends(get_repo)
+):
+    # Query docs for user (single partition: documents are partitioned on user_id)
+    # created_after / created_before are ISO timestamps, compared against created_at
+    try:
+        items, next_token = repo.documents.list_page(
+            current_user.id,
+            limit,
+            continuation=continuation,
+            doc_type=doc_type.strip().lower() if doc_type else None,
+            created_after=created_after,
+            created_before=created_before
+        )
+    except ValueError as e:
+        # A continuation token that did not come from the previous page
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "continuation": next_token}
 
 @app.get("/dashboard/doc/{doc_id}")
-def get_document_details(doc_id: str, current_user: User = Depends(get_current_user), db: dict = Depends(get_db)):
-    documents_container = db["documents"]
-    # Doc ID is string now (uuid)
-    query = "SELECT * FROM c WHERE c.id = @id AND c.user_id = @uid"
-    items = list(documents_container.query_items(
-        query=query,
-        parameters=[
-            {"name": "@id", "value": doc_id},
-            {"name": "@uid", "value": current_user.id}
-        ],
-        enable_cross_partition_query=True
-    ))
+def get_document_details(doc_id: str, current_user: User = Depends(get_current_user), repo: Repository = Depends(get_repo)):
+    # Doc ID is string now (uuid); point read in the user's partition
+    doc = repo.documents.get(current_user.id, doc_id)
     
-    if not items:
+    if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
         
-    return items[0]
+    return doc
 
-@app.delete("/dashboard/delete/{doc_id}")
-def delete_document(doc_id: str, current_user: User = Depends(get_current_user), db: dict = Depends(get_db)):
-    documents_container = db["documents"]
-    
-    # 1. Get doc to find file paths
-    query = "SELECT * FROM c WHERE c.id = @id AND c.user_id = @uid"
-    items = list(documents_container.query_items(
-        query=query,
-        parameters=[
-            {"name": "@id", "value": doc_id},
-            {"name": "@uid", "value": current_user.id}
-        ],
-        enable_cross_partition_query=True
-    ))
-    
-    if not items:
-        raise HTTPException(status_code=404, detail="Document not found")
-        
-    doc = Document(**items[0])
-    
+def _delete_document_files(doc: Document):
     # Try to delete physical files
-    stored_path = BASE_DIR / doc.file_path
-    stem = stored_path.stem
-    
-    # ... (Keep existing file deletion logic) ...
-    paths_to_check = [
-        stored_path,
-        GENERATED / f"{stem}.docx",
-        GENERATED / f"{stem}.pdf",
-        GENERATED / f"{doc.doc_type}_{stem}.docx",
-        GENERATED / f"{doc.doc_type}_{stem}.pdf",
-    ]
-    if "_" in stem:
-        uid = stem.split("_")[-1]
-        paths_to_check.append(GENERATED / f"{uid}.pdf")
-        
-    for p in paths_to_check:
+    for backend, key in artifacts.document_objects(doc):
         try:
-             if p.exists():
-                 os.remove(p)
-                 logger.info(f"Deleted file: {p}")
+             if backend.delete(key):
+                 logger.info(f"Deleted file: {key}")
         except Exception as e:
-            logger.error(f"Failed to delete {p}: {e}")
-            
-    # Delete from DB
-    # Cosmos delete requires partition key
-    documents_container.delete_item(item=doc_id, partition_key=doc.partitionKey)
+            logger.error(f"Failed to delete {key}: {e}")
+
+@app.delete("/dashboard/delete/{doc_id}")
+def delete_document(doc_id: str, current_user: User = Depends(get_current_user), repo: Repository = Depends(get_repo)):
+    # 1. Get doc to find file paths
+    doc = repo.documents.get(current_user.id, doc_id)
     
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    if not doc.artifact_key:
+        _delete_document_files(doc)
+        repo.documents.delete(doc)
+        return {"msg": "Document deleted"}
+
+    # Rendered files can be shared by several documents (render cache); keep them while referenced.
+    # Under the artifact's lock, so a cache hit cannot pick the files up between the count and the delete
+    with file_lock(artifacts.refs_lock(doc.artifact_key)):
+        if repo.documents.count_artifact_refs(doc.artifact_key, doc.id):
+            logger.info(f"Artifact {doc.artifact_key[:16]} still referenced, keeping files")
+        else:
+            _delete_document_files(doc)
+
+        # Delete from DB
+        repo.documents.delete(doc)
+
     return {"msg": "Document deleted"}
 
+def _set_pdf_status(repo: Repository, doc: Document, status: str):
+    if doc.pdf_status == status:
+        return
+    doc.pdf_status = status
+    try:
+        repo.documents.upsert(doc)
+    except Exception as e:
+        logger.error(f"Failed to record pdf_status={status} on {doc.id}: {e}")
+
+
+def _ensure_pdf(repo: Repository, doc: Document):
+    """
+    Converts the document's DOCX on first request. Concurrent downloads of the same artifact wait on
+    one conversion (pdf_flight in this worker, a file lock across workers). Returns locate() for the PDF.
+    """
+    docx_key = doc.artifacts["docx"]
+    pdf_key = artifacts.sibling_key(docx_key, "pdf")
+
+    def convert():
+        _set_pdf_status(repo, doc, "converting")
+        _convert_to(docx_key, doc.doc_type)
+
+    if not storage.exists(pdf_key):
+        pdf_flight.do(docx_key, convert)
+
+    if storage.exists(pdf_key):
+        _record_pdf(repo, doc, pdf_key)
+        return storage, pdf_key
+    _set_pdf_status(repo, doc, "failed")
+    return None
+
+
+def _record_pdf(repo: Repository, doc: Document, pdf_key: str):
+    doc.artifacts["pdf"] = pdf_key
+    doc.pdf_status = "ready"
+    try:
+        repo.documents.upsert(doc)
+    except Exception as e:
+        logger.error(f"Failed to record the PDF of {doc.id}: {e}")
+
+
 @app.get("/dashboard/download/{doc_id}")
-def download_dashboard_doc(doc_id: str, format: str = "pdf", current_user: User = Depends(get_current_user), db: dict = Depends(get_db)):
-    documents_container = db["documents"]
-    
-    query = "SELECT * FROM c WHERE c.id = @id AND c.user_id = @uid"
-    items = list(documents_container.query_items(
-        query=query,
-        parameters=[
-            {"name": "@id", "value": doc_id},
-            {"name": "@uid", "value": current_user.id}
-        ],
-        enable_cross_partition_query=True
-    ))
+def download_dashboard_doc(request: Request, doc_id: str, format: str = "pdf", current_user: User = Depends(get_current_user), repo: Repository = Depends(get_repo)):
+    doc = repo.documents.get(current_user.id, doc_id)
     
-    if not items:
+    if not doc:
          raise HTTPException(status_code=404, detail="Document not found")
-         
-    doc = Document(**items[0])
     
-    # Robust File Finding Strategy
-    # stored 'doc.file_path' might be relative to BASE_DIR (backend/app), but files are scattered.
-    # We will search in known directories.
-    
-    search_dirs = [
-        GENERATED,                          # backend/data/generated (Current Standard)
-        BASE_DIR.parent / "generated",      # backend/generated (Legacy)
-        BASE_DIR / Path(doc.file_path).parent if doc.file_path else None # Fix: path is string, need Path()
-    ]
-    # Filter valid dirs
-    search_dirs = [d for d in search_dirs if d and d.exists()]
-    
-    # Candidate filenames
-    candidates = []
-    
-    # 1. Exact match for requested format by filename stems
-    base_name = Path(doc.filename).stem
-    
-    if format == "docx":
-        candidates.append(f"{base_name}.docx")
-        # Legacy: {doc_type}_{uid}.docx if stem is just uid?
-        candidates.append(f"{doc.doc_type}_{base_name}.docx")
-        
-    elif format == "pdf":
-        candidates.append(f"{base_name}.pdf")
-        # Legacy: uid.pdf if stem is doc_type_uid? 
-        if "_" in base_name:
-             uid = base_name.split("_")[-1]
-             candidates.append(f"{uid}.pdf")
-
-    target_file = None
-    
-    for folder in search_dirs:
-        for fname in candidates:
-            p = folder / fname
-            if p.exists():
-                target_file = p
-                break
-        if target_file: break
-
-    if not target_file:
-         # Last resort: Try resolving doc.file_path directly vs BASE_DIR
-         p = BASE_DIR / doc.file_path
-         if p.exists() and p.suffix == f".{format}":
-             target_file = p
+    # Documents record their artifact paths; only unmigrated legacy records fall back to probing
+    target = artifacts.locate(doc, format)
+    if target and format == "pdf" and doc.artifacts and "pdf" not in doc.artifacts:
+        # Converted for another record sharing this artifact; _ensure_pdf never runs for it
+        _record_pdf(repo, doc, target[1])
+    if not target and format == "pdf" and doc.artifacts.get("docx"):
+        # Lazy PDF (or an earlier conversion failed): convert now
+        target = _ensure_pdf(repo, doc)
          
-    if not target_file or not target_file.exists():
+    if not target:
          raise HTTPException(status_code=404, detail=f"File ({format}) not found on server")
-         
-    return FileResponse(
-            path=str(target_file),
-            filename=target_file.name,
-            media_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document' if format=='docx' else 'application/pdf'
-        )
+
+    backend, key = target
+    return object_response(request, backend, key, f"{Path(doc.filename).stem}.{format}", format)
 
 # --- GENERATION ---
 
@@ -455,11 +526,14 @@ class GenerateRequest(BaseModel):
     use_gemini: bool = False
     ai_context: Optional[str] = None
     return_docx: bool = False
+    async_job: bool = False  # enqueue and return 202 + job id instead of waiting
+    bypass_cache: bool = False  # force a fresh Gemini call
+    stream_fields: bool = False  # async jobs: publish AI fields on the job's event stream as they arrive
 
 
-@app.post("/generate")
-def generate(req: GenerateRequest, current_user: User = Depends(get_current_user), db: dict = Depends(get_db)):
-    doc_type = (req.doc_type or "").strip().lower()
+def _resolve_template(doc_type: Optional[str]):
+    """Returns (normalised doc_type, template_path) or raises 400/404."""
+    doc_type = (doc_type or "").strip().lower()
     if not doc_type:
         raise HTTPException(status_code=400, detail="doc_type is required")
 
@@ -469,14 +543,80 @@ def generate(req: GenerateRequest, current_user: User = Depends(get_current_user
             status_code=404,
             detail=f"Template for '{doc_type}' not found at {template_path}"
         )
+    return doc_type, template_path
 
+
+def _validate_generate_request(req: GenerateRequest):
+    """Cheap checks done before any work is started (or queued). Returns (doc_type, template_path)."""
+    with metrics.track("validate") as timer:
+        doc_type, template_path = _resolve_template(req.doc_type)
+        timer.doc_type = doc_type
+
+        if not req.use_gemini and not req.fields:
+            raise HTTPException(
+                status_code=400,
+                detail="fields is required when use_gemini is false"
+            )
+    return doc_type, template_path
+
+
+def _clean_letter_fields(fields: dict):
+    import re
+    logger.info("--- CLEANING LETTER ---")
+    
+    # 1. Clean Body Salutations (Start)
+    if "body" in fields:
+         body_text = fields["body"]
+         logger.info(f"Body Before: {body_text[:50]}...")
+         
+         # Remove "Dear X," or "To X," at the very start
+         body_text = re.sub(r"^\s*(Dear|To)\s+.*?,?\s*", "", body_text, flags=re.IGNORECASE).strip()
+         
+         # Remove "Subject: ..." if AI added it
+         body_text = re.sub(r"^\s*Subject:.*?\n", "", body_text, flags=re.IGNORECASE).strip()
+         
+         # Remove "Sincerely, X" from the end (Aggressive)
+         # Use flexible newline matching for Windows/Linux (\r\n vs \n)
+         # Look for the LAST occurrence of a closing phrase to be safe, or just cut from the first one found near the end.
+         # Logic: Split by closing phrases, take the first part? No, that might kill "Yours sincerely" in a quote.
+         # Better: Regex for newlines followed by closing keyword
+         
+         clean_pattern = r"[\r\n]+\s*(Sincerely|Regards|Best Regards|Best|Cheers|Yours|Warm Regards|Thank you).*?(\n|$).*$"
+         body_text = re.sub(clean_pattern, "", body_text, flags=re.IGNORECASE|re.DOTALL).strip()
+         
+         fields["body"] = body_text
+         logger.info(f"Body After: {body_text[:50]}...")
+
+    # 2. Clean Receiver Name (Prevent "Dear Dear")
+    if "receiver_name" in fields:
+        orig = fields["receiver_name"]
+        # Remove "Dear " from name if present
+        fields["receiver_name"] = re.sub(r"^\s*(Dear|Mr\.|Ms\.|Mrs\.|Dr\.)\s+", "", fields["receiver_name"], flags=re.IGNORECASE).strip()
+        logger.info(f"Name clean: '{orig}' -> '{fields['receiver_name']}'")
+
+    # 3. Clean Salutation Field if it exists
+    if "receiver_salutation" in fields and fields["receiver_salutation"]:
+         orig = fields["receiver_salutation"]
+         # Strip "Dear"
+         val = re.sub(r"^\s*(Dear)\s+", "", fields["receiver_salutation"], flags=re.IGNORECASE).strip()
+         # Strip trailing punctuation (commas) which cause "Name,,"
+         val = re.sub(r"[,]+$", "", val).strip()
+         
+         fields["receiver_salutation"] = val
+         logger.info(f"Salutation clean: '{orig}' -> '{val}'")
+
+
+async def _build_fields(req: GenerateRequest, doc_type: str, on_partial=None, batch: bool = False) -> dict:
     # Get fields from client or Gemini
     if req.use_gemini:
         try:
-            fields = generate_structured_with_gemini(
+            fields = await generate_structured_with_gemini_async(
                 doc_type,
                 req.fields or {},
-                req.ai_context
+                req.ai_context,
+                use_cache=not req.bypass_cache,
+                on_partial=on_partial,
+                batch=batch
             )
 
             if not isinstance(fields, dict):
@@ -491,49 +631,8 @@ def generate(req: GenerateRequest, current_user: User = Depends(get_current_user
                         fields[k] = v
 
                 if doc_type == "letter":
-                    import re
-                    logger.info("--- CLEANING LETTER ---")
-                    
-                    # 1. Clean Body Salutations (Start)
-                    if "body" in fields:
-                         body_text = fields["body"]
-                         logger.info(f"Body Before: {body_text[:50]}...")
-                         
-                         # Remove "Dear X," or "To X," at the very start
-                         body_text = re.sub(r"^\s*(Dear|To)\s+.*?,?\s*", "", body_text, flags=re.IGNORECASE).strip()
-                         
-                         # Remove "Subject: ..." if AI added it
-                         body_text = re.sub(r"^\s*Subject:.*?\n", "", body_text, flags=re.IGNORECASE).strip()
-                         
-                         # Remove "Sincerely, X" from the end (Aggressive)
-                         # Use flexible newline matching for Windows/Linux (\r\n vs \n)
-                         # Look for the LAST occurrence of a closing phrase to be safe, or just cut from the first one found near the end.
-                         # Logic: Split by closing phrases, take the first part? No, that might kill "Yours sincerely" in a quote.
-                         # Better: Regex for newlines followed by closing keyword
-                         
-                         clean_pattern = r"[\r\n]+\s*(Sincerely|Regards|Best Regards|Best|Cheers|Yours|Warm Regards|Thank you).*?(\n|$).*$"
-                         body_text = re.sub(clean_pattern, "", body_text, flags=re.IGNORECASE|re.DOTALL).strip()
-                         
-                         fields["body"] = body_text
-                         logger.info(f"Body After: {body_text[:50]}...")
-
-                    # 2. Clean Receiver Name (Prevent "Dear Dear")
-                    if "receiver_name" in fields:
-                        orig = fields["receiver_name"]
-                        # Remove "Dear " from name if present
-                        fields["receiver_name"] = re.sub(r"^\s*(Dear|Mr\.|Ms\.|Mrs\.|Dr\.)\s+", "", fields["receiver_name"], flags=re.IGNORECASE).strip()
-                        logger.info(f"Name clean: '{orig}' -> '{fields['receiver_name']}'")
-
-                    # 3. Clean Salutation Field if it exists
-                    if "receiver_salutation" in fields and fields["receiver_salutation"]:
-                         orig = fields["receiver_salutation"]
-                         # Strip "Dear"
-                         val = re.sub(r"^\s*(Dear)\s+", "", fields["receiver_salutation"], flags=re.IGNORECASE).strip()
-                         # Strip trailing punctuation (commas) which cause "Name,,"
-                         val = re.sub(r"[,]+$", "", val).strip()
-                         
-                         fields["receiver_salutation"] = val
-                         logger.info(f"Salutation clean: '{orig}' -> '{val}'")
+                    with metrics.track("letter_cleanup", doc_type):
+                        _clean_letter_fields(fields)
 
         except GeminiError as ge:
             logger.exception("Gemini generation failed")
@@ -551,54 +650,359 @@ def generate(req: GenerateRequest, current_user: User = Depends(get_current_user
             )
         fields = req.fields
 
+    return fields
+
+
+def _render_document(template_path: Path, doc_type: str, fields: dict):
+    """Renders the DOCX, or reuses an identical one already stored. Returns (docx storage key, artifact_key)."""
+    key = artifact_key(doc_type, fields, registry.get(template_path).digest)
+    docx_key = artifacts.shard_key(key, "docx")
+
+    # A delete of the last document using these files holds the same lock while removing them; one that
+    # comes after this check but before the insert is repaired by _restore_artifacts
+    with file_lock(artifacts.refs_lock(key)):
+        if storage.exists(docx_key):
+            logger.info("Render cache hit: %s", docx_key)
+            return docx_key, key
 
-    # Render DOCX
-    unique_id = uuid.uuid4().hex[:8]
-    fname = f"{doc_type}_{unique_id}.docx"
-    out_docx = GENERATED / fname
+    # Concurrent identical requests wait for the first render instead of repeating it
+    render_flight.do(key, lambda: _render_to(template_path, doc_type, fields, docx_key))
+    return docx_key, key
+
+
+def _render_to(template_path: Path, doc_type: str, fields: dict, docx_key: str):
+    if storage.exists(docx_key):
+        return
+
+    # Render DOCX to a local temp file, then hand it to storage (a concurrent cache hit never sees a partial file)
+    tmp_docx = GENERATED / f".{uuid.uuid4().hex}.tmp.docx"
     try:
-        render_docx(str(template_path), fields or {}, str(out_docx))
-        logger.info("Rendered DOCX: %s", out_docx)
+        with metrics.track("render_docx", doc_type):
+            render_docx(str(template_path), fields or {}, str(tmp_docx))
+        storage.put(docx_key, tmp_docx)
+        logger.info("Rendered DOCX: %s", docx_key)
     except Exception as e:
         logger.exception("Template rendering failed")
+        if tmp_docx.exists():
+            os.remove(tmp_docx)
         raise HTTPException(status_code=500, detail=f"Template rendering failed: {str(e)}")
 
-    # Convert to PDF
+    if not storage.exists(docx_key):
+        raise HTTPException(status_code=500, detail="DOCX was not created")
+
+
+def _convert_document(docx_key: str, doc_type: str = None):
+    pdf_key = artifacts.sibling_key(docx_key, "pdf")
+    if storage.exists(pdf_key):
+        logger.info("Render cache hit (PDF): %s", pdf_key)
+        return
+    pdf_flight.do(docx_key, lambda: _convert_to(docx_key, doc_type))
+
+
+def _convert_to(docx_key: str, doc_type: str = None):
+    # Workers on this host take turns per artifact; whoever waited finds the PDF already stored
+    with file_lock(GENERATED / ".locks" / f"{Path(docx_key).stem}.lock"):
+        _convert_unlocked(docx_key, doc_type)
+
+
+def _convert_unlocked(docx_key: str, doc_type: str = None):
+    pdf_key = artifacts.sibling_key(docx_key, "pdf")
+    if storage.exists(pdf_key):
+        return
+
+    # Convert to PDF (soffice needs real files: convert into a scratch dir, then store the result)
     try:
-        pdf_success = convert_to_pdf(str(out_docx), str(GENERATED))
-        if not pdf_success:
-            logger.error("PDF generation returned false")
-            # We don't raise error, just log it, so user at least gets DOCX
+        with tempfile.TemporaryDirectory(dir=GENERATED) as tmpdir:
+            src = storage.local_path(docx_key)
+            if src is None:
+                src = Path(tmpdir) / Path(docx_key).name
+                src.write_bytes(storage.get(docx_key))
+            pdf_success = convert_to_pdf(str(src), tmpdir, doc_type)
+            if pdf_success:
+                storage.put(pdf_key, Path(tmpdir) / f"{src.stem}.pdf")
+            else:
+                logger.error("PDF generation returned false")
+                # We don't raise error, just log it, so user at least gets DOCX
     except Exception as e:
         logger.error(f"PDF generation crashed: {e}")
 
-    # Force DOCX return (PDF conversion logic removed)
-    final_file = out_docx
-    media_type = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-
-    if not out_docx.exists():
-        raise HTTPException(status_code=500, detail="DOCX was not created")
 
-    # --- SAVE TO DATABASE ---
-    rel_path = f"../data/generated/{final_file.name}"
-    
+def _new_document(current_user: User, doc_type: str, fields: dict, docx_key: str, key: str) -> Document:
+    stored = {"docx": docx_key}
+    pdf_key = artifacts.sibling_key(docx_key, "pdf")
+    if storage.exists(pdf_key):
+        stored["pdf"] = pdf_key
+        pdf_status = "ready"
+    else:
+        pdf_status = "pending" if PDF_MODE == "lazy" else "failed"
 
-    
-    new_doc = Document(
+    return Document(
         user_id=current_user.id,
-        filename=final_file.name,
-        file_path=rel_path,
+        filename=f"{artifact_stem(doc_type, key)}.docx",
+        file_path=docx_key,
+        artifacts=stored, # Exact keys per format, so downloads never have to search
+        pdf_status=pdf_status,
         doc_type=doc_type,
         input_data=fields, # Store inputs for editing
+        artifact_key=key, # Shared with any other document rendered from identical inputs
         partitionKey=current_user.id # Set partition key
     )
-    
-    # Save to Cosmos
-    db["documents"].create_item(body=new_doc.dict(by_alias=True))
-    # db.commit() # Not needed
+
+
+def _restore_artifacts(doc: Document):
+    """
+    Puts back files a concurrent delete (or the sweeper) removed between the render cache hit and the
+    insert: it counted references before this record existed. Call once the record is saved, so any
+    later delete sees it.
+    """
+    docx_key = doc.artifacts["docx"]
+    # Waits for a delete that is removing the files right now
+    with file_lock(artifacts.refs_lock(doc.artifact_key)):
+        docx_missing = not storage.exists(docx_key)
+        pdf_missing = "pdf" in doc.artifacts and not storage.exists(doc.artifacts["pdf"])
+    if docx_missing:
+        logger.warning(f"Artifact {doc.artifact_key[:16]} was deleted while {doc.id} was being saved, rendering again")
+        _, template_path = _resolve_template(doc.doc_type)
+        render_flight.do(doc.artifact_key, lambda: _render_to(template_path, doc.doc_type, doc.input_data, docx_key))
+    if pdf_missing:
+        _convert_document(docx_key, doc.doc_type)
+
+
+def _persist_document(repo: Repository, new_doc: Document) -> Document:
+    # --- SAVE TO DATABASE ---
+    repo.documents.create(new_doc)
+    _restore_artifacts(new_doc)
+    return new_doc
+
+
+async def _produce_document(req: GenerateRequest, current_user: User, on_stage=None, executor=None, on_partial=None, limits=None):
+    """
+    ai -> render -> pdf for one request. Returns (stage runner, unsaved Document).
+    `limits` maps a stage name to a semaphore that bounds how many run at once; only batches pass
+    them, and their Gemini calls then stay within the batch share of the client limits.
+    """
+    doc_type, template_path = _validate_generate_request(req)
+    loop = asyncio.get_running_loop()
+
+    async def stage(name, fn, *args):
+        limit = (limits or {}).get(name)
+        if limit is not None:
+            await limit.acquire()
+        try:
+            if on_stage:
+                on_stage(name, "started")
+            if asyncio.iscoroutinefunction(fn):
+                result = await fn(*args)
+            else:
+                result = await loop.run_in_executor(executor, functools.partial(fn, *args))
+            if on_stage:
+                on_stage(name, "done")
+            return result
+        finally:
+            if limit is not None:
+                limit.release()
+
+    # Get fields from client or Gemini
+    if req.use_gemini:
+        fields = await stage("ai", _build_fields, req, doc_type, on_partial, limits is not None)
+    else:
+        fields = await _build_fields(req, doc_type)
+
+    docx_key, key = await stage("render", _render_document, template_path, doc_type, fields)
+    if PDF_MODE != "lazy":
+        await stage("pdf", _convert_document, docx_key, doc_type)
+    return stage, _new_document(current_user, doc_type, fields, docx_key, key)
+
+
+async def run_generation(req: GenerateRequest, current_user: User, repo: Repository, on_stage=None, executor=None, on_partial=None) -> dict:
+    """
+    The full generation pipeline: ai -> render -> pdf -> persist.
+    The AI stage is awaited on the event loop; blocking stages run on
+    `executor` (the loop's default pool when None);
+    `on_stage(stage, status)` is called as each stage starts and finishes,
+    `on_partial(event)` with each AI field as it streams in.
+    """
+    stage, new_doc = await _produce_document(req, current_user, on_stage, executor, on_partial)
+    await stage("persist", _persist_document, repo, new_doc)
 
     return {
         "message": "Document generated successfully",
         "doc_id": new_doc.id,
-        "doc_type": doc_type
-    }
\ No newline at end of file
+        "doc_type": new_doc.doc_type
+    }
+
+
+jobs = JobManager(STORAGE_DIR / "jobs")
+render_flight = SingleFlight("render")
+pdf_flight = SingleFlight("pdf")
+
+
+@app.post("/generate")
+async def generate(req: GenerateRequest, current_user: User = Depends(get_current_user), repo: Repository = Depends(get_repo)):
+    if not req.async_job:
+        return await run_generation(req, current_user, repo)
+
+    doc_type, _ = _validate_generate_request(req)
+
+    async def runner(job):
+        on_partial = jobs.partial_reporter(job) if req.stream_fields else None
+        return await run_generation(
+            req, current_user, repo,
+            on_stage=jobs.stage_reporter(job), executor=jobs.executor, on_partial=on_partial
+        )
+
+    try:
+        job = jobs.submit(current_user.id, doc_type, runner)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Generation queue is full, try again shortly ({e})")
+
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"}
+    )
+
+
+# --- BATCH GENERATION ---
+# Stage limits are shared by all batches in this worker, so bulk work cannot crowd out interactive /generate
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "200"))
+BATCH_AI_CONCURRENCY = int(os.getenv("BATCH_AI_CONCURRENCY", "4"))
+BATCH_RENDER_CONCURRENCY = int(os.getenv("BATCH_RENDER_CONCURRENCY", "2"))
+BATCH_PDF_CONCURRENCY = int(os.getenv("BATCH_PDF_CONCURRENCY", "2"))
+
+batch_executor = ThreadPoolExecutor(
+    max_workers=BATCH_RENDER_CONCURRENCY + BATCH_PDF_CONCURRENCY,
+    thread_name_prefix="docgen-batch"
+)
+_batch_limits = None
+
+
+def _get_batch_limits() -> dict:
+    global _batch_limits
+    if _batch_limits is None:
+        # Created lazily so they bind to the running event loop
+        _batch_limits = {
+            "ai": asyncio.Semaphore(BATCH_AI_CONCURRENCY),
+            "render": asyncio.Semaphore(BATCH_RENDER_CONCURRENCY),
+            "pdf": asyncio.Semaphore(BATCH_PDF_CONCURRENCY),
+        }
+    return _batch_limits
+
+
+class BatchGenerateRequest(BaseModel):
+    items: List[GenerateRequest]
+
+
+def _item_error(e: Exception) -> dict:
+    if isinstance(e, HTTPException):
+        return {"status_code": e.status_code, "detail": e.detail}
+    return {"status_code": 500, "detail": str(e)}
+
+
+@app.post("/generate/batch")
+async def generate_batch(batch: BatchGenerateRequest, current_user: User = Depends(get_current_user), repo: Repository = Depends(get_repo)):
+    """
+    Generates many documents as a pipeline: every item moves through ai -> render -> pdf on its own,
+    each stage bounded by the BATCH_*_CONCURRENCY limits; the records are then written in bulk.
+    """
+    if not batch.items:
+        raise HTTPException(status_code=400, detail="Batch has no items")
+    if len(batch.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch too large (max {BATCH_MAX_ITEMS} items)")
+
+    limits = _get_batch_limits()
+
+    async def produce(req):
+        _, new_doc = await _produce_document(req, current_user, executor=batch_executor, limits=limits)
+        return new_doc
+
+    produced = await asyncio.gather(*(produce(req) for req in batch.items), return_exceptions=True)
+
+    results = []
+    for index, outcome in enumerate(produced):
+        if isinstance(outcome, BaseException):
+            if not isinstance(outcome, HTTPException):
+                logger.error(f"Batch item {index} failed: {outcome}")
+            results.append({"index": index, "status": "failed", "error": _item_error(outcome)})
+        else:
+            results.append({"index": index, "status": "pending", "doc_id": outcome.id, "doc_type": outcome.doc_type})
+
+    docs = [d for d in produced if isinstance(d, Document)]
+    errors = await run_in_threadpool(repo.documents.create_many, docs)
+    write_errors = {doc.id: err for doc, err in zip(docs, errors) if err}
+    for doc in docs:
+        if doc.id not in write_errors:
+            await run_in_threadpool(_restore_artifacts, doc)
+
+    for item in results:
+        if item["status"] != "pending":
+            continue
+        err = write_errors.get(item["doc_id"])
+        if err:
+            item.update({"status": "failed", "error": {"status_code": 500, "detail": err}})
+            del item["doc_id"]
+        else:
+            item["status"] = "succeeded"
+
+    succeeded = sum(1 for item in results if item["status"] == "succeeded")
+    return {
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "items": results
+    }
+
+
+@app.post("/generate/mailmerge")
+def generate_mailmerge(
+    doc_type: str = Form(...),
+    format: str = Form("docx"),
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Renders one document per row of a CSV (header row = field names) or JSONL upload, without Gemini,
+    and streams back a ZIP of the results as they are rendered; row errors go into manifest.json.
+    """
+    doc_type, template_path = _resolve_template(doc_type)
+    if format not in MAILMERGE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(MAILMERGE_FORMATS)}")
+    filename = file.filename or ""
+    if not filename.lower().endswith((".csv", ".jsonl", ".ndjson")):
+        raise HTTPException(status_code=400, detail="Upload a .csv or .jsonl file")
+
+    logger.info(f"Mail merge for {current_user.email}: {doc_type} from {filename} ({format})")
+    return StreamingResponse(
+        merge_to_zip(template_path, doc_type, iter_rows(file.file, filename), format),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{doc_type}_mailmerge.zip"'}
+    )
+
+
+def _get_user_job(job_id: str, current_user: User):
+    job = jobs.get(job_id)
+    if not job or job.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, current_user: User = Depends(get_current_user)):
+    job = _get_user_job(job_id, current_user)
+    data = job.to_dict()
+    data.pop("user_id", None)
+    return data
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, after: int = 0, current_user: User = Depends(get_current_user)):
+    _get_user_job(job_id, current_user)
+
+    async def event_source():
+        async for event in jobs.stream_events(job_id, after=after):
+            yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,184 @@
+import os
+import time
+import bisect
+import threading
+from typing import Callable, Dict, Tuple
+
+# --- Metrics Configuration ---
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+METRICS_BUCKETS = tuple(
+    float(b) for b in os.getenv(
+        "METRICS_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60,120"
+    ).split(",")
+)
+
+_registry = []
+_collectors = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = list(self._series.items())
+        for labels, value in sorted(series):
+            lines.extend(self._samples(labels, value))
+        return lines
+
+    def _samples(self, labels, value) -> list:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    """Cumulative buckets are only summed up at scrape time; observe() bumps a single bucket."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=METRICS_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def _samples(self, labels, value) -> list:
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+        base = _format_labels(self.labelnames, labels)
+        lines.append(f"{self.name}_sum{base} {total!r}")
+        lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "docgen_stage_duration_seconds", "Time spent in each generation stage.", ("stage", "doc_type")
+)
+STAGE_ERRORS = Counter(
+    "docgen_stage_errors_total", "Stage runs that raised.", ("stage", "doc_type")
+)
+STAGE_IN_FLIGHT = Gauge(
+    "docgen_stage_in_flight", "Stage runs currently in progress.", ("stage",)
+)
+GEMINI_RETRIES = Counter(
+    "docgen_gemini_retries_total", "Gemini calls repeated after a rate limit."
+)
+GEMINI_SECTION_RETRIES = Counter(
+    "docgen_gemini_section_retries_total", "Follow-up Gemini calls for sections that failed the response schema.", ("doc_type",)
+)
+PDF_CONVERSIONS = Counter(
+    "docgen_pdf_conversions_total", "PDF conversions by engine and result.", ("engine", "doc_type", "result")
+)
+SWEEPER_REMOVED = Counter(
+    "docgen_sweeper_removed_total", "Files and expired documents removed by the artifact sweeper.", ("kind",)
+)
+SWEEPER_FREED_BYTES = Counter(
+    "docgen_sweeper_freed_bytes_total", "Bytes of storage freed by the artifact sweeper.", ("kind",)
+)
+
+
+class track:
+    """
+    Times a block as `stage`, counts it as in flight while it runs and records failures.
+    `doc_type` can be filled in from inside the block once it is known.
+
+        with metrics.track("render_docx", doc_type):
+            ...
+    """
+
+    __slots__ = ("stage", "doc_type", "_start")
+
+    def __init__(self, stage: str, doc_type: str = ""):
+        self.stage = stage
+        self.doc_type = doc_type or ""
+
+    def __enter__(self):
+        if METRICS_ENABLED:
+            STAGE_IN_FLIGHT.inc(self.stage)
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if METRICS_ENABLED:
+            STAGE_SECONDS.observe(time.perf_counter() - self._start, self.stage, self.doc_type)
+            STAGE_IN_FLIGHT.dec(self.stage)
+            if exc_type is not None:
+                STAGE_ERRORS.inc(self.stage, self.doc_type)
+        return False
+
+
+def register_collector(fn: Callable[[], Dict[str, Dict[str, float]]]):
+    """
+    `fn()` is called on every scrape and returns {metric_name: {label_value: value}};
+    each entry is rendered as a gauge labelled by `name`. Used for the existing stats() dicts.
+    """
+    _collectors.append(fn)
+
+
+def render() -> str:
+    """Everything in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        for name, values in collect().items():
+            lines.append(f"# TYPE {name} gauge")
+            for label, value in sorted(values.items()):
+                lines.append(f'{name}{{name="{_escape(label)}"}} {_format_value(value)}')
+    return "\n".join(lines) + "\n"
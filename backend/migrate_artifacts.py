@@ -0,0 +1,109 @@
+"""
+One-time migration to the sharded artifact layout.
+
+Indexes the flat legacy output trees (generated/ and data/generated/) once,
+copies (or moves) each legacy document's files to generated/ab/cd/<id>.<ext>
+and backfills Document.artifacts, so downloads stop probing the filesystem.
+
+    python migrate_artifacts.py --dry-run
+    python migrate_artifacts.py [--move]
+
+Safe to re-run: migrated documents are skipped, existing targets are reused.
+"""
+import os
+import logging
+import argparse
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv(override=False)
+
+import artifacts
+from database import get_db
+from repository import Repository
+
+logger = logging.getLogger("docgen.migrate")
+
+
+def _norm(path: Path) -> Path:
+    # Lexical only - no stat calls on the network share
+    return Path(os.path.abspath(path))
+
+
+def index_legacy_files() -> dict:
+    """Every file directly inside the flat legacy trees (shard subdirectories are skipped)."""
+    index = {}
+    for root in (artifacts.GENERATED, artifacts.LEGACY_GENERATED):
+        if not root.is_dir():
+            continue
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.endswith(".tmp.docx"):
+                    index[_norm(Path(entry.path))] = Path(entry.path)
+    logger.info(f"Indexed {len(index)} legacy files")
+    return index
+
+
+def migrate(repo: Repository, move: bool = False, dry_run: bool = False) -> dict:
+    index = index_legacy_files()
+    placed = {}  # legacy source -> shard target (documents sharing one render share one file)
+    stats = {"documents": 0, "migrated": 0, "missing": 0, "files": 0}
+
+    for doc in repo.documents.iter_without_artifacts():
+        stats["documents"] += 1
+        artifact_id = doc.artifact_key or doc.id
+        found = {}
+
+        for fmt in artifacts.FORMATS:
+            source = next(
+                (index[_norm(p)] for p in artifacts.legacy_candidates(doc, fmt) if _norm(p) in index),
+                None
+            )
+            if source is None:
+                continue
+
+            target = placed.get(source) or artifacts.shard_key(artifact_id, fmt)
+            if source not in placed:
+                placed[source] = target
+                stats["files"] += 1
+                if not dry_run and not artifacts.storage.exists(target):
+                    # Always copy; with --move the sources are removed once every document is updated
+                    artifacts.storage.put(target, source.read_bytes())
+                logger.info(f"{'Would place' if dry_run else 'Placed'} {source} -> {target}")
+            found[fmt] = target
+
+        if not found:
+            stats["missing"] += 1
+            logger.warning(f"No files found for document {doc.id} ({doc.filename})")
+            continue
+
+        stats["migrated"] += 1
+        if not dry_run:
+            doc.artifacts = found
+            repo.documents.upsert(doc)
+
+    if move and not dry_run:
+        for source in placed:
+            try:
+                os.remove(source)
+            except OSError as e:
+                logger.error(f"Failed to remove {source}: {e}")
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill canonical artifact paths on legacy documents")
+    parser.add_argument("--move", action="store_true", help="remove legacy files once copied")
+    parser.add_argument("--dry-run", action="store_true", help="report what would happen, change nothing")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    stats = migrate(Repository(get_db()), move=args.move, dry_run=args.dry_run)
+    print(f"Documents: {stats['documents']}, migrated: {stats['migrated']}, "
+          f"without files: {stats['missing']}, files placed: {stats['files']}")
+
+
+if __name__ == "__main__":
+    main()
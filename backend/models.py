@@ -26,6 +26,9 @@ class Document(BaseModel):
     doc_type: str
     created_at: str = Field(default_factory=lambda: datetime.utcnow().isoformat())
     input_data: Optional[Dict[str, Any]] = None
+    artifact_key: Optional[str] = None  # content hash of the rendered files (shared across identical documents)
+    artifacts: Dict[str, str] = Field(default_factory=dict)  # format -> path relative to STORAGE_DIR
+    pdf_status: Optional[str] = None  # pending | converting | ready | failed (None on legacy records)
     
     # Cosmos DB specific
     partitionKey: str = Field(default="", alias="partitionKey") # usually same as user_id for documents
@@ -0,0 +1,214 @@
+import os
+import logging
+from pathlib import Path
+from typing import Optional
+from xml.sax.saxutils import escape
+
+logger = logging.getLogger("docgen.native_pdf")
+
+# --- Native PDF Configuration ---
+# Doc types whose PDFs are drawn in-process (reportlab) instead of by LibreOffice. Off by default:
+# the output only approximates soffice's layout, so enable per type once its PDFs have been checked,
+# e.g. NATIVE_PDF_DOC_TYPES=letter,report
+NATIVE_PDF_DOC_TYPES = {
+    t.strip().lower()
+    for t in os.getenv("NATIVE_PDF_DOC_TYPES", "").split(",")
+    if t.strip()
+}
+
+_DEFAULT_SIZE = 11.0
+_BULLET_STYLES = ("List Bullet", "List Paragraph")
+_SERIF = ("times", "georgia", "cambria", "garamond", "book antiqua")
+_MONO = ("courier", "consolas", "mono")
+
+_BOLD = {"Helvetica": "Helvetica-Bold", "Times-Roman": "Times-Bold", "Courier": "Courier-Bold"}
+
+_reportlab = None
+
+
+class UnsupportedDocument(Exception):
+    """The DOCX uses something this renderer does not draw (tables, images, non-Latin text, ...)."""
+
+
+def native_available() -> bool:
+    """reportlab is optional; imported on first use."""
+    global _reportlab
+    if _reportlab is None:
+        try:
+            import reportlab  # noqa: F401
+            _reportlab = True
+        except ImportError:
+            logger.info("reportlab not installed; PDFs go through LibreOffice")
+            _reportlab = False
+    return _reportlab
+
+
+def supports(doc_type: Optional[str]) -> bool:
+    return bool(doc_type) and doc_type.lower() in NATIVE_PDF_DOC_TYPES and native_available()
+
+
+def _style_attr(style, getter):
+    # Walk the style's base chain until a value is set
+    while style is not None:
+        value = getter(style)
+        if value is not None:
+            return value
+        style = style.base_style
+    return None
+
+
+def _doc_defaults(doc):
+    """(font size pt, space after pt) from w:docDefaults, where Word keeps the document-wide defaults."""
+    from docx.oxml.ns import qn
+
+    size, after = _DEFAULT_SIZE, 0.0
+    defaults = doc.styles.element.find(qn("w:docDefaults"))
+    if defaults is not None:
+        sz = defaults.find(f"{qn('w:rPrDefault')}/{qn('w:rPr')}/{qn('w:sz')}")
+        if sz is not None:
+            size = int(sz.get(qn("w:val"))) / 2
+        spacing = defaults.find(f"{qn('w:pPrDefault')}/{qn('w:pPr')}/{qn('w:spacing')}")
+        if spacing is not None and spacing.get(qn("w:after")) is not None:
+            after = int(spacing.get(qn("w:after"))) / 20
+    return size, after
+
+
+def _font_family(name: Optional[str]) -> str:
+    lowered = (name or "").lower()
+    if any(f in lowered for f in _SERIF):
+        return "Times-Roman"
+    if any(f in lowered for f in _MONO):
+        return "Courier"
+    return "Helvetica"
+
+
+def _check_supported(doc):
+    if doc.tables or doc.inline_shapes:
+        raise UnsupportedDocument("tables or images")
+    if len(doc.sections) > 1:
+        raise UnsupportedDocument("multiple sections")
+    section = doc.sections[0]
+    for part in (section.header, section.footer):
+        if not part.is_linked_to_previous and any(p.text.strip() for p in part.paragraphs):
+            raise UnsupportedDocument("header/footer content")
+
+
+def _run_markup(run, base_size: float) -> str:
+    text = run.text
+    try:
+        text.encode("cp1252")  # the standard PDF fonts only cover WinAnsi
+    except UnicodeEncodeError:
+        raise UnsupportedDocument("characters outside the standard PDF fonts")
+
+    markup = escape(text).replace("\t", "    ").replace("\n", "<br/>")
+    if not markup:
+        return ""
+    font = run.font
+    if font.bold:
+        markup = f"<b>{markup}</b>"
+    if font.italic:
+        markup = f"<i>{markup}</i>"
+    if font.underline:
+        markup = f"<u>{markup}</u>"
+    attrs = []
+    if font.size is not None and font.size.pt != base_size:
+        attrs.append(f'size="{font.size.pt:g}"')
+    if font.color is not None and font.color.type is not None and font.color.rgb is not None:
+        attrs.append(f'color="#{font.color.rgb}"')
+    if attrs:
+        markup = f"<font {' '.join(attrs)}>{markup}</font>"
+    return markup
+
+
+def render_pdf(docx_path: str, pdf_path: str):
+    """
+    Draws a rendered DOCX as PDF with reportlab, paragraph by paragraph: style sizes, weights,
+    colours, alignment, spacing, bullets, line breaks and page margins are taken from the DOCX.
+    Raises UnsupportedDocument when the document needs a real layout engine.
+    """
+    from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_RIGHT, TA_JUSTIFY
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from docx import Document as DocxDocument
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+    alignments = {
+        WD_ALIGN_PARAGRAPH.CENTER: TA_CENTER,
+        WD_ALIGN_PARAGRAPH.RIGHT: TA_RIGHT,
+        WD_ALIGN_PARAGRAPH.JUSTIFY: TA_JUSTIFY,
+    }
+
+    doc = DocxDocument(docx_path)
+    _check_supported(doc)
+    default_size, default_after = _doc_defaults(doc)
+    section = doc.sections[0]
+
+    styles = {}
+    story = []
+    for p in doc.paragraphs:
+        if "".join(r.text for r in p.runs) != p.text:
+            raise UnsupportedDocument("hyperlinks or fields")  # text outside plain runs
+
+        style = p.style
+        size = _style_attr(style, lambda s: s.font.size.pt if s.font.size else None) or default_size
+        pf = p.paragraph_format
+        space_before = pf.space_before.pt if pf.space_before is not None else (
+            _style_attr(style, lambda s: s.paragraph_format.space_before.pt if s.paragraph_format.space_before is not None else None) or 0)
+        space_after = pf.space_after.pt if pf.space_after is not None else _style_attr(
+            style, lambda s: s.paragraph_format.space_after.pt if s.paragraph_format.space_after is not None else None)
+        if space_after is None:
+            space_after = default_after
+        alignment = p.alignment if p.alignment is not None else _style_attr(style, lambda s: s.paragraph_format.alignment)
+        bullet = style.name in _BULLET_STYLES
+
+        key = (style.name, size, space_before, space_after, alignment)
+        if key not in styles:
+            color = _style_attr(style, lambda s: s.font.color.rgb if s.font.color is not None and s.font.color.type is not None else None)
+            bold = _style_attr(style, lambda s: s.font.bold)
+            family = _font_family(_style_attr(style, lambda s: s.font.name))
+            styles[key] = ParagraphStyle(
+                name=f"{style.name}-{len(styles)}",
+                fontName=_BOLD[family] if bold else family,
+                fontSize=size,
+                leading=size * 1.2,
+                spaceBefore=space_before,
+                spaceAfter=space_after,
+                alignment=alignments.get(alignment, TA_LEFT),
+                textColor=f"#{color}" if color else "#000000",
+                leftIndent=18 if bullet else 0,
+                bulletIndent=6 if bullet else 0,
+            )
+        pstyle = styles[key]
+
+        markup = "".join(_run_markup(r, size) for r in p.runs)
+        if not markup.strip():
+            # An empty Word paragraph still takes a line
+            story.append(Spacer(1, pstyle.leading + space_after))
+            continue
+        story.append(Paragraph(markup, pstyle, bulletText="•" if bullet else None))
+
+    pdf = SimpleDocTemplate(
+        pdf_path,
+        pagesize=(section.page_width.pt, section.page_height.pt),
+        leftMargin=section.left_margin.pt,
+        rightMargin=section.right_margin.pt,
+        topMargin=section.top_margin.pt,
+        bottomMargin=section.bottom_margin.pt,
+        title=Path(docx_path).stem,
+    )
+    pdf.build(story)
+
+
+def convert(docx_path: str, out_dir: str) -> bool:
+    """Writes out_dir/<stem>.pdf like soffice would. False means: use LibreOffice instead."""
+    pdf_path = Path(out_dir) / f"{Path(docx_path).stem}.pdf"
+    try:
+        render_pdf(docx_path, str(pdf_path))
+        return True
+    except UnsupportedDocument as e:
+        logger.info(f"Native PDF not possible for {docx_path}: {e}")
+    except Exception as e:
+        logger.exception(f"Native PDF rendering failed for {docx_path}: {e}")
+    if pdf_path.exists():
+        os.remove(pdf_path)
+    return False
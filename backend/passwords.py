@@ -0,0 +1,113 @@
+import os
+import atexit
+import asyncio
+import hashlib
+import logging
+import threading
+import multiprocessing
+from typing import Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from passlib.context import CryptContext
+
+logger = logging.getLogger("docgen.passwords")
+
+# --- Password Hashing Configuration ---
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))                     # cost factor for new hashes
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))      # processes per app worker; 0 = hash in threads
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))  # queued + running hashes per app worker
+
+# Hashes below BCRYPT_ROUNDS count as outdated, so raising the cost upgrades users as they log in
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
+
+
+def _prehash(password: str) -> str:
+    # Pre-hash with SHA256 to allow passwords > 72 bytes and avoid bcrypt limit
+    return hashlib.sha256(password.encode('utf-8')).hexdigest()
+
+
+def verify_password(plain_password, hashed_password):
+    return pwd_context.verify(_prehash(plain_password), hashed_password)
+
+
+def get_password_hash(password):
+    return pwd_context.hash(_prehash(password))
+
+
+def verify_and_update(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    """(valid, new_hash); new_hash is set when the stored hash should be replaced."""
+    return pwd_context.verify_and_update(_prehash(plain_password), hashed_password)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = None
+
+
+def get_pool() -> Optional[ProcessPoolExecutor]:
+    """Process-wide hashing pool (created on first use), or None when PASSWORD_HASH_WORKERS is 0."""
+    global _pool
+    if PASSWORD_HASH_WORKERS <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: never fork a process that is running threads and an event loop
+                _pool = ProcessPoolExecutor(
+                    max_workers=PASSWORD_HASH_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+    return _pool
+
+
+def _discard_pool(broken: ProcessPoolExecutor):
+    """Drops a broken pool (a child was killed); the next get_pool() starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+async def _run(fn, *args):
+    global _pending
+    if _pending is None:
+        # Created lazily so it binds to the running event loop
+        _pending = asyncio.Semaphore(PASSWORD_HASH_MAX_PENDING)
+    async with _pending:
+        pool = get_pool()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        except (BrokenProcessPool, OSError):
+            # A pool that is still noticing a dead child can also fail to start its replacement with OSError
+            logger.warning("Password hashing pool broke (child process died); retrying on a fresh pool")
+            _discard_pool(pool)
+            return await asyncio.get_running_loop().run_in_executor(get_pool(), fn, *args)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run(verify_password, plain_password, hashed_password)
+
+
+async def verify_and_update_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await _run(verify_and_update, plain_password, hashed_password)
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+atexit.register(shutdown_pool)
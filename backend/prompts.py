@@ -152,6 +152,12 @@ PROMPTS = {
     "report": REPORT_PROMPT
 }
 
+# Follow-up when some sections of an answer were missing or had the wrong type (ai_client)
+SECTION_RETRY_PROMPT = r"""{prompt}
+Your previous answer was missing these keys or gave them the wrong type: {sections}.
+Return ONLY a JSON object with exactly these keys, typed as in the structure above.
+"""
+
 # RAW_TO_JSON_PROMPT was removed as we switched to structured-only guided mode.
 
 
@@ -0,0 +1,28 @@
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger("docgen.render_cache")
+
+
+def canonical_json(data) -> str:
+    """Stable serialisation: key order and whitespace never change the hash."""
+    return json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def artifact_key(doc_type: str, fields: dict, template_digest: str) -> str:
+    """
+    Content address of a rendered document.
+    Same doc_type + same final fields + same template bytes => same DOCX/PDF.
+    """
+    payload = canonical_json({
+        "doc_type": doc_type,
+        "fields": fields or {},
+        "template": template_digest,
+    })
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def artifact_stem(doc_type: str, key: str) -> str:
+    return f"{doc_type}_{key[:16]}"
+
@@ -0,0 +1,221 @@
+import logging
+from collections import defaultdict
+from typing import Optional, List, Tuple
+
+from fastapi import Depends
+
+# Cosmos transactional batches hold at most 100 operations, all in one partition
+BULK_CHUNK_SIZE = 100
+
+from database import get_db
+from models import User, Document
+import metrics
+
+logger = logging.getLogger("docgen.repository")
+
+
+class UserRepository:
+    """Users container, partitioned on /email."""
+
+    def __init__(self, container):
+        self.container = container
+
+    def get_by_email(self, email: str) -> Optional[User]:
+        # User ids are random, so this is a query - but scoped to the user's own partition
+        items = list(self.container.query_items(
+            query="SELECT * FROM c WHERE c.email = @email",
+            parameters=[{"name": "@email", "value": email}],
+            partition_key=email
+        ))
+        return User(**items[0]) if items else None
+
+    def exists(self, email: str) -> bool:
+        items = list(self.container.query_items(
+            query="SELECT VALUE COUNT(1) FROM c WHERE c.email = @email",
+            parameters=[{"name": "@email", "value": email}],
+            partition_key=email
+        ))
+        return bool(items and items[0])
+
+    def create(self, user: User) -> User:
+        if not user.partitionKey:
+            user.partitionKey = user.email
+        with metrics.track("cosmos_write"):
+            self.container.create_item(body=user.dict(by_alias=True))
+        return user
+
+    def upsert(self, user: User) -> User:
+        if not user.partitionKey:
+            user.partitionKey = user.email
+        with metrics.track("cosmos_write"):
+            self.container.upsert_item(body=user.dict(by_alias=True))
+        return user
+
+
+class DocumentRepository:
+    """Documents container, partitioned on /user_id."""
+
+    def __init__(self, container):
+        self.container = container
+
+    def get(self, user_id: str, doc_id: str) -> Optional[Document]:
+        """Point read; a document of another user is simply not found in this partition."""
+        from azure.cosmos.exceptions import CosmosResourceNotFoundError
+
+        try:
+            item = self.container.read_item(item=doc_id, partition_key=user_id)
+        except CosmosResourceNotFoundError:
+            return None
+        return Document(**item)
+
+    # Only what the dashboard list shows; input_data can be large and is fetched per document
+    LIST_PROJECTION = (
+        "c.id, c.doc_type, c.filename, c.created_at, c.pdf_status, "
+        "(IS_DEFINED(c.input_data) AND NOT IS_NULL(c.input_data)) AS has_input_data"
+    )
+
+    def list_page(
+        self,
+        user_id: str,
+        limit: int,
+        continuation: Optional[str] = None,
+        doc_type: Optional[str] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        One page of a user's documents, newest first, as a single-partition query.
+        Returns (items, continuation_token); the token is None on the last page.
+        """
+        conditions = ["c.user_id = @uid"]
+        parameters = [{"name": "@uid", "value": user_id}]
+        if doc_type:
+            conditions.append("c.doc_type = @doc_type")
+            parameters.append({"name": "@doc_type", "value": doc_type})
+        if created_after:
+            conditions.append("c.created_at >= @after")
+            parameters.append({"name": "@after", "value": created_after})
+        if created_before:
+            conditions.append("c.created_at < @before")
+            parameters.append({"name": "@before", "value": created_before})
+
+        query = (
+            f"SELECT {self.LIST_PROJECTION} FROM c WHERE {' AND '.join(conditions)} "
+            "ORDER BY c.created_at DESC"
+        )
+        pager = self.container.query_items(
+            query=query,
+            parameters=parameters,
+            partition_key=user_id,
+            max_item_count=limit
+        ).by_page(continuation)
+
+        from azure.cosmos.exceptions import CosmosHttpResponseError
+
+        try:
+            items = list(next(pager))
+        except StopIteration:
+            items = []
+        except CosmosHttpResponseError as e:
+            # Cosmos rejects a token it did not issue with a 400
+            if continuation and e.status_code == 400:
+                raise ValueError("Invalid continuation token")
+            raise
+        return items, pager.continuation_token
+
+    def create(self, doc: Document) -> Document:
+        if not doc.partitionKey:
+            doc.partitionKey = doc.user_id
+        with metrics.track("cosmos_write", doc.doc_type):
+            self.container.create_item(body=doc.dict(by_alias=True))
+        return doc
+
+    def create_many(self, docs: List[Document]) -> List[Optional[str]]:
+        """
+        Bulk insert: one transactional batch per partition and 100 documents.
+        Returns an error message (or None) per document, in input order.
+        """
+        errors = [None] * len(docs)
+        by_partition = defaultdict(list)
+        for i, doc in enumerate(docs):
+            if not doc.partitionKey:
+                doc.partitionKey = doc.user_id
+            by_partition[doc.user_id].append(i)
+
+        for user_id, indexes in by_partition.items():
+            for start in range(0, len(indexes), BULK_CHUNK_SIZE):
+                chunk = indexes[start:start + BULK_CHUNK_SIZE]
+                operations = [("create", (docs[i].dict(by_alias=True),)) for i in chunk]
+                try:
+                    with metrics.track("cosmos_write_batch"):
+                        self.container.execute_item_batch(batch_operations=operations, partition_key=user_id)
+                except Exception as e:
+                    # The batch is atomic: none of its documents were written
+                    logger.error(f"Bulk insert of {len(chunk)} documents failed: {e}")
+                    for i in chunk:
+                        errors[i] = str(e)
+        return errors
+
+    def upsert(self, doc: Document) -> Document:
+        if not doc.partitionKey:
+            doc.partitionKey = doc.user_id
+        with metrics.track("cosmos_write", doc.doc_type):
+            self.container.upsert_item(body=doc.dict(by_alias=True))
+        return doc
+
+    def iter_without_artifacts(self):
+        """Legacy documents that predate stored artifact paths (migration only - fans out)."""
+        for item in self.container.query_items(
+            query="SELECT * FROM c WHERE NOT IS_DEFINED(c.artifacts)",
+            enable_cross_partition_query=True
+        ):
+            yield Document(**item)
+
+    # Everything but input_data, which the sweeper does not need
+    SWEEP_PROJECTION = (
+        "c.id, c.user_id, c.filename, c.file_path, c.doc_type, c.created_at, "
+        "c.artifact_key, c.artifacts, c.pdf_status, c.partitionKey"
+    )
+
+    def iter_all(self):
+        """Every document without its input_data (artifact sweeper only - fans out)."""
+        for item in self.container.query_items(
+            query=f"SELECT {self.SWEEP_PROJECTION} FROM c",
+            enable_cross_partition_query=True
+        ):
+            yield Document(**item)
+
+    def delete(self, doc: Document):
+        with metrics.track("cosmos_write", doc.doc_type):
+            self.container.delete_item(item=doc.id, partition_key=doc.user_id)
+
+    def count_artifact_refs(self, artifact_key: str, exclude_id: str) -> int:
+        """
+        Reference count for a shared render artifact: how many other documents point at it.
+        Documents of different users can share one artifact, so this one has to fan out.
+        """
+        counts = list(self.container.query_items(
+            query="SELECT VALUE COUNT(1) FROM c WHERE c.artifact_key = @key AND c.id != @id",
+            parameters=[
+                {"name": "@key", "value": artifact_key},
+                {"name": "@id", "value": exclude_id}
+            ],
+            enable_cross_partition_query=True
+        ))
+        return counts[0] if counts else 0
+
+
+class Repository:
+    def __init__(self, db: dict):
+        if db.get("store") is not None:
+            # SQLite backend (DB_BACKEND=sqlite|memory): same interface, already bound to its tables
+            self.users = db["users"]
+            self.documents = db["documents"]
+            return
+        self.users = UserRepository(db["users"])
+        self.documents = DocumentRepository(db["documents"])
+
+
+def get_repo(db: dict = Depends(get_db)) -> Repository:
+    """Dependency for FastAPI routes"""
+    return Repository(db)
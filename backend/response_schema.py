@@ -0,0 +1,177 @@
+"""
+Typed response schemas for the Gemini prompts.
+
+Each prompt in prompts.py ends with the JSON skeleton Gemini has to fill ("Return this exact
+JSON structure: ..."); the schemas are read off those skeletons, so prompts.py stays the one
+place that defines the shape of a document.
+
+- schema(): the skeleton as an OpenAPI-subset schema for generation_config.response_schema
+- parse(): a response as a dict; near-misses (fences, trailing commas, trailing junk, a cut-off
+  object) are repaired locally instead of failing
+- conform(): coerces values to the skeleton's types and names the top-level sections that
+  are still missing or unusable, so only those need asking for again
+"""
+import re
+import copy
+import json
+import logging
+import functools
+from typing import Any, List, Optional, Tuple
+
+from prompts import PROMPTS
+from json_stream import IncrementalJSONParser
+
+logger = logging.getLogger("docgen.response_schema")
+
+SKELETON_MARKER = "Return this exact JSON structure:"
+
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+")
+
+
+@functools.lru_cache(maxsize=None)
+def skeleton(doc_type: str) -> Optional[dict]:
+    """The JSON structure embedded in the doc type's prompt (None if it has none)."""
+    prompt = PROMPTS.get(doc_type, "")
+    if SKELETON_MARKER not in prompt:
+        return None
+    text = prompt.split(SKELETON_MARKER, 1)[1].replace("{{", "{").replace("}}", "}")
+    return json.loads(text[text.index("{"):text.rindex("}") + 1])
+
+
+def _schema_of(value: Any) -> dict:
+    if isinstance(value, dict):
+        return {
+            "type": "object",
+            "properties": {k: _schema_of(v) for k, v in value.items()},
+            "required": list(value),
+        }
+    if isinstance(value, list):
+        # An empty list in a skeleton is a list of strings (skills, bullets, achievements)
+        return {"type": "array", "items": _schema_of(value[0] if value else "")}
+    if isinstance(value, bool):
+        return {"type": "boolean"}
+    if isinstance(value, (int, float)):
+        return {"type": "number"}
+    return {"type": "string"}
+
+
+@functools.lru_cache(maxsize=None)
+def _schema(doc_type: str, sections: Optional[Tuple[str, ...]]) -> Optional[dict]:
+    shape = skeleton(doc_type)
+    if shape is None:
+        return None
+    if sections is not None:
+        shape = {k: shape[k] for k in sections if k in shape}
+    return _schema_of(shape)
+
+
+def schema(doc_type: str, sections: Optional[List[str]] = None) -> Optional[dict]:
+    """Response schema for the doc type, or for just `sections` of it."""
+    result = _schema(doc_type, tuple(sections) if sections is not None else None)
+    # The SDK may hold on to what it is given; never hand out the cached object
+    return copy.deepcopy(result)
+
+
+def parse(text: str) -> dict:
+    """The JSON object in a response. Raises ValueError when not even one top-level field is usable."""
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            return data
+    except ValueError:
+        pass
+
+    # Near-misses: prose or fences around the object, trailing commas, junk after it, a cut-off end
+    parser = IncrementalJSONParser()
+    events = parser.feed(_TRAILING_COMMA.sub(r"\1", text))
+    try:
+        data = parser.result()
+        if isinstance(data, dict):
+            return data
+    except ValueError:
+        pass
+    fields = {e["key"]: e["value"] for e in events if e["type"] == "field"}
+    if not fields:
+        raise ValueError("No usable JSON object in response")
+    logger.info(f"Salvaged {len(fields)} complete fields from an unparsable response")
+    return fields
+
+
+def _empty(shape: Any) -> Any:
+    if isinstance(shape, dict):
+        return {k: _empty(v) for k, v in shape.items()}
+    if isinstance(shape, list):
+        return []
+    return ""
+
+
+def _coerce(shape: Any, value: Any) -> Tuple[bool, Any]:
+    """(usable, value coerced to the shape of `shape`)."""
+    if isinstance(shape, dict):
+        if not isinstance(value, dict):
+            return False, None
+        coerced = {}
+        for key, sub_shape in shape.items():
+            ok, sub = _coerce(sub_shape, value.get(key))
+            coerced[key] = sub if ok else _empty(sub_shape)
+        return True, coerced
+
+    if isinstance(shape, list):
+        item_shape = shape[0] if shape else ""
+        if value is None:
+            return True, []
+        if isinstance(value, dict) and isinstance(item_shape, dict):
+            value = [value]
+        elif isinstance(value, str) and not isinstance(item_shape, (dict, list)):
+            # "- a\n- b" where a list of strings was asked for
+            value = [_BULLET.sub("", line).strip() for line in value.splitlines() if line.strip()]
+        if not isinstance(value, list):
+            return False, None
+        items = []
+        for item in value:
+            ok, coerced = _coerce(item_shape, item)
+            if ok:
+                items.append(coerced)
+        return bool(items) or not value, items
+
+    if value is None:
+        return True, ""
+    if isinstance(value, str):
+        return True, value
+    if isinstance(value, (int, float, bool)):
+        return True, str(value)
+    if isinstance(value, list) and all(isinstance(v, (str, int, float)) for v in value):
+        return True, "\n".join(str(v) for v in value)
+    return False, None
+
+
+def conform(doc_type: str, data: dict, sections: Optional[List[str]] = None, fallback: Optional[dict] = None) -> Tuple[dict, List[str]]:
+    """
+    Coerces `data` to the doc type's skeleton (only `sections` of it, if given).
+    A section Gemini got wrong is taken from `fallback` (the user's own input) when that fits.
+    Returns (conformed data, sections still missing or unusable). Keys outside the skeleton pass through.
+    """
+    shape = skeleton(doc_type)
+    if shape is None:
+        return dict(data), []
+
+    result = {k: v for k, v in data.items() if k not in shape} if sections is None else {}
+    invalid = []
+    for key in shape if sections is None else sections:
+        ok, value = _coerce(shape[key], data[key]) if key in data else (False, None)
+        if not ok and fallback and fallback.get(key):
+            ok, value = _coerce(shape[key], fallback[key])
+        if ok:
+            result[key] = value
+        else:
+            invalid.append(key)
+    return result, invalid
+
+
+def fill_missing(doc_type: str, data: dict, sections: List[str]) -> dict:
+    """Empty values of the right type for sections that could not be obtained."""
+    shape = skeleton(doc_type) or {}
+    for key in sections:
+        data[key] = _empty(shape.get(key, ""))
+    return data
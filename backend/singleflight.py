@@ -0,0 +1,149 @@
+import os
+import asyncio
+import logging
+import threading
+import contextlib
+from pathlib import Path
+from concurrent.futures import Future
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: in-process coalescing only
+    fcntl = None
+
+logger = logging.getLogger("docgen.singleflight")
+
+_groups = []
+
+
+class _Group:
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0       # every do()
+        self.executed = 0    # calls that actually ran the work
+        self.coalesced = 0   # calls that waited on someone else's run
+        _groups.append(self)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls),
+        }
+
+
+class SingleFlight(_Group):
+    """
+    Thread-based duplicate suppression: concurrent do() calls with the same key
+    run `fn` once and all receive its result (or its exception).
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            self.calls += 1
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class AsyncSingleFlight(_Group):
+    """asyncio flavour of SingleFlight; `coro_fn` is a zero-argument coroutine function."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._calls = {}
+
+    async def do(self, key, coro_fn):
+        self.calls += 1
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shield: a waiter giving up must not cancel the leader's work
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.executed += 1
+        try:
+            result = await coro_fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved; waiters (if any) still see it
+            raise
+        finally:
+            del self._calls[key]
+
+
+@contextlib.contextmanager
+def file_lock(path: Path):
+    """
+    Exclusive advisory lock shared by all worker processes on this host.
+    Wrap the leader's work in it so other gunicorn workers wait instead of repeating it.
+    """
+    if fcntl is None:
+        yield
+        return
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def try_file_lock(path: Path):
+    """Like file_lock, but never waits: yields False when another process holds the lock."""
+    if fcntl is None:
+        yield True
+        return
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def all_stats() -> dict:
+    return {group.name: group.stats() for group in _groups}
@@ -0,0 +1,274 @@
+import os
+import time
+import queue
+import shutil
+import socket
+import atexit
+import logging
+import tempfile
+import threading
+import subprocess
+import importlib.util
+from pathlib import Path
+
+logger = logging.getLogger("docgen.soffice_pool")
+
+# --- Pool Configuration ---
+SOFFICE_BIN = os.getenv("SOFFICE_BIN", "soffice")
+SOFFICE_POOL_SIZE = int(os.getenv("SOFFICE_POOL_SIZE", "2"))               # 0 disables the pool
+SOFFICE_MAX_CONVERSIONS = int(os.getenv("SOFFICE_MAX_CONVERSIONS", "200"))  # recycle instance after N docs
+SOFFICE_START_TIMEOUT = float(os.getenv("SOFFICE_START_TIMEOUT", "30"))
+SOFFICE_ACQUIRE_TIMEOUT = float(os.getenv("SOFFICE_ACQUIRE_TIMEOUT", "60"))
+SOFFICE_CONVERT_TIMEOUT = float(os.getenv("SOFFICE_CONVERT_TIMEOUT", "120"))  # one-off soffice runs are killed after this
+SOFFICE_START_COOLDOWN = float(os.getenv("SOFFICE_START_COOLDOWN", "300"))  # seconds the pool stays off after a failed start
+SOFFICE_PROFILE_ROOT = Path(os.getenv("SOFFICE_PROFILE_ROOT", Path(tempfile.gettempdir()) / "docgen-soffice"))
+
+
+_uno = None
+
+
+def uno_available() -> bool:
+    """The pool talks to LibreOffice through pyuno, which only exists where LibreOffice's python bindings are installed."""
+    global _uno
+    if _uno is None:
+        _uno = importlib.util.find_spec("uno") is not None
+        if not _uno and SOFFICE_POOL_SIZE > 0:
+            logger.warning("pyuno is not importable from this interpreter: soffice pool disabled, each PDF starts its own soffice")
+    return _uno
+
+
+def profile_dir_for(name: str) -> Path:
+    """Private LibreOffice user profile, so concurrent soffice processes never share one."""
+    path = SOFFICE_PROFILE_ROOT / f"{os.getpid()}-{name}"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class SofficeInstance:
+    """One long-lived headless LibreOffice listening on a UNO socket."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.port = None
+        self.process = None
+        self.desktop = None
+        self.profile_dir = None
+        self.conversions = 0
+
+    def start(self):
+        self.port = _free_port()
+        self.profile_dir = profile_dir_for(f"pool{self.index}-{self.port}")
+        cmd = [
+            SOFFICE_BIN,
+            '--headless',
+            '--invisible',
+            '--nologo',
+            '--nodefault',
+            '--norestore',
+            '--nolockcheck',
+            f'-env:UserInstallation={self.profile_dir.as_uri()}',
+            f'--accept=socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext',
+        ]
+        self.process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.conversions = 0
+
+        deadline = time.monotonic() + SOFFICE_START_TIMEOUT
+        last_error = None
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"soffice exited during startup (code {self.process.returncode})")
+            try:
+                self.desktop = self._connect()
+                logger.info(f"soffice instance {self.index} ready on port {self.port}")
+                return
+            except Exception as e:
+                last_error = e
+                time.sleep(0.25)
+
+        self.stop()
+        raise RuntimeError(f"soffice instance {self.index} did not accept connections: {last_error}")
+
+    def _connect(self):
+        import uno
+
+        local_ctx = uno.getComponentContext()
+        resolver = local_ctx.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local_ctx
+        )
+        ctx = resolver.resolve(
+            f"uno:socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext"
+        )
+        return ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+
+    def is_healthy(self) -> bool:
+        if self.process is None or self.process.poll() is not None or self.desktop is None:
+            return False
+        try:
+            # Cheap round trip over the bridge; raises if the connection is dead
+            self.desktop.getComponents()
+            return True
+        except Exception:
+            return False
+
+    def convert(self, docx_path: str, pdf_path: str):
+        import uno
+        from com.sun.star.beans import PropertyValue
+
+        def prop(name, value):
+            p = PropertyValue()
+            p.Name = name
+            p.Value = value
+            return p
+
+        doc = self.desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(str(Path(docx_path).resolve())),
+            "_blank",
+            0,
+            (prop("Hidden", True),),
+        )
+        if doc is None:
+            raise RuntimeError(f"LibreOffice could not open {docx_path}")
+        try:
+            doc.storeToURL(
+                uno.systemPathToFileUrl(str(Path(pdf_path).resolve())),
+                (prop("FilterName", "writer_pdf_Export"),),
+            )
+        finally:
+            doc.close(True)
+        self.conversions += 1
+
+    def stop(self):
+        if self.desktop is not None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                pass
+            self.desktop = None
+        if self.process is not None:
+            try:
+                self.process.terminate()
+                self.process.wait(timeout=10)
+            except Exception:
+                self.process.kill()
+            self.process = None
+        if self.profile_dir is not None:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+
+class SofficePool:
+    """
+    Fixed-size pool of SofficeInstance objects.
+    Instances are started lazily on the first conversion, health-checked before
+    every use and recycled after SOFFICE_MAX_CONVERSIONS documents.
+    """
+
+    def __init__(self, size: int, max_conversions: int):
+        self.size = size
+        self.max_conversions = max_conversions
+        self._idle = queue.Queue()
+        self._instances = []
+        self._lock = threading.Lock()
+        self._started = False
+        self._disabled_until = 0.0
+
+    def _ensure_started(self):
+        """
+        Starts every instance, or none: after a failed start the ones already running are stopped and
+        the pool stays off for SOFFICE_START_COOLDOWN. Callers never queue behind a start in progress;
+        they get a RuntimeError and use the subprocess fallback meanwhile.
+        """
+        if self._started:
+            return
+        if time.monotonic() < self._disabled_until:
+            raise RuntimeError("soffice pool disabled after a failed start")
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("soffice pool is starting")
+        try:
+            if self._started:
+                return
+            started = []
+            try:
+                for i in range(self.size):
+                    instance = SofficeInstance(i)
+                    instance.start()
+                    started.append(instance)
+            except Exception:
+                for instance in started:
+                    instance.stop()
+                self._disabled_until = time.monotonic() + SOFFICE_START_COOLDOWN
+                logger.error(f"soffice pool failed to start; disabled for {SOFFICE_START_COOLDOWN:g}s")
+                raise
+            self._instances = started
+            self._idle = queue.Queue()
+            for instance in started:
+                self._idle.put(instance)
+            self._started = True
+        finally:
+            self._lock.release()
+
+    def convert(self, docx_path: str, out_dir: str) -> bool:
+        self._ensure_started()
+        pdf_path = Path(out_dir) / f"{Path(docx_path).stem}.pdf"
+
+        instance = self._idle.get(timeout=SOFFICE_ACQUIRE_TIMEOUT)
+        try:
+            if not instance.is_healthy():
+                logger.warning(f"soffice instance {instance.index} unhealthy, restarting")
+                instance.restart()
+            try:
+                instance.convert(docx_path, str(pdf_path))
+            except Exception:
+                # A failed conversion can leave the instance wedged; start fresh for the next caller
+                instance.restart()
+                raise
+
+            if instance.conversions >= self.max_conversions:
+                logger.info(f"Recycling soffice instance {instance.index} after {instance.conversions} conversions")
+                instance.restart()
+        finally:
+            self._idle.put(instance)
+
+        return pdf_path.exists()
+
+    def shutdown(self):
+        with self._lock:
+            for instance in self._instances:
+                instance.stop()
+            self._instances = []
+            self._idle = queue.Queue()
+            self._started = False
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Returns the process-wide pool, or None when pooling is disabled or pyuno is missing."""
+    global _pool
+    if SOFFICE_POOL_SIZE <= 0 or not uno_available():
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SofficePool(SOFFICE_POOL_SIZE, SOFFICE_MAX_CONVERSIONS)
+    return _pool
+
+
+def shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown()
+
+
+atexit.register(shutdown_pool)
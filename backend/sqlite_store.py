@@ -0,0 +1,302 @@
+import os
+import json
+import queue
+import sqlite3
+import logging
+import threading
+import contextlib
+from pathlib import Path
+from typing import Optional, List, Tuple
+
+from models import User, Document
+import metrics
+
+logger = logging.getLogger("docgen.sqlite_store")
+
+# --- SQLite Configuration ---
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))           # connections per worker process
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "10"))  # seconds to wait for another writer
+
+MEMORY = ":memory:"
+
+# Whole records stay JSON in `body`; the columns are what lookups, filters and the dashboard list need
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    doc_type TEXT,
+    filename TEXT,
+    created_at TEXT NOT NULL,
+    pdf_status TEXT,
+    has_input_data INTEGER NOT NULL DEFAULT 0,
+    artifact_key TEXT,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_user_created ON documents(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_documents_created ON documents(created_at);
+CREATE INDEX IF NOT EXISTS idx_documents_artifact ON documents(artifact_key);
+"""
+
+
+class ConnectionPool:
+    """
+    A fixed number of connections shared by all threads of the process.
+    Callers block until one is free; each is handed to one thread at a time.
+    """
+
+    def __init__(self, path: str, size: int = SQLITE_POOL_SIZE):
+        self.path = path
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        if path == MEMORY:
+            # Shared-cache connections fail on table locks instead of waiting for them: use just one
+            self.size = 1
+            self._target, self._uri = f"file:docgen-{id(self)}?mode=memory&cache=shared", True
+        else:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._target, self._uri = path, False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self._target, uri=self._uri, timeout=SQLITE_BUSY_TIMEOUT,
+            check_same_thread=False, isolation_level=None
+        )
+        conn.row_factory = sqlite3.Row
+        if not self._uri:
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextlib.contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._created < self.size
+                if grow:
+                    self._created += 1
+            if grow:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def stats(self) -> dict:
+        return {"size": self.size, "open": self._created, "idle": self._idle.qsize()}
+
+
+class SQLiteUserRepository:
+    """Same interface as repository.UserRepository, on the `users` table."""
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+
+    def get_by_email(self, email: str) -> Optional[User]:
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT body FROM users WHERE email = ?", (email,)).fetchone()
+        return User(**json.loads(row["body"])) if row else None
+
+    def exists(self, email: str) -> bool:
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT 1 FROM users WHERE email = ?", (email,)).fetchone() is not None
+
+    def create(self, user: User) -> User:
+        if not user.partitionKey:
+            user.partitionKey = user.email
+        with metrics.track("sqlite_write"), self.pool.transaction() as conn:
+            conn.execute(
+                "INSERT INTO users (id, email, body) VALUES (?, ?, ?)",
+                (user.id, user.email, json.dumps(user.dict(by_alias=True)))
+            )
+        return user
+
+    def upsert(self, user: User) -> User:
+        if not user.partitionKey:
+            user.partitionKey = user.email
+        with metrics.track("sqlite_write"), self.pool.transaction() as conn:
+            conn.execute(
+                "INSERT INTO users (id, email, body) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET email = excluded.email, body = excluded.body",
+                (user.id, user.email, json.dumps(user.dict(by_alias=True)))
+            )
+        return user
+
+
+def _document_row(doc: Document) -> tuple:
+    return (
+        doc.id, doc.user_id, doc.doc_type, doc.filename, doc.created_at, doc.pdf_status,
+        1 if doc.input_data is not None else 0, doc.artifact_key, json.dumps(doc.dict(by_alias=True))
+    )
+
+
+_INSERT_DOCUMENT = (
+    "INSERT INTO documents (id, user_id, doc_type, filename, created_at, pdf_status, has_input_data, artifact_key, body) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+class SQLiteDocumentRepository:
+    """Same interface as repository.DocumentRepository, on the `documents` table."""
+
+    LIST_COLUMNS = "id, doc_type, filename, created_at, pdf_status, has_input_data"
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+
+    def get(self, user_id: str, doc_id: str) -> Optional[Document]:
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT body FROM documents WHERE id = ? AND user_id = ?", (doc_id, user_id)
+            ).fetchone()
+        return Document(**json.loads(row["body"])) if row else None
+
+    def list_page(
+        self,
+        user_id: str,
+        limit: int,
+        continuation: Optional[str] = None,
+        doc_type: Optional[str] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        One page of a user's documents, newest first, served from idx_documents_user_created.
+        The continuation token is the (created_at, id) of the last item returned (keyset paging).
+        """
+        conditions = ["user_id = ?"]
+        parameters = [user_id]
+        if doc_type:
+            conditions.append("doc_type = ?")
+            parameters.append(doc_type)
+        if created_after:
+            conditions.append("created_at >= ?")
+            parameters.append(created_after)
+        if created_before:
+            conditions.append("created_at < ?")
+            parameters.append(created_before)
+        if continuation:
+            try:
+                last_created, last_id = json.loads(continuation)
+            except (ValueError, TypeError):
+                raise ValueError("Invalid continuation token")
+            if not isinstance(last_created, str) or not isinstance(last_id, str):
+                raise ValueError("Invalid continuation token")
+            conditions.append("(created_at < ? OR (created_at = ? AND id < ?))")
+            parameters.extend([last_created, last_created, last_id])
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                f"SELECT {self.LIST_COLUMNS} FROM documents WHERE {' AND '.join(conditions)} "
+                "ORDER BY created_at DESC, id DESC LIMIT ?",
+                (*parameters, limit + 1)
+            ).fetchall()
+
+        items = [dict(row, has_input_data=bool(row["has_input_data"])) for row in rows[:limit]]
+        next_token = json.dumps([items[-1]["created_at"], items[-1]["id"]]) if len(rows) > limit else None
+        return items, next_token
+
+    def create(self, doc: Document) -> Document:
+        if not doc.partitionKey:
+            doc.partitionKey = doc.user_id
+        with metrics.track("sqlite_write", doc.doc_type), self.pool.transaction() as conn:
+            conn.execute(_INSERT_DOCUMENT, _document_row(doc))
+        return doc
+
+    def create_many(self, docs: List[Document]) -> List[Optional[str]]:
+        """Bulk insert in one transaction per user, mirroring the per-partition batches on Cosmos."""
+        errors = [None] * len(docs)
+        by_user = {}
+        for i, doc in enumerate(docs):
+            if not doc.partitionKey:
+                doc.partitionKey = doc.user_id
+            by_user.setdefault(doc.user_id, []).append(i)
+
+        for indexes in by_user.values():
+            try:
+                with metrics.track("sqlite_write_batch"), self.pool.transaction() as conn:
+                    conn.executemany(_INSERT_DOCUMENT, [_document_row(docs[i]) for i in indexes])
+            except sqlite3.Error as e:
+                logger.error(f"Bulk insert of {len(indexes)} documents failed: {e}")
+                for i in indexes:
+                    errors[i] = str(e)
+        return errors
+
+    def upsert(self, doc: Document) -> Document:
+        if not doc.partitionKey:
+            doc.partitionKey = doc.user_id
+        with metrics.track("sqlite_write", doc.doc_type), self.pool.transaction() as conn:
+            conn.execute(
+                _INSERT_DOCUMENT + " ON CONFLICT(id) DO UPDATE SET "
+                "doc_type = excluded.doc_type, filename = excluded.filename, pdf_status = excluded.pdf_status, "
+                "has_input_data = excluded.has_input_data, artifact_key = excluded.artifact_key, body = excluded.body",
+                _document_row(doc)
+            )
+        return doc
+
+    def iter_without_artifacts(self):
+        """Legacy documents that predate stored artifact paths (migration only)."""
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT body FROM documents WHERE json_extract(body, '$.artifacts') IS NULL"
+            ).fetchall()
+        for row in rows:
+            yield Document(**json.loads(row["body"]))
+
+    def iter_all(self):
+        """Every document without its input_data (artifact sweeper only)."""
+        with self.pool.connection() as conn:
+            rows = conn.execute("SELECT json_remove(body, '$.input_data') AS body FROM documents").fetchall()
+        for row in rows:
+            yield Document(**json.loads(row["body"]))
+
+    def delete(self, doc: Document):
+        with metrics.track("sqlite_write", doc.doc_type), self.pool.transaction() as conn:
+            conn.execute("DELETE FROM documents WHERE id = ? AND user_id = ?", (doc.id, doc.user_id))
+
+    def count_artifact_refs(self, artifact_key: str, exclude_id: str) -> int:
+        with self.pool.connection() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM documents WHERE artifact_key = ? AND id != ?", (artifact_key, exclude_id)
+            ).fetchone()[0]
+
+
+class SQLiteStore:
+    """A SQLite file (or shared in-memory database) holding both tables."""
+
+    def __init__(self, path: str, pool_size: int = SQLITE_POOL_SIZE):
+        self.path = path
+        self.pool = ConnectionPool(path, pool_size)
+        with self.pool.connection() as conn:
+            conn.executescript(SCHEMA)
+        self.users = SQLiteUserRepository(self.pool)
+        self.documents = SQLiteDocumentRepository(self.pool)
+        logger.info(f"Using SQLite database: {path}")
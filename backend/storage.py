@@ -0,0 +1,129 @@
+import os
+import uuid
+import logging
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional, Iterator, NamedTuple, Tuple, Union
+
+logger = logging.getLogger("docgen.storage")
+
+# --- Storage Configuration ---
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+STREAM_CHUNK_SIZE = int(os.getenv("STORAGE_STREAM_CHUNK", str(256 * 1024)))
+
+
+class ObjectStat(NamedTuple):
+    size: int
+    mtime: float
+    etag: str  # quoted, ready for the ETag header
+    raw: Optional[os.stat_result] = None  # local files only; spares FileResponse a second stat
+
+
+class StorageBackend(ABC):
+    """
+    Where generated files live. Keys are '/'-separated paths such as
+    'generated/ab/cd/<id>.pdf' (the values stored in Document.artifacts).
+    """
+
+    @abstractmethod
+    def put(self, key: str, source: Union[Path, bytes]):
+        """Stores bytes or a local file (which the backend may move) under `key`, atomically."""
+
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        ...
+
+    @abstractmethod
+    def stat(self, key: str) -> Optional[ObjectStat]:
+        """None when the object does not exist."""
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        """True if something was deleted."""
+
+    @abstractmethod
+    def stream(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Yields bytes start..end (inclusive; end=None means to the end of the object)."""
+
+    @abstractmethod
+    def iter_objects(self, prefix: str = "") -> Iterator[Tuple[str, ObjectStat]]:
+        """(key, stat) of every object under the `prefix` folder, in no particular order."""
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """A path on this machine for zero-copy sends and tools that need a file; None for remote stores."""
+        return None
+
+    def exists(self, key: str) -> bool:
+        return self.stat(key) is not None
+
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key)
+        # Keys come from our own records, but never let one escape the root
+        if ".." in Path(key).parts or Path(key).is_absolute():
+            raise ValueError(f"Invalid storage key: {key!r}")
+        return path
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return self._path(key)
+
+    def put(self, key: str, source: Union[Path, bytes]):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(source, bytes):
+            tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+            tmp.write_bytes(source)
+            source = tmp
+        os.replace(source, path)
+
+    def get(self, key: str) -> bytes:
+        return self._path(key).read_bytes()
+
+    def stat(self, key: str) -> Optional[ObjectStat]:
+        try:
+            st = os.stat(self._path(key))
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return ObjectStat(st.st_size, st.st_mtime, f'"{st.st_size:x}-{st.st_mtime_ns:x}"', st)
+
+    def delete(self, key: str) -> bool:
+        try:
+            os.remove(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def iter_objects(self, prefix: str = "") -> Iterator[Tuple[str, ObjectStat]]:
+        top = self._path(prefix) if prefix else self.root
+        for dirpath, _, filenames in os.walk(top):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:  # removed while we walked
+                    continue
+                key = Path(path).relative_to(self.root).as_posix()
+                yield key, ObjectStat(st.st_size, st.st_mtime, f'"{st.st_size:x}-{st.st_mtime_ns:x}"', st)
+
+    def stream(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        with open(self._path(key), "rb") as f:
+            f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = f.read(STREAM_CHUNK_SIZE if remaining is None else min(STREAM_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+
+def create_storage(root: Path) -> StorageBackend:
+    if STORAGE_BACKEND == "local":
+        return LocalStorage(root)
+    # A blob-store backend slots in here
+    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND!r}")
@@ -0,0 +1,371 @@
+"""
+Garbage collection and retention for generated artifacts.
+
+A pass reconciles the files under generated/ (and the legacy flat output folder) with the
+Document records and removes:
+
+- orphan: rendered files no document points at (the insert failed after rendering, a record
+  was removed elsewhere), once older than the grace period
+- legacy: flat files of early deployments that no unmigrated document can still resolve to
+  (generated/ under STORAGE_DIR; the app's own folder with SWEEP_LEGACY_DIR=1)
+- temp: scratch files and folders left by interrupted renders/conversions
+- expired: documents past the retention policy, deleted like a user delete (their files
+  then go with the orphans)
+- cold_pdf: with SWEEP_COLD_PDF_DAYS, PDFs of artifacts nobody generated for that long;
+  the DOCX stays and the next download converts it again
+
+File and database operations are rate limited so a pass never competes with live traffic.
+The gunicorn workers share one schedule through a lock file and a state file, which also
+keeps the last report (GET /debug-sweeper).
+
+    python sweeper.py --dry-run     # report what a pass would remove
+    python sweeper.py               # run one pass now
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import posixpath
+import threading
+from datetime import datetime, timedelta
+from collections import defaultdict
+from typing import Callable, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv(override=False)
+
+import artifacts
+import metrics
+from artifacts import STORAGE_DIR, GENERATED, LEGACY_GENERATED, storage
+from storage import LocalStorage
+from singleflight import file_lock, try_file_lock
+from models import Document
+
+logger = logging.getLogger("docgen.sweeper")
+
+# --- Sweeper Configuration ---
+SWEEP_INTERVAL_HOURS = float(os.getenv("SWEEP_INTERVAL_HOURS", "6"))      # 0 disables the background sweeper
+SWEEP_DRY_RUN = os.getenv("SWEEP_DRY_RUN", "0") == "1"                      # background passes only report
+SWEEP_GRACE_HOURS = float(os.getenv("SWEEP_GRACE_HOURS", "24"))            # younger orphans are kept
+SWEEP_TEMP_GRACE_MINUTES = float(os.getenv("SWEEP_TEMP_GRACE_MINUTES", "60"))
+SWEEP_RETENTION_DAYS = float(os.getenv("SWEEP_RETENTION_DAYS", "0"))       # 0 keeps documents forever
+SWEEP_MAX_DOCS_PER_USER = int(os.getenv("SWEEP_MAX_DOCS_PER_USER", "0"))   # 0 means no limit
+SWEEP_COLD_PDF_DAYS = float(os.getenv("SWEEP_COLD_PDF_DAYS", "0"))         # 0 keeps every PDF
+SWEEP_LEGACY_DIR = os.getenv("SWEEP_LEGACY_DIR", "0") == "1"                # also reconcile the app's own generated/ folder
+SWEEP_SCAN_RATE = float(os.getenv("SWEEP_SCAN_RATE", "500"))               # files listed per second
+SWEEP_OPS_RATE = float(os.getenv("SWEEP_OPS_RATE", "20"))                  # deletes and database calls per second
+
+STATE_PATH = STORAGE_DIR / "sweeper.json"
+LOCK_PATH = STORAGE_DIR / "sweeper.lock"
+FILE_KINDS = ("orphan", "legacy", "temp", "cold_pdf")
+REPORT_SAMPLE = 20
+
+
+class _Stopped(Exception):
+    """The app is shutting down in the middle of a pass."""
+
+
+class _RateLimiter:
+    """Spaces calls to wait() evenly at `rate` per second (0 = unlimited)."""
+
+    def __init__(self, rate: float, stop: threading.Event):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._stop = stop
+        self._next = 0.0
+
+    def wait(self):
+        if self._stop.is_set():
+            raise _Stopped()
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self._next > now:
+            if self._stop.wait(self._next - now):
+                raise _Stopped()
+            now = self._next
+        self._next = now + self.interval
+
+
+def _new_report(dry_run: bool) -> dict:
+    return {
+        "dry_run": dry_run,
+        "started_at": datetime.utcnow().isoformat(),
+        "documents": 0,
+        "expired": {"age": 0, "per_user": 0, "sample": []},
+        "files": {kind: {"count": 0, "bytes": 0, "sample": []} for kind in FILE_KINDS},
+        "kept_in_grace": {"count": 0, "bytes": 0},
+        "warnings": [],
+        "errors": 0,
+    }
+
+
+def _sample(entry: dict, item: str):
+    if len(entry["sample"]) < REPORT_SAMPLE:
+        entry["sample"].append(item)
+
+
+def _load_state() -> dict:
+    try:
+        return json.loads(STATE_PATH.read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_state(state: dict):
+    tmp = STATE_PATH.with_name(f"{STATE_PATH.name}.tmp")
+    tmp.write_text(json.dumps(state))
+    os.replace(tmp, STATE_PATH)
+
+
+def expired_documents(docs: List[Document], report: dict) -> List[Document]:
+    """Documents outside the retention policy: older than SWEEP_RETENTION_DAYS or beyond a user's newest N."""
+    expired = {}
+    if SWEEP_RETENTION_DAYS > 0:
+        cutoff = (datetime.utcnow() - timedelta(days=SWEEP_RETENTION_DAYS)).isoformat()
+        for doc in docs:
+            if doc.created_at < cutoff:
+                expired[doc.id] = doc
+                report["expired"]["age"] += 1
+
+    if SWEEP_MAX_DOCS_PER_USER > 0:
+        by_user = defaultdict(list)
+        for doc in docs:
+            by_user[doc.user_id].append(doc)
+        for user_docs in by_user.values():
+            user_docs.sort(key=lambda d: d.created_at, reverse=True)
+            for doc in user_docs[SWEEP_MAX_DOCS_PER_USER:]:
+                if doc.id not in expired:
+                    expired[doc.id] = doc
+                    report["expired"]["per_user"] += 1
+
+    for doc in expired.values():
+        _sample(report["expired"], f"{doc.user_id}/{doc.id} ({doc.created_at})")
+    return list(expired.values())
+
+
+class _References:
+    """What the remaining documents point at."""
+
+    def __init__(self, docs: List[Document]):
+        self.stems = set()       # shard keys without extension (formats of one artifact share a stem)
+        self.newest = {}         # stem -> created_at of the newest document using it
+        self.legacy_paths = set()
+        for doc in docs:
+            if doc.artifacts:
+                for key in doc.artifacts.values():
+                    stem = posixpath.splitext(key)[0]
+                    self.stems.add(stem)
+                    self.newest[stem] = max(self.newest.get(stem, ""), doc.created_at)
+            else:
+                # Unmigrated record: any file its download could fall back to stays
+                for fmt in artifacts.FORMATS:
+                    self.legacy_paths.update(os.path.abspath(p) for p in artifacts.legacy_candidates(doc, fmt))
+
+
+class Sweeper:
+    def __init__(self, repo_factory: Callable[[], "Repository"]):
+        self.repo_factory = repo_factory
+        self._stop = threading.Event()
+        self._task = None
+
+    def sweep(self, dry_run: bool = False) -> dict:
+        """One full pass. Blocking; run it in a thread."""
+        report = _new_report(dry_run)
+        start = time.perf_counter()
+        ops = _RateLimiter(SWEEP_OPS_RATE, self._stop)
+        repo = self.repo_factory()
+
+        docs = list(repo.documents.iter_all())
+        report["documents"] = len(docs)
+        expired = expired_documents(docs, report)
+        if not dry_run:
+            for doc in expired:
+                ops.wait()
+                try:
+                    repo.documents.delete(doc)
+                    metrics.SWEEPER_REMOVED.inc("expired")
+                except Exception as e:
+                    logger.error(f"Failed to delete expired document {doc.id}: {e}")
+                    report["errors"] += 1
+
+        expired_ids = {doc.id for doc in expired}
+        refs = _References([doc for doc in docs if doc.id not in expired_ids])
+        if not docs:
+            # An empty (or wrong) database would make every rendered file look orphaned
+            report["warnings"].append("No document records found: orphan and legacy files were kept")
+        self._sweep_files(repo, refs, bool(docs), report, ops)
+
+        report["duration_s"] = round(time.perf_counter() - start, 2)
+        return report
+
+    def _listing(self):
+        scan = _RateLimiter(SWEEP_SCAN_RATE, self._stop)
+        sources = [(storage, "generated", False)]
+        if SWEEP_LEGACY_DIR and LEGACY_GENERATED.is_dir() and os.path.abspath(LEGACY_GENERATED) != os.path.abspath(GENERATED):
+            sources.append((LocalStorage(LEGACY_GENERATED), "", True))
+        for backend, prefix, legacy_root in sources:
+            for key, st in backend.iter_objects(prefix):
+                scan.wait()
+                yield backend, key, st, legacy_root
+
+    def _classify(self, backend, key: str, st, legacy_root: bool, refs: _References, present: set) -> Optional[str]:
+        name = posixpath.basename(key)
+        parts = key.split("/")
+        if legacy_root or len(parts) == 2:
+            if name.endswith(".tmp.docx"):
+                return "temp"
+            local = backend.local_path(key)
+            return None if local is not None and os.path.abspath(local) in refs.legacy_paths else "legacy"
+        if parts[1] == ".locks":
+            # Never unlinked: flock does not touch mtime, and a process that opened the old file would
+            # hold its lock while the next opener creates (and locks) a new one. They are empty.
+            return None
+        if name.endswith(".tmp") or any(p.startswith("tmp") for p in parts[1:-1]):
+            return "temp"
+
+        stem = posixpath.splitext(key)[0]
+        if stem not in refs.stems:
+            return "orphan"
+        if SWEEP_COLD_PDF_DAYS > 0 and key.endswith(".pdf") and f"{stem}.docx" in present:
+            cutoff = time.time() - SWEEP_COLD_PDF_DAYS * 86400
+            if st.mtime < cutoff and refs.newest[stem] < datetime.utcfromtimestamp(cutoff).isoformat():
+                return "cold_pdf"
+        return None
+
+    def _sweep_files(self, repo, refs: _References, has_docs: bool, report: dict, ops: _RateLimiter):
+        listing = list(self._listing())
+        present = {key for backend, key, _, _ in listing if backend is storage}
+        now = time.time()
+        grace = {
+            "orphan": SWEEP_GRACE_HOURS * 3600,
+            "legacy": SWEEP_GRACE_HOURS * 3600,
+            "temp": SWEEP_TEMP_GRACE_MINUTES * 60,
+            "cold_pdf": 0,
+        }
+
+        for backend, key, st, legacy_root in listing:
+            kind = self._classify(backend, key, st, legacy_root, refs, present)
+            if kind is None or (kind in ("orphan", "legacy") and not has_docs):
+                continue
+            if now - st.mtime < grace[kind]:
+                report["kept_in_grace"]["count"] += 1
+                report["kept_in_grace"]["bytes"] += st.size
+                continue
+            if not report["dry_run"] and not self._remove(repo, backend, key, kind, report, ops):
+                continue
+            entry = report["files"][kind]
+            entry["count"] += 1
+            entry["bytes"] += st.size
+            _sample(entry, key)
+            if not report["dry_run"]:
+                metrics.SWEEPER_REMOVED.inc(kind)
+                metrics.SWEEPER_FREED_BYTES.inc(kind, amount=st.size)
+
+    def _remove(self, repo, backend, key: str, kind: str, report: dict, ops: _RateLimiter) -> bool:
+        try:
+            if kind == "orphan":
+                # A render cache hit may have just picked this file up for a new document
+                artifact_id = posixpath.splitext(posixpath.basename(key))[0]
+                with file_lock(artifacts.refs_lock(artifact_id)):
+                    ops.wait()
+                    if repo.documents.count_artifact_refs(artifact_id, ""):
+                        return False
+                    ops.wait()
+                    backend.delete(key)
+            else:
+                ops.wait()
+                backend.delete(key)
+        except _Stopped:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to remove {key}: {e}")
+            report["errors"] += 1
+            return False
+
+        if kind == "temp":
+            # Scratch folders of TemporaryDirectory go once empty
+            local = backend.local_path(key)
+            if local is not None and local.parent.name.startswith("tmp"):
+                try:
+                    os.rmdir(local.parent)
+                except OSError:
+                    pass
+        return True
+
+    def run_if_due(self, dry_run: bool = SWEEP_DRY_RUN) -> Optional[dict]:
+        """A pass, unless another worker is sweeping or the last pass finished under an interval ago."""
+        with try_file_lock(LOCK_PATH) as acquired:
+            if not acquired:
+                return None
+            if time.time() - _load_state().get("finished", 0) < SWEEP_INTERVAL_HOURS * 3600:
+                return None
+            report = self.sweep(dry_run)
+            _save_state({"finished": time.time(), "report": report})
+            return report
+
+    async def _run_forever(self):
+        # Stagger the workers and stay clear of startup
+        await asyncio.sleep(random.uniform(60, 300))
+        while not self._stop.is_set():
+            try:
+                report = await asyncio.to_thread(self.run_if_due)
+                if report:
+                    logger.info(f"Sweep finished: {summary(report)}")
+            except _Stopped:
+                return
+            except Exception as e:
+                logger.error(f"Sweep failed, retrying later: {e}")
+            await asyncio.sleep(min(SWEEP_INTERVAL_HOURS * 3600, 600))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run_forever())
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    def last_report(self, samples: bool = False) -> dict:
+        """The state file: when the last pass finished and its report, without the samples unless asked."""
+        state = _load_state()
+        report = state.get("report")
+        if report and not samples:
+            # Samples name users, documents and artifacts
+            report["expired"].pop("sample", None)
+            for entry in report["files"].values():
+                entry.pop("sample", None)
+        return state
+
+
+def summary(report: dict) -> str:
+    files = report["files"]
+    removed = sum(entry["count"] for entry in files.values())
+    freed = sum(entry["bytes"] for entry in files.values())
+    expired = report["expired"]["age"] + report["expired"]["per_user"]
+    verb = "would remove" if report["dry_run"] else "removed"
+    details = ", ".join(f"{kind} {entry['count']}" for kind, entry in files.items())
+    return (f"{report['documents']} documents, {verb} {removed} files ({freed / 1e6:.1f} MB: {details}) "
+            f"and {expired} expired documents; {report['kept_in_grace']['count']} files in grace, "
+            f"{report['errors']} errors")
+
+
+def main():
+    from database import get_db
+    from repository import Repository
+
+    parser = argparse.ArgumentParser(description="Remove orphaned, temporary and expired artifacts")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be removed, change nothing")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    report = Sweeper(lambda: Repository(get_db())).sweep(dry_run=args.dry_run)
+    print(json.dumps(report, indent=2))
+    print(summary(report))
+
+
+if __name__ == "__main__":
+    main()
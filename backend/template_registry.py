@@ -0,0 +1,162 @@
+import io
+import copy
+import json
+import hashlib
+import logging
+import threading
+import functools
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from jinja2 import Environment
+
+if TYPE_CHECKING:
+    from docxtpl import DocxTemplate
+
+logger = logging.getLogger("docgen.template_registry")
+
+
+class _CompilingEnvironment(Environment):
+    """Jinja environment that compiles each distinct XML source only once."""
+
+    def __init__(self):
+        super().__init__()
+        self._compiled = {}
+
+    def from_string(self, source, globals=None, template_class=None):
+        tpl = self._compiled.get(source)
+        if tpl is None:
+            tpl = super().from_string(source, globals=globals, template_class=template_class)
+            self._compiled[source] = tpl
+        return tpl
+
+
+@functools.lru_cache(maxsize=None)
+def _registry_template_class():
+    # docxtpl (and python-docx under it) is imported on first use, not when the app starts
+    from docxtpl import DocxTemplate
+
+    class _RegistryDocxTemplate(DocxTemplate):
+        """DocxTemplate that starts from an in-memory copy of a parsed template instead of the file on disk."""
+
+        def __init__(self, compiled: "CompiledTemplate"):
+            super().__init__(str(compiled.path))
+            self.compiled = compiled
+
+        def init_docx(self, reload: bool = True):
+            if not self.docx or (self.is_rendered and reload):
+                self.docx = copy.deepcopy(self.compiled.docx)
+                self.is_rendered = False
+
+        def patch_xml(self, src_xml):
+            # The body/header XML of a fresh copy is always identical, so the regex clean-up is cached too
+            patched = self.compiled.patched_xml.get(src_xml)
+            if patched is None:
+                patched = super().patch_xml(src_xml)
+                self.compiled.patched_xml[src_xml] = patched
+            return patched
+
+    return _RegistryDocxTemplate
+
+
+class CompiledTemplate:
+    """A parsed *_template.docx plus its cached Jinja state."""
+
+    def __init__(self, path: Path):
+        from docx import Document
+        from docxtpl import DocxTemplate
+
+        self.path = path
+        self.mtime = path.stat().st_mtime
+        blob = path.read_bytes()
+        self.digest = hashlib.sha256(blob).hexdigest()
+        self.docx = Document(io.BytesIO(blob))
+        self.jinja_env = _CompilingEnvironment()
+        self.patched_xml = {}
+        self.placeholders = DocxTemplate(io.BytesIO(blob)).get_undeclared_template_variables()
+
+    def new_document(self) -> "DocxTemplate":
+        """Cheap, independent copy ready for render()/save()."""
+        return _registry_template_class()(self)
+
+    def render(self, context: dict) -> "DocxTemplate":
+        tpl = self.new_document()
+        tpl.render(context or {}, jinja_env=self.jinja_env)
+        return tpl
+
+
+class TemplateRegistry:
+    """
+    Process-wide cache of compiled templates keyed by path.
+    A template is reloaded when its mtime changes on disk.
+    """
+
+    def __init__(self):
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def get(self, template_path) -> CompiledTemplate:
+        path = Path(template_path).resolve()
+        compiled = self._templates.get(path)
+        if compiled is not None and compiled.mtime == path.stat().st_mtime:
+            return compiled
+
+        with self._lock:
+            compiled = self._templates.get(path)
+            if compiled is None or compiled.mtime != path.stat().st_mtime:
+                compiled = CompiledTemplate(path)
+                self._templates[path] = compiled
+                logger.info(f"Loaded template {path.name} ({len(compiled.placeholders)} placeholders)")
+        return compiled
+
+    def preload(self, templates_dir) -> dict:
+        """Loads every *_template.docx in templates_dir; returns {doc_type: CompiledTemplate}."""
+        loaded = {}
+        for path in sorted(Path(templates_dir).glob("*_template.docx")):
+            doc_type = path.name[: -len("_template.docx")]
+            try:
+                loaded[doc_type] = self.get(path)
+            except Exception as e:
+                logger.error(f"Failed to load template {path}: {e}")
+        return loaded
+
+    def validate(self, templates_dir, prompts: dict) -> dict:
+        """
+        Compares template placeholders with the JSON keys each prompt asks Gemini for.
+        Returns {doc_type: {"missing_in_prompt": [...], "unused_by_template": [...]}} for mismatches.
+        """
+        problems = {}
+        for doc_type, compiled in self.preload(templates_dir).items():
+            if doc_type not in prompts:
+                logger.warning(f"Template '{doc_type}' has no matching prompt")
+                continue
+            try:
+                keys = set(prompt_json_keys(prompts[doc_type]))
+            except ValueError as e:
+                logger.warning(f"Could not read JSON shape from '{doc_type}' prompt: {e}")
+                continue
+
+            missing = sorted(compiled.placeholders - keys)
+            unused = sorted(keys - compiled.placeholders)
+            if missing or unused:
+                problems[doc_type] = {"missing_in_prompt": missing, "unused_by_template": unused}
+                logger.warning(
+                    f"Template/prompt mismatch for '{doc_type}': "
+                    f"placeholders not produced by prompt={missing}, prompt keys not used by template={unused}"
+                )
+        return problems
+
+
+def prompt_json_keys(prompt: str) -> list:
+    """Top-level keys of the 'Return this exact JSON structure' block embedded in a prompt."""
+    marker = prompt.rfind("JSON structure:")
+    body = prompt[marker:] if marker != -1 else prompt
+    start = body.find("{{")
+    end = body.rfind("}}") + 2
+    if start == -1 or end < 2:
+        raise ValueError("no JSON block found")
+    shape = json.loads(body[start:end].replace("{{", "{").replace("}}", "}"))
+    return list(shape.keys())
+
+
+registry = TemplateRegistry()
@@ -1,6 +1,6 @@
-from docxtpl import DocxTemplate
 from pathlib import Path
 import logging
+from template_registry import registry
 
 logger = logging.getLogger("docgen.template_renderer")
 
@@ -10,34 +10,106 @@ def render_docx(template_path: str, context: dict, out_path: str):
     `template_path` - path to a docx with docxtpl placeholders (Jinja)
     `context` - dict of placeholders -> values
     `out_path` - file path to write the rendered docx
+    The parsed template comes from the in-memory registry, so only the Jinja work runs per call.
     """
-    tpl = DocxTemplate(template_path)
-    tpl.render(context or {})
+    tpl = registry.get(template_path).render(context or {})
     tpl.save(out_path)
     logger.info("Saved rendered DOCX to %s", out_path)
 
+import os
+import signal
 import subprocess
+import threading
+from soffice_pool import get_pool, profile_dir_for, SOFFICE_BIN, SOFFICE_CONVERT_TIMEOUT
+from conversion_batcher import ConversionBatcher, SOFFICE_BATCH_WINDOW_MS
+import native_pdf
+import metrics
 
-def convert_to_pdf(docx_path: str, out_dir: str):
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def get_batcher():
+    """Process-wide conversion batcher, or None when SOFFICE_BATCH_WINDOW_MS is 0."""
+    global _batcher
+    if SOFFICE_BATCH_WINDOW_MS <= 0:
+        return None
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = ConversionBatcher(_convert_many_with_subprocess, _convert_with_subprocess)
+    return _batcher
+
+def conversion_stats() -> dict:
+    return _batcher.stats() if _batcher is not None else {}
+
+def shutdown_batcher():
+    if _batcher is not None:
+        _batcher.shutdown()
+
+def convert_to_pdf(docx_path: str, out_dir: str, doc_type: str = None):
     """
     Converts a DOCX file to PDF using LibreOffice (soffice).
+    Doc types listed in NATIVE_PDF_DOC_TYPES are drawn in-process first (falls back to soffice).
+    Uses the persistent soffice pool when available, otherwise one-off soffice processes,
+    micro-batched so that concurrent conversions share one process start.
     """
+    with metrics.track("convert_to_pdf", doc_type):
+        engine, ok = _convert(docx_path, out_dir, doc_type)
+    metrics.PDF_CONVERSIONS.inc(engine, doc_type or "", "ok" if ok else "failed")
+    return ok
+
+def _convert(docx_path: str, out_dir: str, doc_type: str = None):
+    """Returns (engine that produced the result, success)."""
+    if native_pdf.supports(doc_type) and native_pdf.convert(docx_path, out_dir):
+        logger.info(f"PDF Conversion successful (native): {docx_path}")
+        return "native", True
+
+    pool = get_pool()
+    if pool is not None:
+        try:
+            if pool.convert(docx_path, out_dir):
+                logger.info(f"PDF Conversion successful (pool): {docx_path}")
+                return "pool", True
+            logger.error("Pooled PDF conversion produced no output, falling back to soffice subprocess")
+        except Exception as e:
+            logger.exception(f"Pooled PDF conversion failed, falling back to soffice subprocess: {e}")
+
+    batcher = get_batcher()
+    if batcher is not None:
+        return "batch", batcher.convert(docx_path, out_dir)
+    return "subprocess", _convert_with_subprocess(docx_path, out_dir)
+
+def _convert_with_subprocess(docx_path: str, out_dir: str):
+    return _convert_many_with_subprocess([docx_path], out_dir)
+
+def _convert_many_with_subprocess(docx_paths, out_dir: str):
     try:
         # LibreOffice headless conversion
+        # Each thread gets its own profile so parallel conversions do not fight over the lock file
+        profile = profile_dir_for(f"oneshot-{threading.get_ident()}")
         cmd = [
-            'soffice',
+            SOFFICE_BIN,
             '--headless',
+            f'-env:UserInstallation={profile.as_uri()}',
             '--convert-to', 'pdf',
             '--outdir', out_dir,
-            docx_path
+            *docx_paths
         ]
         
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-        logger.info(f"PDF Conversion successful: {result.stdout}")
+        # Own process group: soffice is a wrapper around soffice.bin, and a hung run must not outlive us
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, start_new_session=True)
+        try:
+            stdout, stderr = process.communicate(timeout=SOFFICE_CONVERT_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.communicate()
+            logger.error(f"PDF Conversion timed out after {SOFFICE_CONVERT_TIMEOUT:g}s, soffice killed ({len(docx_paths)} documents)")
+            return False
+        if process.returncode != 0:
+            logger.error(f"PDF Conversion failed: {stderr}")
+            return False
+        logger.info(f"PDF Conversion successful: {stdout}")
         return True
-    except subprocess.CalledProcessError as e:
-        logger.error(f"PDF Conversion failed: {e.stderr}")
-        return False
     except Exception as e:
         logger.exception(f"Unexpected error during PDF conversion: {e}")
-        return False
\ No newline at end of file
+        return False
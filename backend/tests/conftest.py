@@ -0,0 +1,49 @@
+"""
+Tests run against the in-memory SQLite backend and a throwaway STORAGE_DIR.
+
+    cd backend && python -m pytest -q
+
+The environment is set before any app module is imported: storage roots and the
+sweeper's configuration are read at import time.
+"""
+import os
+import sys
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+_storage_dir = tempfile.mkdtemp(prefix="docgen-tests-")
+os.environ["DB_BACKEND"] = "memory"
+os.environ["STORAGE_DIR"] = _storage_dir
+os.environ["SWEEP_INTERVAL_HOURS"] = "0"
+os.environ["SWEEP_LEGACY_DIR"] = "0"  # never reconcile the repo's own generated/ folder
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_storage_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def repo():
+    """A Repository over a fresh in-memory database."""
+    from sqlite_store import SQLiteStore, MEMORY
+    from repository import Repository
+
+    store = SQLiteStore(MEMORY)
+    return Repository({"users": store.users, "documents": store.documents, "store": store})
+
+
+@pytest.fixture
+def generated():
+    """The (empty) generated/ folder of the test STORAGE_DIR; emptied again afterwards."""
+    from artifacts import GENERATED
+
+    shutil.rmtree(GENERATED, ignore_errors=True)
+    GENERATED.mkdir(parents=True)
+    yield GENERATED
+    shutil.rmtree(GENERATED, ignore_errors=True)
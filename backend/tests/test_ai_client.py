@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+import pytest
+
+import ai_client
+from cache import TTLCache, SQLiteCache, TieredCache
+
+
+class FakeModel:
+    """generate_content_async that holds every call until `release` is set."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.started = []
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        self.started.append(prompt)
+        if not prompt.startswith("interactive"):
+            await self.release.wait()
+        return type("Response", (), {"text": '{"ok": true}'})()
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = FakeModel()
+    monkeypatch.setattr(ai_client, "GEMINI_KEY", "test-key")
+    monkeypatch.setattr(ai_client, "get_model", lambda: fake)
+    monkeypatch.setattr(ai_client, "limiter", ai_client.AsyncRateLimiter(3, 0))
+    monkeypatch.setattr(ai_client, "batch_limiter", ai_client.AsyncRateLimiter(2, 0))
+    return fake
+
+
+def test_batch_calls_leave_room_for_interactive_ones(model):
+    async def run():
+        batch = [asyncio.create_task(ai_client.call_gemini_async(f"batch {n}", batch=True)) for n in range(5)]
+        await asyncio.sleep(0.05)
+        assert len(model.started) == 2
+
+        # Answered while the batch still waits for its slots
+        assert await asyncio.wait_for(ai_client.call_gemini_async("interactive"), 1) == {"ok": True}
+
+        model.release.set()
+        assert await asyncio.gather(*batch) == [{"ok": True}] * 5
+
+    asyncio.run(run())
+
+
+def test_disk_cache_is_read_and_written_off_the_event_loop(model, monkeypatch, tmp_path):
+    disk = SQLiteCache(tmp_path / "ai.db")
+    cache = TieredCache(TTLCache(), disk)
+    monkeypatch.setattr(ai_client, "response_cache", cache)
+    threads = []
+    for name in ("get", "set"):
+        def record(*args, real=getattr(disk, name)):
+            threads.append(threading.current_thread())
+            return real(*args)
+        monkeypatch.setattr(disk, name, record)
+    model.release.set()
+    fields = {"subject": "Hello"}
+
+    first = asyncio.run(ai_client.generate_structured_with_gemini_async("letter", fields, None))
+    calls = len(model.started)
+    cache.memory.clear()
+    assert asyncio.run(ai_client.generate_structured_with_gemini_async("letter", fields, None)) == first
+
+    assert len(model.started) == calls
+    assert len(threads) == 3  # miss, store, disk hit
+    assert threading.main_thread() not in threads
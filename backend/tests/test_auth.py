@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import auth
+from models import User
+
+
+@pytest.fixture
+def db(repo):
+    return {"users": repo.users, "documents": repo.documents, "store": True}
+
+
+@pytest.fixture
+def user(repo):
+    auth.user_cache.clear()
+    yield repo.users.create(User(email="ada@example.com", hashed_password="x"))
+    auth.user_cache.clear()
+
+
+@pytest.fixture
+def lookups(repo, monkeypatch):
+    """Emails looked up in the store."""
+    seen = []
+    get_by_email = repo.users.get_by_email
+
+    def record(email):
+        seen.append(email)
+        return get_by_email(email)
+    monkeypatch.setattr(repo.users, "get_by_email", record)
+    return seen
+
+
+def current_user(email, db):
+    token = auth.create_access_token({"sub": email})
+    return asyncio.run(auth.get_current_user(token, db))
+
+
+def test_user_is_looked_up_once(db, user, lookups):
+    assert current_user(user.email, db).id == user.id
+    assert current_user(user.email, db).id == user.id
+    assert lookups == [user.email]
+
+
+def test_invalidated_user_is_looked_up_again(db, user, lookups):
+    current_user(user.email, db)
+    auth.invalidate_user(user.email)
+    current_user(user.email, db)
+    assert lookups == [user.email, user.email]
+
+
+def test_unknown_user_is_rejected_and_not_cached(db, user, lookups):
+    for _ in range(2):
+        with pytest.raises(HTTPException) as e:
+            current_user("nobody@example.com", db)
+        assert e.value.status_code == 401
+    assert lookups == ["nobody@example.com"] * 2
+
+
+def test_no_caching_with_zero_ttl(db, user, lookups, monkeypatch):
+    monkeypatch.setattr(auth, "USER_CACHE_TTL", 0)
+    current_user(user.email, db)
+    current_user(user.email, db)
+    assert lookups == [user.email, user.email]
+
+
+def test_invalid_token_is_rejected(db, user, lookups):
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(auth.get_current_user("not-a-token", db))
+    assert e.value.status_code == 401
+    assert lookups == []
@@ -0,0 +1,114 @@
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conversion_batcher import ConversionBatcher
+
+
+class FakeSoffice:
+    """convert_many/convert_one that write '<stem>.pdf' for every input not listed in `broken`."""
+
+    def __init__(self, broken=()):
+        self.broken = set(broken)
+        self.batches = []
+        self.singles = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def _write(self, paths, out_dir):
+        for path in paths:
+            if Path(path).stem not in self.broken:
+                (Path(out_dir) / f"{Path(path).stem}.pdf").write_bytes(b"%PDF")
+
+    def convert_many(self, paths, out_dir):
+        self.release.wait(10)
+        self.batches.append([Path(p).stem for p in paths])
+        self._write(paths, out_dir)
+        return True
+
+    def convert_one(self, path, out_dir):
+        self.singles.append(Path(path).stem)
+        self._write([path], out_dir)
+        return Path(path).stem not in self.broken
+
+
+@pytest.fixture
+def docs(tmp_path):
+    def make(*stems):
+        out = tmp_path / "out"
+        out.mkdir(exist_ok=True)
+        return [str(tmp_path / f"{stem}.docx") for stem in stems], str(out)
+    return make
+
+
+def convert_all(batcher, paths, out_dir):
+    with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+        return list(pool.map(lambda p: batcher.convert(p, out_dir), paths))
+
+
+def test_concurrent_conversions_share_one_invocation(docs):
+    soffice = FakeSoffice()
+    batcher = ConversionBatcher(soffice.convert_many, soffice.convert_one, window=0.2, workers=1)
+    paths, out_dir = docs("a", "b", "c")
+
+    assert convert_all(batcher, paths, out_dir) == [True] * 3
+    assert [sorted(b) for b in soffice.batches] == [["a", "b", "c"]]
+    assert sorted(p.name for p in Path(out_dir).iterdir()) == ["a.pdf", "b.pdf", "c.pdf"]
+    assert batcher.stats()["avg_batch"] == 3
+    batcher.shutdown()
+
+
+def test_a_bad_document_only_fails_its_own_caller(docs):
+    soffice = FakeSoffice(broken={"b"})
+    batcher = ConversionBatcher(soffice.convert_many, soffice.convert_one, window=0.2, workers=1)
+    paths, out_dir = docs("a", "b", "c")
+
+    assert convert_all(batcher, paths, out_dir) == [True, False, True]
+    assert soffice.singles == ["b"]
+    assert batcher.stats()["retried"] == 1
+    batcher.shutdown()
+
+
+def test_same_file_name_goes_to_separate_batches(tmp_path):
+    soffice = FakeSoffice()
+    batcher = ConversionBatcher(soffice.convert_many, soffice.convert_one, window=0.2, workers=1)
+    (tmp_path / "x").mkdir()
+    (tmp_path / "y").mkdir()
+    out_x, out_y = tmp_path / "out_x", tmp_path / "out_y"
+    out_x.mkdir()
+    out_y.mkdir()
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = list(pool.map(lambda args: batcher.convert(*args), [
+            (str(tmp_path / "x" / "same.docx"), str(out_x)),
+            (str(tmp_path / "y" / "same.docx"), str(out_y)),
+        ]))
+
+    assert results == [True, True]
+    assert soffice.batches == [["same"], ["same"]]
+    batcher.shutdown()
+
+
+def test_caller_gives_up_on_a_hung_conversion(docs):
+    soffice = FakeSoffice()
+    soffice.release.clear()
+    batcher = ConversionBatcher(soffice.convert_many, soffice.convert_one, window=0, workers=1, timeout=0.2)
+    paths, out_dir = docs("a")
+
+    assert batcher.convert(paths[0], out_dir) is False
+    assert batcher.stats()["timed_out"] == 1
+    soffice.release.set()
+    batcher.shutdown()
+
+
+def test_convert_after_shutdown_starts_new_workers(docs):
+    soffice = FakeSoffice()
+    batcher = ConversionBatcher(soffice.convert_many, soffice.convert_one, window=0, workers=1, timeout=5)
+    paths, out_dir = docs("a", "b")
+
+    assert batcher.convert(paths[0], out_dir) is True
+    batcher.shutdown()
+    assert batcher.convert(paths[1], out_dir) is True
+    batcher.shutdown()
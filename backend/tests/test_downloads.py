@@ -0,0 +1,95 @@
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+
+from downloads import object_response, _parse_range
+from storage import LocalStorage
+
+CONTENT = bytes(range(256)) * 4  # 1024 bytes
+KEY = "generated/ab/cd/abcd.pdf"
+
+
+@pytest.fixture
+def client(tmp_path):
+    backend = LocalStorage(tmp_path)
+    backend.put(KEY, CONTENT)
+
+    app = FastAPI()
+
+    @app.get("/file")
+    def download(request: Request):
+        return object_response(request, backend, KEY, "doc.pdf", "pdf")
+
+    @app.get("/missing")
+    def missing(request: Request):
+        return object_response(request, backend, "generated/no/ne/none.pdf", "none.pdf", "pdf")
+
+    return TestClient(app)
+
+
+def test_full_download_has_validators(client):
+    response = client.get("/file")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"]
+    assert response.headers["last-modified"]
+    assert 'filename="doc.pdf"' in response.headers["content-disposition"]
+
+
+def test_matching_etag_is_not_modified(client):
+    etag = client.get("/file").headers["etag"]
+    assert client.get("/file", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/file", headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert client.get("/file", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_if_modified_since(client):
+    last_modified = client.get("/file").headers["last-modified"]
+    assert client.get("/file", headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get("/file", headers={"If-Modified-Since": "Mon, 01 Jan 1990 00:00:00 GMT"}).status_code == 200
+    assert client.get("/file", headers={"If-Modified-Since": "junk"}).status_code == 200
+
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=0-99", 0, 99),
+    ("bytes=1000-", 1000, 1023),
+    ("bytes=-24", 1000, 1023),
+    ("bytes=1000-5000", 1000, 1023),
+])
+def test_single_range(client, header, start, end):
+    response = client.get("/file", headers={"Range": header})
+    assert response.status_code == 206
+    assert response.content == CONTENT[start:end + 1]
+    assert response.headers["content-range"] == f"bytes {start}-{end}/{len(CONTENT)}"
+    assert response.headers["content-length"] == str(end - start + 1)
+
+
+def test_range_outside_the_file(client):
+    response = client.get("/file", headers={"Range": "bytes=2000-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+@pytest.mark.parametrize("header", ["bytes=0-1,5-9", "items=0-1", "bytes=abc", "bytes=9-1", "bytes=5"])
+def test_unusable_range_is_ignored(header):
+    assert _parse_range(header, len(CONTENT)) is None
+
+
+def test_stale_if_range_sends_everything(client):
+    etag = client.get("/file").headers["etag"]
+    assert client.get("/file", headers={"Range": "bytes=0-9", "If-Range": etag}).status_code == 206
+    response = client.get("/file", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+def test_missing_object_is_404(client):
+    assert client.get("/missing").status_code == 404
+
+
+def test_parse_range_of_an_empty_file():
+    with pytest.raises(HTTPException) as exc:
+        _parse_range("bytes=0-", 0)
+    assert exc.value.status_code == 416
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+import main
+import artifacts
+from artifacts import storage
+from models import User
+
+FIELDS = {"sender_name": "Ada", "receiver_name": "Bob", "subject": "Hello", "body": "Text"}
+
+
+@pytest.fixture
+def user():
+    return User(email="ada@example.com", hashed_password="x")
+
+
+@pytest.fixture(autouse=True)
+def lazy_pdf(monkeypatch):
+    # No soffice here: leave PDFs to the first download
+    monkeypatch.setattr(main, "PDF_MODE", "lazy")
+
+
+def generate(repo, user) -> str:
+    req = main.GenerateRequest(doc_type="letter", fields=dict(FIELDS))
+    return asyncio.run(main.run_generation(req, user, repo))["doc_id"]
+
+
+def test_identical_inputs_share_files_until_the_last_delete(repo, user, generated):
+    first, second = generate(repo, user), generate(repo, user)
+    docs = [repo.documents.get(user.id, doc_id) for doc_id in (first, second)]
+    assert docs[0].artifacts == docs[1].artifacts
+    docx_key = docs[0].artifacts["docx"]
+
+    main.delete_document(first, current_user=user, repo=repo)
+    assert storage.exists(docx_key)
+    main.delete_document(second, current_user=user, repo=repo)
+    assert not storage.exists(docx_key)
+
+
+def test_files_deleted_between_cache_hit_and_insert_are_rendered_again(repo, user, generated, monkeypatch):
+    first = generate(repo, user)
+    docx_key = repo.documents.get(user.id, first).artifacts["docx"]
+    create = repo.documents.create
+
+    def create_after_concurrent_delete(doc):
+        # The other document goes away after the render cache hit, before this record exists
+        main.delete_document(first, current_user=user, repo=repo)
+        assert not storage.exists(docx_key)
+        return create(doc)
+
+    monkeypatch.setattr(repo.documents, "create", create_after_concurrent_delete)
+    second = generate(repo, user)
+
+    assert repo.documents.get(user.id, second).artifacts["docx"] == docx_key
+    assert storage.exists(docx_key)
+
+
+def test_pdf_converted_for_a_sharing_record_is_recorded_on_download(repo, user, generated):
+    first, second = generate(repo, user), generate(repo, user)
+    pdf_key = artifacts.sibling_key(repo.documents.get(user.id, first).artifacts["docx"], "pdf")
+    storage.put(pdf_key, b"%PDF")  # converted when the first record was downloaded
+
+    request = Request({"type": "http", "method": "GET", "headers": []})
+    response = main.download_dashboard_doc(request, second, "pdf", current_user=user, repo=repo)
+
+    assert response.path == str(storage.local_path(pdf_key))
+    doc = repo.documents.get(user.id, second)
+    assert doc.artifacts["pdf"] == pdf_key
+    assert doc.pdf_status == "ready"
@@ -0,0 +1,125 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+import jobs
+from jobs import JobManager, JobQueueFull
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = JobManager(tmp_path, workers=2)
+    yield manager
+    manager.shutdown()
+
+
+@pytest.fixture
+def writes(manager, monkeypatch):
+    """Job ids in the order their state was written."""
+    written = []
+    write = manager._write
+
+    def record(job_id, data):
+        written.append(job_id)
+        write(job_id, data)
+    monkeypatch.setattr(manager, "_write", record)
+    return written
+
+
+def run_job(manager, runner):
+    async def run():
+        job = manager.submit("user-1", "letter", runner)
+        await asyncio.gather(*manager._tasks)
+        return job
+    return asyncio.run(run())
+
+
+def on_disk(manager, job_id) -> dict:
+    return json.loads(manager._path(job_id).read_text())
+
+
+def test_streamed_events_are_written_together(manager, writes):
+    async def runner(job):
+        report = manager.partial_reporter(job)
+        for n in range(50):
+            report({"type": "field", "key": f"k{n}", "value": n})
+        await asyncio.sleep(jobs.JOB_SAVE_INTERVAL * 2)
+        return {"doc_id": "d1"}
+
+    job = run_job(manager, runner)
+
+    # Submit, one coalesced write for the 50 events, the outcome
+    assert len(writes) == 3
+    state = on_disk(manager, job.id)
+    assert state["status"] == "succeeded"
+    assert len(state["events"]) == 51
+
+
+def test_outcome_is_visible_to_other_workers_when_the_job_ends(manager, tmp_path):
+    async def runner(job):
+        manager.stage_reporter(job)("ai", "started")
+        return {"doc_id": "d1"}
+
+    job = run_job(manager, runner)
+
+    other = JobManager(tmp_path)
+    seen = other.get(job.id)
+    assert seen.status == "succeeded"
+    assert seen.result == {"doc_id": "d1"}
+    assert seen.stage == "ai"
+    assert seen.events[-1]["type"] == "done"
+    other.shutdown()
+
+
+@pytest.mark.parametrize("error, expected", [
+    (HTTPException(status_code=404, detail="Template missing"), {"status_code": 404, "detail": "Template missing"}),
+    (RuntimeError("boom"), {"status_code": 500, "detail": "boom"}),
+])
+def test_failed_job(manager, error, expected):
+    async def runner(job):
+        raise error
+
+    job = run_job(manager, runner)
+
+    state = on_disk(manager, job.id)
+    assert state["status"] == "failed"
+    assert state["error"] == expected
+    assert state["events"][-1]["type"] == "error"
+    assert state["events"][-1]["status_code"] == expected["status_code"]
+
+
+def test_full_queue_is_refused(tmp_path):
+    manager = JobManager(tmp_path, max_pending=1)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def runner(job):
+            await release.wait()
+            return {}
+
+        manager.submit("user-1", "letter", runner)
+        with pytest.raises(JobQueueFull):
+            manager.submit("user-1", "letter", runner)
+        release.set()
+        await asyncio.gather(*manager._tasks)
+
+    asyncio.run(run())
+    manager.shutdown()
+
+
+def test_shutdown_writes_coalesced_state(manager, writes, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_SAVE_INTERVAL", 60)
+
+    async def run():
+        job = manager.submit("user-1", "letter", lambda job: asyncio.sleep(60))
+        await asyncio.sleep(0.05)
+        return job
+
+    job = asyncio.run(run())
+    manager.shutdown()
+
+    assert writes == [job.id, job.id]
+    assert on_disk(manager, job.id)["status"] == "running"
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from json_stream import IncrementalJSONParser
+
+
+def feed_in_chunks(text: str, size: int):
+    parser = IncrementalJSONParser()
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i:i + size]))
+    return parser, events
+
+
+def test_fields_are_emitted_as_soon_as_complete():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"name": "Ada", "ro') == [{"type": "field", "key": "name", "value": "Ada"}]
+    assert parser.feed('le": "engineer"') == []
+    assert parser.feed("}") == [{"type": "field", "key": "role", "value": "engineer"}]
+    assert parser.result() == {"name": "Ada", "role": "engineer"}
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_chunk_boundaries_do_not_matter(size):
+    data = {"a": "x, y}", "b": {"nested": [1, {"c": "]"}]}, "c": 3.5, "d": None, "e": True}
+    parser, events = feed_in_chunks(json.dumps(data), size)
+    fields = {e["key"]: e["value"] for e in events if e["type"] == "field"}
+    assert fields == data
+    assert parser.result() == data
+
+
+def test_array_items_are_emitted_one_by_one():
+    parser, events = feed_in_chunks('{"skills": ["python", "sql"], "jobs": [{"title": "dev"}]}', 4)
+    items = [(e["key"], e["index"], e["value"]) for e in events if e["type"] == "item"]
+    assert items == [("skills", 0, "python"), ("skills", 1, "sql"), ("jobs", 0, {"title": "dev"})]
+    fields = [e["key"] for e in events if e["type"] == "field"]
+    assert fields == ["skills", "jobs"]
+
+
+def test_escaped_quotes_in_strings():
+    text = json.dumps({"quote": 'she said "hi" \\ bye', "next": "ok"})
+    parser, events = feed_in_chunks(text, 2)
+    assert [e["value"] for e in events] == ['she said "hi" \\ bye', "ok"]
+
+
+def test_prose_and_fences_around_the_object_are_ignored():
+    text = 'Sure! Here it is:\n```json\n{"a": 1}\n```\nAnything else?'
+    parser, events = feed_in_chunks(text, 5)
+    assert events == [{"type": "field", "key": "a", "value": 1}]
+    assert parser.result() == {"a": 1}
+
+
+def test_result_of_a_cut_off_object_raises():
+    parser = IncrementalJSONParser()
+    events = parser.feed('{"a": "done", "b": "half')
+    assert events == [{"type": "field", "key": "a", "value": "done"}]
+    with pytest.raises(ValueError):
+        parser.result()
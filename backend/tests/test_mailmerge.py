@@ -0,0 +1,75 @@
+import io
+import json
+import zipfile
+from pathlib import Path
+
+import mailmerge
+from mailmerge import iter_rows, merge_to_zip, RowError
+
+TEMPLATE = Path(__file__).resolve().parent.parent / "templates" / "letter_template.docx"
+
+
+def rows_of(text: str, filename: str) -> list:
+    return list(iter_rows(io.BytesIO(text.encode("utf-8")), filename))
+
+
+def merged(rows, fmt="docx") -> zipfile.ZipFile:
+    return zipfile.ZipFile(io.BytesIO(b"".join(merge_to_zip(TEMPLATE, "letter", rows, fmt))))
+
+
+def test_csv_rows_with_json_cells():
+    rows = rows_of('\ufeffname,skills\nAda,"[""math"", ""code""]"\nBob,[not json\nEve,x,extra\n', "people.csv")
+
+    assert rows[0] == (1, {"name": "Ada", "skills": ["math", "code"]})
+    assert rows[1] == (2, {"name": "Bob", "skills": "[not json"})
+    assert rows[2][0] == 3 and isinstance(rows[2][1], RowError)
+
+
+def test_jsonl_rows():
+    rows = rows_of('{"name": "Ada"}\n\n[1, 2]\n{broken\n', "people.jsonl")
+
+    assert rows[0] == (1, {"name": "Ada"})
+    assert [row for row, _ in rows] == [1, 2, 3]
+    assert all(isinstance(fields, RowError) for _, fields in rows[1:])
+
+
+def test_archive_keeps_input_order_and_lists_failures(monkeypatch):
+    monkeypatch.setattr(mailmerge, "MAILMERGE_WORKERS", 2)
+    rows = [(n, {"sender_name": f"Sender {n}"}) for n in range(1, 8)]
+    rows[3] = (4, RowError("Invalid JSON: test"))
+
+    archive = merged(rows)
+
+    names = archive.namelist()
+    assert names[:-1] == [f"letter_{n:05d}.docx" for n in (1, 2, 3, 5, 6, 7)]
+    assert names[-1] == "manifest.json"
+    manifest = json.loads(archive.read("manifest.json"))
+    assert (manifest["rows"], manifest["succeeded"], manifest["failed"]) == (7, 6, 1)
+    assert manifest["errors"] == [{"row": 4, "error": "Invalid JSON: test"}]
+
+
+def test_failed_conversion_only_fails_its_row(monkeypatch):
+    def convert(docx, out_dir, doc_type):
+        if "00002" in docx:
+            return False
+        (Path(out_dir) / f"{Path(docx).stem}.pdf").write_bytes(b"%PDF")
+        return True
+    monkeypatch.setattr(mailmerge, "convert_to_pdf", convert)
+
+    archive = merged([(1, {}), (2, {}), (3, {})], fmt="both")
+
+    assert archive.namelist() == [
+        "letter_00001.docx", "letter_00001.pdf", "letter_00003.docx", "letter_00003.pdf", "manifest.json",
+    ]
+    assert json.loads(archive.read("manifest.json"))["errors"] == [{"row": 2, "error": "PDF conversion failed"}]
+
+
+def test_rows_past_the_limit_are_skipped(monkeypatch):
+    monkeypatch.setattr(mailmerge, "MAILMERGE_MAX_ROWS", 2)
+
+    archive = merged((n, {}) for n in range(1, 100))
+
+    manifest = json.loads(archive.read("manifest.json"))
+    assert manifest["rows"] == 2
+    assert manifest["errors"][-1]["row"] == 3
+    assert len(archive.namelist()) == 3
@@ -0,0 +1,47 @@
+import os
+import signal
+import asyncio
+
+import pytest
+
+import passwords
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool(monkeypatch):
+    # The semaphore binds to the loop of the first asyncio.run; every test gets its own
+    monkeypatch.setattr(passwords, "_pending", None)
+    yield
+    passwords.shutdown_pool()
+
+
+def test_hash_and_verify_in_the_pool():
+    async def run():
+        hashed = await passwords.hash_password_async("secret")
+        return hashed, await passwords.verify_password_async("secret", hashed), await passwords.verify_password_async("nope", hashed)
+
+    hashed, good, bad = asyncio.run(run())
+    assert hashed.startswith("$2b$")
+    assert (good, bad) == (True, False)
+    assert passwords._pool is not None
+
+
+def test_killed_pool_is_replaced_and_the_call_retried():
+    hashed = passwords.get_password_hash("secret")
+    assert asyncio.run(passwords.verify_password_async("secret", hashed))
+    broken = passwords._pool
+
+    for pid in list(broken._processes):
+        os.kill(pid, signal.SIGKILL)
+
+    assert asyncio.run(passwords.verify_password_async("secret", hashed))
+    assert passwords._pool is not None and passwords._pool is not broken
+
+
+def test_no_workers_hashes_in_threads(monkeypatch):
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_WORKERS", 0)
+
+    hashed = asyncio.run(passwords.hash_password_async("secret"))
+
+    assert passwords.get_pool() is None
+    assert passwords.verify_password("secret", hashed)
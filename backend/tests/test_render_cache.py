@@ -0,0 +1,28 @@
+from render_cache import artifact_key, artifact_stem, canonical_json
+
+
+def test_key_ignores_field_order_and_formatting():
+    a = artifact_key("letter", {"subject": "Hi", "body": "Text", "nested": {"x": 1, "y": 2}}, "t1")
+    b = artifact_key("letter", {"nested": {"y": 2, "x": 1}, "body": "Text", "subject": "Hi"}, "t1")
+    assert a == b
+    assert len(a) == 64
+
+
+def test_key_changes_with_every_input():
+    base = artifact_key("letter", {"body": "Text"}, "t1")
+    assert artifact_key("report", {"body": "Text"}, "t1") != base
+    assert artifact_key("letter", {"body": "Text!"}, "t1") != base
+    assert artifact_key("letter", {"body": "Text"}, "t2") != base
+
+
+def test_no_fields_is_the_same_as_empty_fields():
+    assert artifact_key("letter", None, "t1") == artifact_key("letter", {}, "t1")
+
+
+def test_canonical_json_is_compact_and_keeps_unicode():
+    assert canonical_json({"b": "é", "a": [1, 2]}) == '{"a":[1,2],"b":"é"}'
+
+
+def test_stem_is_doc_type_and_short_key():
+    key = artifact_key("sop", {"intro": "x"}, "t1")
+    assert artifact_stem("sop", key) == f"sop_{key[:16]}"
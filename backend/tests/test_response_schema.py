@@ -0,0 +1,92 @@
+import pytest
+
+import response_schema
+from prompts import PROMPTS
+
+
+@pytest.mark.parametrize("doc_type", sorted(PROMPTS))
+def test_every_prompt_has_a_skeleton(doc_type):
+    shape = response_schema.skeleton(doc_type)
+    assert isinstance(shape, dict) and shape
+
+
+def test_unknown_doc_type_has_no_schema():
+    assert response_schema.skeleton("nope") is None
+    assert response_schema.schema("nope") is None
+
+
+def test_schema_follows_the_skeleton():
+    schema = response_schema.schema("resume")
+    assert schema["type"] == "object"
+    assert schema["required"] == list(response_schema.skeleton("resume"))
+    props = schema["properties"]
+    assert props["name"] == {"type": "string"}
+    assert props["skills"] == {"type": "array", "items": {"type": "string"}}
+    experience = props["experience_list"]["items"]
+    assert experience["type"] == "object"
+    assert experience["properties"]["bullets"]["type"] == "array"
+
+
+def test_schema_for_some_sections():
+    schema = response_schema.schema("report", ["title", "findings", "not_a_section"])
+    assert list(schema["properties"]) == ["title", "findings"]
+
+
+def test_schema_hands_out_copies():
+    response_schema.schema("letter")["properties"].clear()
+    assert response_schema.schema("letter")["properties"]
+
+
+@pytest.mark.parametrize("text", [
+    '{"title": "T", "author": "A"}',
+    '```json\n{"title": "T", "author": "A"}\n```',
+    '{"title": "T", "author": "A",}',
+    '{"title": "T", "author": "A"} and some trailing words',
+])
+def test_parse_repairs_near_misses(text):
+    assert response_schema.parse(text) == {"title": "T", "author": "A"}
+
+
+def test_parse_salvages_complete_fields_of_a_cut_off_response():
+    assert response_schema.parse('{"title": "T", "author": "A", "findings": "We fou') == {"title": "T", "author": "A"}
+
+
+@pytest.mark.parametrize("text", ["", "no json here", '{"title": "unterminated'])
+def test_parse_rejects_responses_without_a_usable_field(text):
+    with pytest.raises(ValueError):
+        response_schema.parse(text)
+
+
+def test_conform_coerces_to_the_skeleton():
+    data, invalid = response_schema.conform("resume", {
+        "name": "Ada",
+        "phone": 5551234,
+        "skills": "- python\n- sql\n",
+        "experience_list": {"title": "dev", "bullets": ["built things"]},
+        "summary": ["line one", "line two"],
+        "extra": "kept",
+    })
+    assert data["phone"] == "5551234"
+    assert data["skills"] == ["python", "sql"]
+    assert data["experience_list"] == [
+        {"title": "dev", "company": "", "period": "", "location": "", "bullets": ["built things"]}
+    ]
+    assert data["summary"] == "line one\nline two"
+    assert data["extra"] == "kept"
+    assert "contact" in invalid and "name" not in invalid
+
+
+def test_conform_reports_unusable_sections_and_uses_the_fallback():
+    data, invalid = response_schema.conform(
+        "report",
+        {"title": {"not": "a string"}, "author": "A", "findings": {"bad": 1}},
+        sections=["title", "author", "findings"],
+        fallback={"title": "From the user"},
+    )
+    assert data == {"title": "From the user", "author": "A"}
+    assert invalid == ["findings"]
+
+
+def test_fill_missing_uses_empty_values_of_the_right_type():
+    data = response_schema.fill_missing("resume", {"name": "Ada"}, ["skills", "summary", "experience_list"])
+    assert data == {"name": "Ada", "skills": [], "summary": "", "experience_list": []}
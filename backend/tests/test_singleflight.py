@@ -0,0 +1,107 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import singleflight
+from singleflight import SingleFlight, AsyncSingleFlight, file_lock, try_file_lock
+
+
+def wait_until(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.005)
+
+
+def test_concurrent_calls_share_one_run():
+    group = SingleFlight("test-share")
+    release = threading.Event()
+    runs = []
+
+    def work():
+        runs.append(1)
+        release.wait(5)
+        return "result"
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        futures = [pool.submit(group.do, "key", work) for _ in range(5)]
+        wait_until(lambda: group.calls == 5)
+        release.set()
+        assert [f.result() for f in futures] == ["result"] * 5
+
+    assert len(runs) == 1
+    assert group.stats() == {"calls": 5, "executed": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_waiters_see_the_leaders_exception():
+    group = SingleFlight("test-error")
+    release = threading.Event()
+
+    def work():
+        release.wait(5)
+        raise RuntimeError("boom")
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(group.do, "key", work) for _ in range(3)]
+        wait_until(lambda: group.calls == 3)
+        release.set()
+        for future in futures:
+            with pytest.raises(RuntimeError, match="boom"):
+                future.result()
+
+    # The failed call is forgotten: the next one runs again
+    assert group.do("key", lambda: "again") == "again"
+
+
+def test_different_keys_run_separately():
+    group = SingleFlight("test-keys")
+    assert group.do("a", lambda: 1) == 1
+    assert group.do("b", lambda: 2) == 2
+    assert group.stats()["executed"] == 2
+
+
+def test_async_calls_share_one_run():
+    group = AsyncSingleFlight("test-async")
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(*(group.do("key", work) for _ in range(4)))
+
+    assert asyncio.run(main()) == ["result"] * 4
+    assert len(runs) == 1
+    assert group.stats()["coalesced"] == 3
+
+
+def test_async_waiter_giving_up_does_not_cancel_the_leader():
+    group = AsyncSingleFlight("test-async-cancel")
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        leader = asyncio.create_task(group.do("key", work))
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(group.do("key", work), timeout=0.01)
+        return await leader
+
+    assert asyncio.run(main()) == "result"
+
+
+@pytest.mark.skipif(singleflight.fcntl is None, reason="file locks need fcntl")
+def test_try_file_lock_does_not_wait_for_a_held_lock(tmp_path):
+    path = tmp_path / "locks" / "a.lock"
+    with file_lock(path):
+        with try_file_lock(path) as acquired:
+            assert acquired is False
+    with try_file_lock(path) as acquired:
+        assert acquired is True
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Document
+
+
+@pytest.fixture
+def documents(repo):
+    start = datetime(2024, 1, 1)
+    for i in range(7):
+        repo.documents.create(Document(
+            user_id="user-1", filename=f"{i}.docx", file_path=f"{i}.docx",
+            doc_type="letter" if i % 2 else "report",
+            created_at=(start + timedelta(days=i)).isoformat(), partitionKey="user-1",
+        ))
+    repo.documents.create(Document(user_id="user-2", filename="x.docx", file_path="x.docx", doc_type="letter"))
+    return repo.documents
+
+
+def test_pages_walk_a_users_documents_newest_first(documents):
+    seen, token = [], None
+    while True:
+        items, token = documents.list_page("user-1", limit=3, continuation=token)
+        seen.extend(item["filename"] for item in items)
+        if token is None:
+            break
+    assert seen == [f"{i}.docx" for i in reversed(range(7))]
+
+
+def test_filters_apply_across_pages(documents):
+    items, token = documents.list_page("user-1", limit=2, doc_type="letter")
+    assert [i["filename"] for i in items] == ["5.docx", "3.docx"]
+    items, token = documents.list_page("user-1", limit=2, doc_type="letter", continuation=token)
+    assert [i["filename"] for i in items] == ["1.docx"]
+    assert token is None
+
+
+@pytest.mark.parametrize("token", ["not json", "[1, 2]", '["only one"]', "{}"])
+def test_malformed_continuation_is_rejected(documents, token):
+    with pytest.raises(ValueError, match="Invalid continuation token"):
+        documents.list_page("user-1", limit=2, continuation=token)
@@ -0,0 +1,191 @@
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import sweeper
+from artifacts import shard_key, storage
+from models import Document
+from sweeper import Sweeper, expired_documents, _RateLimiter, _Stopped, _new_report
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+@pytest.fixture(autouse=True)
+def unthrottled(monkeypatch):
+    monkeypatch.setattr(sweeper, "SWEEP_SCAN_RATE", 0)
+    monkeypatch.setattr(sweeper, "SWEEP_OPS_RATE", 0)
+
+
+def put(key: str, age: float = 0) -> str:
+    storage.put(key, b"content")
+    mtime = time.time() - age
+    os.utime(storage.local_path(key), (mtime, mtime))
+    return key
+
+
+def document(repo, artifact_id: str, user_id: str = "user-1", age: float = 0, formats=("docx",)) -> Document:
+    doc = Document(
+        user_id=user_id,
+        filename=f"letter_{artifact_id[:16]}.docx",
+        file_path=shard_key(artifact_id, "docx"),
+        doc_type="letter",
+        artifact_key=artifact_id,
+        artifacts={fmt: shard_key(artifact_id, fmt) for fmt in formats},
+        created_at=(datetime.utcnow() - timedelta(seconds=age)).isoformat(),
+        partitionKey=user_id,
+    )
+    repo.documents.create(doc)
+    return doc
+
+
+def test_sweep_removes_old_orphans_temp_and_legacy_files(repo, generated):
+    document(repo, "a" * 64, formats=("docx", "pdf"))
+    kept = [put(shard_key("a" * 64, "docx"), age=2 * DAY), put(shard_key("a" * 64, "pdf"), age=2 * DAY)]
+    young_orphan = put(shard_key("c" * 64, "docx"), age=HOUR)
+    old_orphan = put(shard_key("b" * 64, "docx"), age=2 * DAY)
+    temp = [put("generated/ab/cd/abcd.tmp", age=2 * HOUR), put("generated/tmpabc/x.docx", age=2 * HOUR)]
+    lock = put("generated/.locks/x.lock", age=2 * DAY)
+    legacy = put("generated/letter_old.docx", age=2 * DAY)
+
+    report = Sweeper(lambda: repo).sweep()
+
+    assert report["documents"] == 1
+    assert report["files"]["orphan"]["count"] == 1
+    assert report["files"]["temp"]["count"] == 2
+    assert report["files"]["legacy"]["count"] == 1
+    assert report["kept_in_grace"]["count"] == 1
+    assert report["errors"] == 0
+    assert all(storage.exists(key) for key in kept + [young_orphan, lock])
+    assert not any(storage.exists(key) for key in temp + [old_orphan, legacy])
+    assert not (generated / "tmpabc").exists()
+
+
+def test_dry_run_changes_nothing(repo, generated):
+    document(repo, "a" * 64)
+    orphan = put(shard_key("b" * 64, "docx"), age=2 * DAY)
+
+    report = Sweeper(lambda: repo).sweep(dry_run=True)
+
+    assert report["dry_run"]
+    assert report["files"]["orphan"]["count"] == 1
+    assert report["files"]["orphan"]["sample"] == [orphan]
+    assert storage.exists(orphan)
+
+
+def test_empty_database_keeps_rendered_files(repo, generated):
+    orphan = put(shard_key("b" * 64, "docx"), age=2 * DAY)
+    temp = put("generated/ab/cd/abcd.tmp", age=2 * HOUR)
+
+    report = Sweeper(lambda: repo).sweep()
+
+    assert report["warnings"]
+    assert storage.exists(orphan)
+    assert not storage.exists(temp)
+
+
+def test_orphan_picked_up_during_the_pass_is_kept(repo, generated, monkeypatch):
+    # The listing of documents was taken before a render cache hit created this one
+    snapshot = [document(repo, "a" * 64)]
+    monkeypatch.setattr(repo.documents, "iter_all", lambda: iter(snapshot))
+    document(repo, "b" * 64)
+    late = put(shard_key("b" * 64, "docx"), age=2 * DAY)
+
+    report = Sweeper(lambda: repo).sweep()
+
+    assert report["files"]["orphan"]["count"] == 0
+    assert storage.exists(late)
+
+
+def test_expired_documents_by_age_and_per_user(monkeypatch):
+    monkeypatch.setattr(sweeper, "SWEEP_RETENTION_DAYS", 30)
+    monkeypatch.setattr(sweeper, "SWEEP_MAX_DOCS_PER_USER", 2)
+    now = datetime.utcnow()
+
+    def doc(user_id, days):
+        return Document(user_id=user_id, filename="x.docx", file_path="x.docx", doc_type="letter",
+                        created_at=(now - timedelta(days=days)).isoformat())
+
+    old = doc("u1", 40)
+    newest_u1 = [doc("u1", 1), doc("u1", 2)]
+    third_u1 = doc("u1", 3)
+    u2 = [doc("u2", 5), doc("u2", 35)]
+    report = _new_report(False)
+
+    expired = expired_documents([old, third_u1, *newest_u1, *u2], report)
+
+    assert {d.id for d in expired} == {old.id, third_u1.id, u2[1].id}
+    assert report["expired"]["age"] == 2
+    assert report["expired"]["per_user"] == 1
+
+
+def test_expired_documents_go_with_their_files(repo, generated, monkeypatch):
+    monkeypatch.setattr(sweeper, "SWEEP_RETENTION_DAYS", 30)
+    expired = document(repo, "a" * 64, age=40 * DAY)
+    current = document(repo, "b" * 64, age=DAY)
+    old_file = put(shard_key("a" * 64, "docx"), age=40 * DAY)
+    current_file = put(shard_key("b" * 64, "docx"), age=40 * DAY)
+
+    report = Sweeper(lambda: repo).sweep()
+
+    assert report["expired"]["age"] == 1
+    assert repo.documents.get(expired.user_id, expired.id) is None
+    assert repo.documents.get(current.user_id, current.id) is not None
+    assert not storage.exists(old_file)
+    assert storage.exists(current_file)
+
+
+def test_cold_pdfs_are_dropped_and_their_docx_kept(repo, generated, monkeypatch):
+    monkeypatch.setattr(sweeper, "SWEEP_COLD_PDF_DAYS", 7)
+    document(repo, "a" * 64, age=30 * DAY, formats=("docx", "pdf"))
+    document(repo, "b" * 64, age=DAY, formats=("docx", "pdf"))
+    cold = [put(shard_key("a" * 64, fmt), age=30 * DAY) for fmt in ("docx", "pdf")]
+    # Same age on disk, but a document was generated from it yesterday
+    warm = [put(shard_key("b" * 64, fmt), age=30 * DAY) for fmt in ("docx", "pdf")]
+
+    report = Sweeper(lambda: repo).sweep()
+
+    assert report["files"]["cold_pdf"]["count"] == 1
+    assert storage.exists(cold[0]) and not storage.exists(cold[1])
+    assert all(storage.exists(key) for key in warm)
+
+
+def test_run_if_due_respects_the_interval(repo, generated, monkeypatch):
+    monkeypatch.setattr(sweeper, "SWEEP_INTERVAL_HOURS", 1)
+    sweeper.STATE_PATH.unlink(missing_ok=True)
+    runner = Sweeper(lambda: repo)
+
+    assert runner.run_if_due() is not None
+    assert runner.run_if_due() is None
+    assert runner.last_report()["report"]["documents"] == 0
+
+
+def test_last_report_leaves_out_identifiers(repo, generated, monkeypatch):
+    monkeypatch.setattr(sweeper, "SWEEP_RETENTION_DAYS", 30)
+    document(repo, "a" * 64, age=40 * DAY)
+    put(shard_key("b" * 64, "docx"), age=2 * DAY)
+    sweeper.STATE_PATH.unlink(missing_ok=True)
+    runner = Sweeper(lambda: repo)
+    runner.run_if_due()
+
+    report = runner.last_report()["report"]
+    assert report["expired"]["age"] == 1 and "sample" not in report["expired"]
+    assert report["files"]["orphan"]["count"] == 1
+    assert all("sample" not in entry for entry in report["files"].values())
+    assert runner.last_report(samples=True)["report"]["files"]["orphan"]["sample"]
+
+
+def test_rate_limiter_spaces_calls_and_stops():
+    stop = threading.Event()
+    limiter = _RateLimiter(100, stop)
+    started = time.monotonic()
+    for _ in range(6):
+        limiter.wait()
+    assert time.monotonic() - started >= 0.045
+
+    stop.set()
+    with pytest.raises(_Stopped):
+        limiter.wait()
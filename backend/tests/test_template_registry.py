@@ -0,0 +1,67 @@
+import os
+import io
+import shutil
+from pathlib import Path
+
+import pytest
+from docx import Document
+from docxtpl import DocxTemplate
+
+from template_registry import TemplateRegistry, prompt_json_keys
+
+TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "templates"
+FIELDS = {"sender_name": "Ada", "receiver_name": "Bob", "subject": "Hello", "body": "Text"}
+
+
+@pytest.fixture
+def template(tmp_path) -> Path:
+    path = tmp_path / "letter_template.docx"
+    shutil.copy(TEMPLATES_DIR / "letter_template.docx", path)
+    return path
+
+
+def text_of(tpl) -> str:
+    buf = io.BytesIO()
+    tpl.save(buf)
+    return "\n".join(p.text for p in Document(buf).paragraphs)
+
+
+def test_template_is_parsed_once_and_reloaded_when_changed(template):
+    registry = TemplateRegistry()
+    first = registry.get(template)
+    assert registry.get(str(template)) is first
+
+    stat = template.stat()
+    os.utime(template, (stat.st_atime, stat.st_mtime + 10))
+    assert registry.get(template) is not first
+
+
+def test_renders_match_docxtpl_and_do_not_leak_into_each_other(template):
+    compiled = TemplateRegistry().get(template)
+
+    ada = compiled.render(FIELDS)
+    bob = compiled.render({**FIELDS, "sender_name": "Bob the sender"})
+    plain = DocxTemplate(str(template))
+    plain.render(FIELDS)
+
+    assert text_of(ada) == text_of(plain)
+    assert "Bob the sender" in text_of(bob)
+    assert "Bob the sender" not in text_of(ada)
+    assert "{{" in "\n".join(p.text for p in compiled.docx.paragraphs)
+
+
+def test_validate_reports_keys_the_template_does_not_use(tmp_path, template):
+    (tmp_path / "broken_template.docx").write_bytes(b"not a docx")
+    prompts = {"letter": 'Return this exact JSON structure:\n{{\n  "sender_name": "",\n  "extra": ""\n}}'}
+
+    problems = TemplateRegistry().validate(tmp_path, prompts)
+
+    assert problems["letter"]["unused_by_template"] == ["extra"]
+    assert "sender_name" not in problems["letter"]["missing_in_prompt"]
+    assert "subject" in problems["letter"]["missing_in_prompt"]
+
+
+def test_prompt_json_keys():
+    assert prompt_json_keys('Example {{"x": 1}}\nJSON structure:\n{{\n  "a": "",\n  "b": []\n}}') == ["a", "b"]
+    with pytest.raises(ValueError):
+        prompt_json_keys("no structure here")
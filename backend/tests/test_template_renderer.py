@@ -0,0 +1,48 @@
+import time
+import stat
+
+import template_renderer
+
+
+def fake_soffice(tmp_path, body: str) -> str:
+    script = tmp_path / "soffice"
+    script.write_text(f"#!/bin/sh\n{body}\n")
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    return str(script)
+
+
+def alive(pid: int) -> bool:
+    # An orphan nobody reaped yet shows up as a zombie: it is dead all the same
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def test_hung_soffice_is_killed_with_its_children(tmp_path, monkeypatch):
+    pid_file = tmp_path / "child.pid"
+    # Like the real wrapper: the work happens in a child process
+    monkeypatch.setattr(template_renderer, "SOFFICE_BIN", fake_soffice(tmp_path, f"sleep 30 & echo $! > {pid_file}; wait"))
+    monkeypatch.setattr(template_renderer, "SOFFICE_CONVERT_TIMEOUT", 0.5)
+
+    started = time.monotonic()
+    assert template_renderer._convert_many_with_subprocess([str(tmp_path / "a.docx")], str(tmp_path)) is False
+    assert time.monotonic() - started < 5
+
+    child = int(pid_file.read_text())
+    for _ in range(50):
+        if not alive(child):
+            break
+        time.sleep(0.02)
+    assert not alive(child)
+
+
+def test_failed_soffice_run_is_reported(tmp_path, monkeypatch):
+    monkeypatch.setattr(template_renderer, "SOFFICE_BIN", fake_soffice(tmp_path, "echo broken >&2; exit 3"))
+    assert template_renderer._convert_many_with_subprocess([str(tmp_path / "a.docx")], str(tmp_path)) is False
+
+
+def test_successful_soffice_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(template_renderer, "SOFFICE_BIN", fake_soffice(tmp_path, "exit 0"))
+    assert template_renderer._convert_many_with_subprocess([str(tmp_path / "a.docx")], str(tmp_path)) is True
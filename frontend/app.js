@@ -314,7 +314,7 @@ async function generateDocument() {
                 'Content-Type': 'application/json',
                 'Authorization': `Bearer ${token}`
             },
-            body: JSON.stringify(payload)
+            body: JSON.stringify({ ...payload, async_job: true })
         });
 
         if (!response.ok) {
@@ -322,7 +322,8 @@ async function generateDocument() {
             throw new Error(err.detail || "Generation failed");
         }
 
-        const data = await response.json();
+        const job = await response.json();
+        const data = await waitForJob(job.job_id, btn);
 
         // Show Success Area
         document.getElementById('result-area').style.display = 'block';
@@ -348,6 +349,34 @@ async function generateDocument() {
     }
 }
 
+const STAGE_LABELS = {
+    ai: 'Writing content',
+    render: 'Building document',
+    pdf: 'Creating PDF',
+    persist: 'Saving'
+};
+
+// Poll a generation job until it finishes; returns the job result ({doc_id, doc_type, ...})
+async function waitForJob(jobId, btn) {
+    while (true) {
+        const res = await authenticatedFetch(`${API_URL}/jobs/${jobId}`);
+        if (!res) throw new Error("Not authenticated");
+        if (!res.ok) {
+            const err = await res.json();
+            throw new Error(err.detail || "Could not fetch job status");
+        }
+
+        const job = await res.json();
+        if (job.status === 'succeeded') return job.result;
+        if (job.status === 'failed') throw new Error((job.error && job.error.detail) || "Generation failed");
+
+        if (job.stage && STAGE_LABELS[job.stage]) {
+            btn.innerHTML = `<i class="fa-solid fa-spinner fa-spin"></i> ${STAGE_LABELS[job.stage]}...`;
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
 async function downloadGeneratedDoc(id, format) {
     try {
         const btn = format === 'pdf' ? document.getElementById('download-pdf') : document.getElementById('download-docx');